@@ -9,7 +9,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.config import settings
-from app.database import get_db
+from app.database import SessionLocal
 from app.models import User
 
 # HTTP Bearer token scheme
@@ -53,15 +53,8 @@ def decode_access_token(token: str) -> dict:
         )
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    """
-    Get the current authenticated user from the JWT token.
-    This is a dependency that can be used in route handlers.
-    """
-    token = credentials.credentials
+def get_user_from_token(db: Session, token: str) -> User:
+    """Resolve a bearer token to its user (raises 401 when invalid)"""
     payload = decode_access_token(token)
     
     user_id: str = payload.get("sub")
@@ -81,3 +74,45 @@ async def get_current_user(
         )
     
     return user
+
+
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> User:
+    """
+    Get the current authenticated user from the JWT token.
+    This is a dependency that can be used in route handlers.
+
+    The user is loaded in a session of its own and returned detached (column
+    attributes only), so its connection goes back to the pool before the route
+    takes one for its own session; holding both per request can exhaust the
+    pool under load.
+    """
+    db = SessionLocal()
+    try:
+        user = get_user_from_token(db, credentials.credentials)
+        db.expunge(user)
+        return user
+    finally:
+        db.close()
+
+
+async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    """Current user, who must be listed in ADMIN_EMAILS"""
+    if current_user.email.lower() not in {email.lower() for email in settings.ADMIN_EMAILS}:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
+
+
+async def get_coach_user(current_user: User = Depends(get_current_user)) -> User:
+    """Current user, who must be listed in COACH_EMAILS or ADMIN_EMAILS"""
+    allowed = {email.lower() for email in settings.COACH_EMAILS + settings.ADMIN_EMAILS}
+    if current_user.email.lower() not in allowed:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Coach access required"
+        )
+    return current_user
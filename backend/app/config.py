@@ -2,7 +2,7 @@
 Application configuration and settings
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -10,6 +10,21 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite:///./goal_achiever.db"
+    DATABASE_READ_URL: str = ""  # Optional read replica used by GET routes
+    
+    # SQLite tuning (applied on every new connection)
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 MB
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 65536  # 64 MB page cache per connection
+    
+    # Connection pool per worker (the timeout and sizes also apply to SQLite files)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_PRE_PING: bool = True
     
     # JWT Authentication
     JWT_SECRET: str = "dev-secret-key-for-testing-only-change-in-prod"
@@ -18,7 +33,106 @@ class Settings(BaseSettings):
     
     # Google Gemini AI API
     GEMINI_API_KEY: str = ""
+    OUTLINE_HIERARCHICAL_THRESHOLD: int = 45  # Longer goals are outlined phase by phase
+    OUTLINE_PHASE_DAYS: int = 14
+    OUTLINE_MAX_PARALLEL: int = 8  # Concurrent phase expansion calls
     
+    # Semantic cache for context-free tutor chat questions
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_CAPACITY: int = 5000
+    SEMANTIC_CACHE_DIM: int = 512
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity for a hit (negations, numbers, directions must also match)
+    SEMANTIC_CACHE_TOPIC_THRESHOLDS: Dict[str, float] = {}  # Per context_topic overrides
+    SEMANTIC_CACHE_TTL_SECONDS: int = 604800  # 7 days
+    
+    # WebSocket chat (/chat/ws)
+    WS_HEARTBEAT_SECONDS: int = 20  # Server ping interval
+    WS_IDLE_TIMEOUT_SECONDS: int = 60  # Close when the client sends nothing for this long
+    WS_SEND_QUEUE_SIZE: int = 64  # Outbound frames buffered per connection before streams wait
+    WS_MAX_ACTIVE_STREAMS: int = 4  # Concurrent generations per connection
+    WS_SESSION_HISTORY: int = 10  # Messages of context kept in memory per session
+
+    # Write-behind chat persistence (group commits off the request path)
+    CHAT_WRITE_BEHIND: bool = False
+    CHAT_FLUSH_INTERVAL_MS: int = 250
+    CHAT_FLUSH_BATCH: int = 500  # Messages per commit; a full batch flushes early
+    CHAT_BUFFER_MAX: int = 5000  # Callers wait for a flush beyond this
+    CHAT_FLUSH_MAX_ATTEMPTS: int = 10  # Then the batch is written per message and failing ones are dropped
+
+    # Chat archival and retention (python -m app.services.chat_archive)
+    CHAT_ARCHIVE_IDLE_DAYS: int = 90  # Sessions without new messages for this long move to chat_archives
+    CHAT_ARCHIVE_BATCH_SIZE: int = 200  # Sessions per transaction
+    CHAT_RETENTION_DAYS: int = 0  # Delete archived sessions idle for this long (0 keeps them)
+    CHAT_PARTITION_MONTHS_AHEAD: int = 3  # PostgreSQL: monthly chat_messages partitions created in advance
+
+    # Rate limits (requests per minute per user, or per IP when unauthenticated).
+    # Keys are "METHOD /path" with * matching one path segment; the first match wins, "*" is the default.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: Dict[str, int] = {
+        "POST /auth/*": 20,
+        "POST /chat": 30,
+        "POST /plans/*/topic-chat": 30,
+        "POST /goals": 10,
+        "POST /goals/*/replan": 10,
+        "POST /programs": 10,
+        "GET /export": 5,
+        "POST /import": 5,
+        "*": 600,
+    }
+
+    # LLM quotas per user (UTC day / rolling minute), checked before every Gemini call
+    QUOTA_DAILY_LLM_CALLS: int = 1000
+    QUOTA_DAILY_TOKENS: int = 2000000
+    QUOTA_MINUTE_LLM_CALLS: int = 60
+    # Requests on these routes are refused up front once the user's quota is used up
+    QUOTA_LLM_ROUTES: List[str] = [
+        "POST /chat",
+        "GET /chat/ws",
+        "POST /plans/*/topic-chat",
+        "POST /goals",
+        "POST /goals/*/replan",
+        "POST /programs",
+    ]
+    USAGE_FLUSH_SECONDS: int = 10  # How often usage counters are written to the database
+
+    # State shared between workers (rate limits, quota counters, semantic cache, leader lease).
+    # "memory" is per process and only right for a single worker; use "sqlite" for several
+    # workers on one host and "redis" across hosts.
+    STATE_BACKEND: str = "memory"
+    STATE_SQLITE_PATH: str = "./shared_state.db"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    STATE_KEY_PREFIX: str = "goal_achiever:"
+    LEADER_LEASE_SECONDS: int = 15  # A dead leader is replaced within this long
+    CHAT_RETENTION_INTERVAL_MINUTES: int = 0  # Leader runs archival / retention this often (0: only via the CLI)
+
+    ADMIN_EMAILS: List[str] = []  # Users allowed on /admin routes
+    COACH_EMAILS: List[str] = []  # Users allowed to create programs and invite cohorts
+
+    # Request profiling (see app/services/profiler.py)
+    PROFILE_TOKEN: str = ""  # Requests with header "X-Profile: <token>" are profiled; empty disables the header
+    PROFILE_SAMPLE_RATE: float = 0.0  # Fraction of requests profiled at random (kept when slow)
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_SLOW_MS: int = 1000  # Requests at least this slow are logged
+    PROFILE_SQL_THRESHOLD_MS: float = 5.0  # SQL statements at least this slow are kept with a profile
+    PROFILE_SQL_ALWAYS: bool = False  # Time every request's SQL; kept as a profile when the request is slow
+    PROFILE_MAX_STORED: int = 50
+
+    # Response compression and encoding negotiation (see ContentEncodingMiddleware)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # Smaller bodies are sent as is
+    COMPRESSION_GZIP_LEVEL: int = 5
+    COMPRESSION_BROTLI_QUALITY: int = 4  # 4-5 beat gzip on size at similar CPU; 11 is far too slow per request
+    # Routes that answer `Accept: application/msgpack` with MessagePack instead of JSON
+    MSGPACK_ROUTES: List[str] = [
+        "GET /goals",
+        "GET /sync",
+        "GET /plans/date/*",
+        "GET /plans/date/*/dynamic",
+        "GET /plans/*/notes",
+        "GET /chat/history/*",
+        "GET /chat/sessions",
+    ]
+
     # Legacy Nebius (kept for backwards compat, now unused)
     NEBIUS_API_KEY: str = ""
     NEBIUS_API_URL: str = ""
@@ -26,6 +140,7 @@ class Settings(BaseSettings):
     
     # Application
     DEBUG: bool = True
+    CREATE_TABLES_ON_STARTUP: bool = False  # Otherwise run: python -m app.database
     CORS_ORIGINS: List[str] = [
         "http://localhost:3000",
         "http://localhost:8081",
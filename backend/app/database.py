@@ -1,24 +1,124 @@
 """
 Database configuration
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL, 
-    connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
-)
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection for concurrent readers and writers"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.close()
+
+
+def create_db_engine(url: str, tuned: bool = True) -> Engine:
+    """
+    Create an engine for the given URL.
+    SQLite gets WAL and pragma tuning on connect; file databases and server
+    databases get a connection pool sized from settings.
+    """
+    if url.startswith("sqlite"):
+        if ":memory:" in url:
+            return create_engine(url, connect_args={"check_same_thread": False})
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+        if tuned:
+            event.listen(engine, "connect", _apply_sqlite_pragmas)
+        return engine
+
+    return create_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+
+
+engine = create_db_engine(settings.DATABASE_URL)
+
+# GET routes read from the replica when one is configured
+read_engine = create_db_engine(settings.DATABASE_READ_URL) if settings.DATABASE_READ_URL else engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
-def get_db():
-    """Dependency to get a database session"""
+async def get_db():
+    """
+    Dependency to get a database session.
+
+    Async so the session is opened and closed on the event loop: most routes
+    query from the loop, and a connection released through the threadpool
+    cannot come back while the loop is blocked waiting for one.
+    """
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_read_db():
+    """Dependency to get a session for read-only routes (replica if configured)"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Columns added to tables that existing databases already have; create_all
+# only creates missing tables, so init_db adds these itself
+ADDED_COLUMNS = [
+    ("day_plans", "content_hash"),
+]
+
+
+def add_missing_columns(bind: Engine):
+    """Add ADDED_COLUMNS (with their FK and index) where a table lacks them. Idempotent."""
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    for table_name, column_name in ADDED_COLUMNS:
+        if table_name not in tables:
+            continue
+        if column_name in {c["name"] for c in inspector.get_columns(table_name)}:
+            continue
+        column = Base.metadata.tables[table_name].c[column_name]
+        with bind.begin() as conn:
+            ddl = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column.type.compile(dialect=conn.dialect)}"
+            for fk in column.foreign_keys:
+                ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+            conn.exec_driver_sql(ddl)
+            for index in column.table.indexes:
+                if list(index.columns) == [column]:
+                    index.create(conn)
+        print(f"Added column {table_name}.{column_name}")
+
+
+def init_db():
+    """Create all tables (dev / SQLite schema setup) and add new columns. Run with: python -m app.database"""
+    import app.models  # noqa: F401 - register models on Base.metadata
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+
+
+if __name__ == "__main__":
+    # Under -m this file runs as __main__, with a Base of its own; the models
+    # register on app.database.Base, so create the tables through that module
+    import app.database as database
+    database.init_db()
+    print("Database tables created.")
@@ -1,23 +1,54 @@
 """
 Goal Achiever API - Main FastAPI Application
 """
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
-from app.database import engine, Base
-from app.routes import auth, goals, plans, chat
+from app.database import init_db
+from app.middleware import RateLimitMiddleware, ProfilingMiddleware, ContentEncodingMiddleware
+from app.routes import auth, goals, plans, chat, sync, search, stats, admin, programs, account
+from app.services.ai_generator import close_ai_generator
+from app.services.chat_buffer import close_chat_buffer
+from app.services.quotas import QuotaExceeded, close_usage_tracker
+from app.services.leader import close_leader_elector, get_leader_elector
+from app.services.shared_state import close_state_backend
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup / shutdown hooks. Nothing touches the DB or AI client at import time."""
+    # Create tables only when asked (SQLite / dev mode)
+    if settings.CREATE_TABLES_ON_STARTUP:
+        init_db()
+    # One worker at a time holds the leader lease and runs the periodic jobs
+    get_leader_elector().start()
+    yield
+    await close_leader_elector()
+    # Write out chat messages still waiting in the write-behind buffer
+    await close_chat_buffer()
+    await close_usage_tracker()
+    close_state_backend()
+    # The shared AI client is created lazily on first use; release its connection pool
+    await close_ai_generator()
 
-# Auto-create tables (for SQLite / dev mode)
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Goal Achiever API",
     description="AI-powered goal tracking and daily plan generation",
     version="0.1.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# Per-user rate limits and AI quotas (added first so CORS headers wrap its 429s)
+app.add_middleware(RateLimitMiddleware)
+
+# gzip / brotli compression and MessagePack negotiation
+app.add_middleware(ContentEncodingMiddleware)
+
 # CORS middleware - allow both web frontend and mobile app
 app.add_middleware(
     CORSMiddleware,
@@ -27,11 +58,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost: slow-request log and on-demand profiling see the whole request
+app.add_middleware(ProfilingMiddleware)
+
+@app.exception_handler(QuotaExceeded)
+async def quota_exceeded_handler(request: Request, exc: QuotaExceeded):
+    """An AI quota ran out mid-request (the up-front check is in RateLimitMiddleware)"""
+    return JSONResponse(
+        {"detail": exc.detail},
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(goals.router, prefix="/goals", tags=["Goals"])
 app.include_router(plans.router, prefix="/plans", tags=["Plans"])
 app.include_router(chat.router, prefix="/chat", tags=["Chat"])
+app.include_router(sync.router, prefix="/sync", tags=["Sync"])
+app.include_router(search.router, prefix="/search", tags=["Search"])
+app.include_router(stats.router, prefix="/stats", tags=["Stats"])
+app.include_router(account.router, tags=["Account"])
+app.include_router(programs.router, prefix="/programs", tags=["Programs"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 
 
 @app.get("/", tags=["Health"])
@@ -0,0 +1,312 @@
+"""
+ASGI middleware
+"""
+import hmac
+import json
+import random
+import time
+import zlib
+from typing import List, Optional, Tuple
+from jose import JWTError, jwt
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.websockets import WebSocketClose
+from fastapi import status
+from app.config import settings
+from app.services import profiler, quotas
+
+
+def _token_user_id(scope) -> Optional[str]:
+    """User id from a Bearer header (or ?token= on WebSockets), without touching the database"""
+    token = None
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, credentials = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                token = credentials
+            break
+    if token is None and scope["type"] == "websocket":
+        for pair in scope.get("query_string", b"").decode("latin-1").split("&"):
+            key, _, value = pair.partition("=")
+            if key == "token":
+                token = value
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+class RateLimitMiddleware:
+    """
+    Per-route request rate limits and LLM quota pre-checks, answered with
+    429 + Retry-After. Also binds the caller to `quotas.current_user_id` so
+    Gemini calls made while serving the request are billed to them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.llm_routes = quotas.compile_route_patterns(settings.QUOTA_LLM_ROUTES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        user_id = _token_user_id(scope)
+        method = scope.get("method", "GET")
+        path = scope["path"]
+
+        if settings.RATE_LIMIT_ENABLED and method != "OPTIONS":
+            client = f"user:{user_id}" if user_id else f"ip:{(scope.get('client') or ('unknown',))[0]}"
+            retry_after = quotas.get_rate_limiter().hit(client, method, path)
+            detail = "Rate limit exceeded"
+            if not retry_after and user_id:
+                segments = path.strip("/").split("/")
+                if any(quotas.route_matches(route, method, segments) for route in self.llm_routes):
+                    try:
+                        quotas.get_usage_tracker().check(user_id)
+                    except quotas.QuotaExceeded as e:
+                        retry_after, detail = e.retry_after, e.detail
+            if retry_after:
+                await self._reject(scope, receive, send, detail, retry_after)
+                return
+
+        if user_id:
+            quotas.get_usage_tracker().record_request(user_id)
+        token = quotas.current_user_id.set(user_id)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            quotas.current_user_id.reset(token)
+
+    @staticmethod
+    async def _reject(scope, receive, send, detail: str, retry_after: int):
+        if scope["type"] == "websocket":
+            await WebSocketClose(code=status.WS_1013_TRY_AGAIN_LATER, reason=detail)(scope, receive, send)
+            return
+        response = JSONResponse(
+            {"detail": detail},
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(retry_after)}
+        )
+        await response(scope, receive, send)
+
+
+class ProfilingMiddleware:
+    """
+    Logs slow requests and profiles requests on demand (X-Profile header with
+    PROFILE_TOKEN) or at PROFILE_SAMPLE_RATE. Profiled responses carry X-Profile-Id.
+    Other requests have their SQL timed (PROFILE_SQL_ALWAYS) and kept when slow.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _reason(self, scope) -> Optional[str]:
+        if settings.PROFILE_TOKEN:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-profile":
+                    if hmac.compare_digest(value, settings.PROFILE_TOKEN.encode()):
+                        return "header"
+                    break
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        reason = self._reason(scope)
+        profile = sampler = None
+        if reason is not None:
+            profile, sampler = profiler.start_profile(scope["method"], scope["path"], reason)
+        elif settings.PROFILE_SQL_ALWAYS:
+            profile = profiler.start_sql_capture(scope["method"], scope["path"])
+        status_code = None
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if reason == "header":
+                    message = dict(message, headers=[*message.get("headers", []), (b"x-profile-id", profile.id.encode())])
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            stored = profile is not None and profiler.finish_profile(profile, sampler, status_code, duration_ms)
+            if duration_ms >= settings.PROFILE_SLOW_MS:
+                note = f" profile={profile.id} sql={profile.sql_count} in {profile.sql_ms:.0f} ms" if stored else ""
+                print(f"Slow request: {scope['method']} {scope['path']} -> {status_code} in {duration_ms:.0f} ms{note}")
+
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/msgpack",
+    "application/javascript", "application/xml",
+)
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+def _accepted(header: str) -> List[Tuple[str, float]]:
+    """(token, q) pairs of an Accept / Accept-Encoding header, q > 0 only"""
+    accepted = []
+    for part in header.split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if token and q > 0:
+            accepted.append((token.lower(), q))
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """"br" or "gzip" per the client's Accept-Encoding (brotli wins ties), None for identity"""
+    best, best_q = None, 0.0
+    for token, q in _accepted(accept_encoding):
+        if token == "*":
+            token = "gzip"
+        if token in ("br", "gzip") and (q > best_q or (q == best_q and token == "br")):
+            best, best_q = token, q
+    return best
+
+
+def accepts_msgpack(accept: str) -> bool:
+    return any(token in MSGPACK_TYPES for token, _ in _accepted(accept))
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """One-shot compression of a complete body"""
+    if encoding == "br":
+        import brotli  # Imported on first use, off the startup path
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+class StreamCompressor:
+    """Incremental gzip/brotli; every chunk is flushed so streamed responses keep streaming"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            import brotli
+            self._brotli = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._gzip = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._gzip.flush()
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.split(";")[0].endswith("+json")
+
+
+class ContentEncodingMiddleware:
+    """
+    Response content negotiation:
+
+    - bodies of compressible types at least COMPRESSION_MIN_SIZE bytes are
+      compressed with brotli or gzip per Accept-Encoding; streamed responses
+      are compressed chunk by chunk;
+    - on MSGPACK_ROUTES, clients sending `Accept: application/msgpack` get the
+      JSON body re-encoded as MessagePack.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.msgpack_routes = quotas.compile_route_patterns(settings.MSGPACK_ROUTES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(_header(scope, b"accept-encoding")) if settings.COMPRESSION_ENABLED else None
+        segments = scope["path"].strip("/").split("/")
+        to_msgpack = accepts_msgpack(_header(scope, b"accept")) and any(
+            quotas.route_matches(route, scope["method"], segments) for route in self.msgpack_routes
+        )
+        if encoding is None and not to_msgpack:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if compressor is not None:
+                # Streamed body, already negotiated
+                body = compressor.compress(message.get("body", b""))
+                if not message.get("more_body", False):
+                    body += compressor.finish()
+                await send({"type": "http.response.body", "body": body, "more_body": message.get("more_body", False)})
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            content_type = headers.get("content-type", "")
+            if to_msgpack and not more_body and content_type.startswith("application/json") and start_message["status"] < 300:
+                import msgpack  # Imported on first use, off the startup path
+                body = msgpack.packb(json.loads(body), use_bin_type=True)
+                content_type = headers["content-type"] = "application/msgpack"
+                headers["content-length"] = str(len(body))
+            if to_msgpack:
+                headers.add_vary_header("Accept")
+
+            compressible = encoding is not None and "content-encoding" not in headers and is_compressible(content_type)
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            if compressible and more_body:
+                compressor = StreamCompressor(encoding)
+                headers["content-encoding"] = encoding
+                del headers["content-length"]
+                await send(start_message)
+                await send({"type": "http.response.body", "body": compressor.compress(body), "more_body": True})
+                return
+            if compressible and len(body) >= settings.COMPRESSION_MIN_SIZE:
+                body = compress(body, encoding)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+
+            passthrough = True
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -3,10 +3,12 @@ SQLAlchemy database models
 Supports both PostgreSQL (UUID, JSONB) and SQLite (String, JSON) backends.
 """
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 from sqlalchemy import (
-    Column, String, Integer, Boolean, DateTime, ForeignKey, Text, Date, JSON
+    Column, String, Integer, Boolean, DateTime, ForeignKey, Text, Date, JSON, LargeBinary,
+    UniqueConstraint, Index
 )
+from sqlalchemy import DDL, event, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 from app.config import settings
@@ -48,7 +50,8 @@ class DayPlan(Base):
     date = Column(Date, nullable=False, index=True)
     
     topic = Column(String, nullable=True) # High level topic for the day
-    content = Column(JSON, nullable=True) # Detailed AI generated content for the day
+    inline_content = Column("content", JSON, nullable=True) # Legacy per-row copy of the day content
+    content_hash = Column(String(64), ForeignKey("content_templates.hash"), nullable=True, index=True)
     
     completed = Column(Boolean, default=False, nullable=False)
     completed_at = Column(DateTime, nullable=True)
@@ -56,6 +59,22 @@ class DayPlan(Base):
     
     goal = relationship("Goal", back_populates="day_plans")
     notes = relationship("Note", back_populates="day_plan", cascade="all, delete-orphan")
+    # Loaded on access; routes that return the content ask for it with joinedload
+    template = relationship("ContentTemplate", lazy="select")
+
+    @property
+    def content(self):
+        """Day content, resolved from the shared template library when referenced"""
+        if self.template is not None:
+            return self.template.content
+        return self.inline_content
+
+    @content.setter
+    def content(self, value):
+        # The row owns its content from now on; the shared template is left as is
+        self.inline_content = value
+        self.content_hash = None
+        self.template = None
 
 class Note(Base):
     __tablename__ = "notes"
@@ -69,6 +88,11 @@ class Note(Base):
     day_plan = relationship("DayPlan", back_populates="notes")
 
 class ChatMessage(Base):
+    """
+    Hot chat history. On PostgreSQL the table is range-partitioned by month on
+    created_at (hence created_at in the primary key); idle sessions are moved
+    to ChatArchive by app.services.chat_archive.
+    """
     __tablename__ = "chat_messages"
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
@@ -77,6 +101,228 @@ class ChatMessage(Base):
     role = Column(String(20), nullable=False)
     content = Column(Text, nullable=False)
     context_topic = Column(String(200), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, primary_key=True)
     
     user = relationship("User", back_populates="chat_messages")
+
+    __table_args__ = (
+        Index("ix_chat_messages_user_session_created", "user_id", "session_id", "created_at"),
+        Index("ix_chat_messages_created_at", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+def _month_start(day: date, offset: int = 0) -> date:
+    month = day.year * 12 + day.month - 1 + offset
+    return date(month // 12, month % 12 + 1, 1)
+
+def chat_messages_partitioned(connection) -> bool:
+    """PostgreSQL: whether chat_messages is a partitioned table (create_all never converts an existing one)"""
+    return connection.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass('chat_messages')")
+    ).scalar() == "p"
+
+def create_chat_partitions(connection, start: date, months: int):
+    """
+    PostgreSQL: create monthly chat_messages partitions from start's month
+    onwards (idempotent). PostgreSQL refuses a new partition while the DEFAULT
+    partition holds rows of its range, so those rows are moved into it: the
+    default is detached, emptied of the month and attached again, all in the
+    caller's transaction.
+    """
+    has_default = connection.execute(text("SELECT to_regclass('chat_messages_default')")).scalar() is not None
+    for offset in range(months):
+        lower, upper = _month_start(start, offset), _month_start(start, offset + 1)
+        name = f"chat_messages_p{lower:%Y%m}"
+        if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+            continue
+        create = (f"CREATE TABLE {name} PARTITION OF chat_messages "
+                  f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')")
+        in_range = f"created_at >= '{lower.isoformat()}' AND created_at < '{upper.isoformat()}'"
+        if not has_default or connection.execute(
+            text(f"SELECT 1 FROM chat_messages_default WHERE {in_range} LIMIT 1")
+        ).first() is None:
+            connection.execute(text(create))
+            continue
+        connection.execute(text("ALTER TABLE chat_messages DETACH PARTITION chat_messages_default"))
+        connection.execute(text(create))
+        connection.execute(text(f"INSERT INTO {name} SELECT * FROM chat_messages_default WHERE {in_range}"))
+        connection.execute(text(f"DELETE FROM chat_messages_default WHERE {in_range}"))
+        connection.execute(text("ALTER TABLE chat_messages ATTACH PARTITION chat_messages_default DEFAULT"))
+
+@event.listens_for(ChatMessage.__table__, "after_create")
+def _create_initial_chat_partitions(target, connection, **kw):
+    if connection.dialect.name != "postgresql":
+        return
+    create_chat_partitions(connection, datetime.utcnow().date(), settings.CHAT_PARTITION_MONTHS_AHEAD + 1)
+    # Catches anything outside the monthly ranges (e.g. imported history)
+    connection.execute(text("CREATE TABLE IF NOT EXISTS chat_messages_default PARTITION OF chat_messages DEFAULT"))
+
+class ChatArchive(Base):
+    """An idle chat session moved out of chat_messages, stored as compressed JSON"""
+    __tablename__ = "chat_archives"
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    session_id = Column(String(36), primary_key=True)
+    context_topic = Column(String(200), nullable=True)
+    message_count = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    last_message_at = Column(DateTime, nullable=False, index=True)
+    payload = Column(LargeBinary, nullable=False) # zlib-compressed JSON list of messages
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (Index("ix_chat_archives_user_last", "user_id", "last_message_at"),)
+
+class ContentTemplate(Base):
+    """Generated day content stored once, addressed by the hash of its JSON"""
+    __tablename__ = "content_templates"
+
+    hash = Column(String(64), primary_key=True)
+    topic_key = Column(String, nullable=True, index=True)
+    content = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class GoalTemplate(Base):
+    """Curated goal program: ordered day topics referencing content templates"""
+    __tablename__ = "goal_templates"
+    __table_args__ = (UniqueConstraint("title_key", "total_days"),)
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    title_key = Column(String, nullable=False, index=True)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=True)
+    total_days = Column(Integer, nullable=False)
+    days = Column(JSON, nullable=False) # [{"topic": ..., "content_hash": ...}]
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class ChangeLog(Base):
+    """Outbound change log; the autoincrement id is the sync cursor (in commit order per user, see change_log)"""
+    __tablename__ = "change_log"
+    __table_args__ = (Index("ix_change_log_user_cursor", "user_id", "id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    entity_type = Column(String(20), nullable=False) # "goal" (with all its day plans), "day_plan", "note"
+    entity_id = Column(String(36), nullable=False)
+    op = Column(String(10), nullable=False, default="upsert") # "upsert" or "delete"
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class SearchDocument(Base):
+    """
+    Searchable text of notes, chat messages and day plans, maintained on write.
+    Indexed by SQLite FTS5 (search_fts) or a PostgreSQL tsvector GIN index.
+    """
+    __tablename__ = "search_documents"
+    __table_args__ = (
+        UniqueConstraint("kind", "ref_id"),
+        Index("ix_search_documents_user_kind", "user_id", "kind"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True) # rowid of the FTS5 index
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    kind = Column(String(20), nullable=False) # "note", "chat" or "day_plan"
+    ref_id = Column(String(36), nullable=False)
+    parent_id = Column(String(36), nullable=True) # day plan of a note, session of a chat message, goal of a day plan
+    title = Column(String, nullable=True)
+    body = Column(Text, nullable=False, default="")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+# SQLite: external-content FTS5 table kept in sync by triggers
+for _statement in (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+        title, body, content='search_documents', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN
+        INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN
+        INSERT INTO search_fts(search_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO search_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END""",
+):
+    event.listen(SearchDocument.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+# PostgreSQL: expression GIN index, maintained by the database on every write
+event.listen(
+    SearchDocument.__table__,
+    "after_create",
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_search_documents_tsv ON search_documents "
+        "USING GIN (to_tsvector('english', coalesce(title, '') || ' ' || body))"
+    ).execute_if(dialect="postgresql")
+)
+
+class GoalStats(Base):
+    """Per-goal progress counters, maintained transactionally on write"""
+    __tablename__ = "goal_stats"
+
+    goal_id = Column(String(36), ForeignKey("goals.id"), primary_key=True)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
+    total_days = Column(Integer, default=0, nullable=False)
+    completed_count = Column(Integer, default=0, nullable=False)
+    current_streak = Column(Integer, default=0, nullable=False) # consecutive days with a completion
+    longest_streak = Column(Integer, default=0, nullable=False)
+    last_completed_date = Column(Date, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+class UserStats(Base):
+    """Per-user progress counters across all goals, maintained transactionally on write"""
+    __tablename__ = "user_stats"
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    goals_count = Column(Integer, default=0, nullable=False)
+    total_days = Column(Integer, default=0, nullable=False)
+    completed_count = Column(Integer, default=0, nullable=False)
+    current_streak = Column(Integer, default=0, nullable=False)
+    longest_streak = Column(Integer, default=0, nullable=False)
+    last_completed_date = Column(Date, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+class UserUsage(Base):
+    """Per-user daily request and LLM usage, flushed periodically from memory"""
+    __tablename__ = "user_usage"
+
+    user_id = Column(String(36), ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True) # UTC
+    requests = Column(Integer, default=0, nullable=False)
+    llm_calls = Column(Integer, default=0, nullable=False)
+    tokens = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (Index("ix_user_usage_day_tokens", "day", "tokens"),)
+
+class Program(Base):
+    """Coach-defined goal program, generated once and fanned out to a cohort"""
+    __tablename__ = "programs"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    owner_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=True)
+    total_days = Column(Integer, nullable=False)
+    days = Column(JSON, nullable=False) # [{"topic": ..., "content_hash": ...}]
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class ProgramEnrollment(Base):
+    """A cohort member's own goal created from a program"""
+    __tablename__ = "program_enrollments"
+    __table_args__ = (UniqueConstraint("program_id", "user_id"),)
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    program_id = Column(String(36), ForeignKey("programs.id"), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
+    goal_id = Column(String(36), ForeignKey("goals.id"), nullable=False, unique=True)
+    start_date = Column(Date, nullable=False)
+    enrolled_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class ProgramInvitation(Base):
+    """A coach's pending invitation to a program; the member's goal is created when they accept"""
+    __tablename__ = "program_invitations"
+
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    program_id = Column(String(36), ForeignKey("programs.id"), nullable=False, index=True)
+    email = Column(String, nullable=True, index=True) # Lower-cased; may not be registered (yet)
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=True, index=True)
+    start_date = Column(Date, nullable=False)
+    invited_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,89 @@
+"""
+Account routes - streaming full-account export and bulk import
+"""
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.database import ReadSessionLocal, get_db
+from app.models import User
+from app.schemas import AccountImportResponse
+from app.auth import get_current_user
+from app.services import account_transfer, chat_buffer
+
+router = APIRouter()
+
+
+@router.get("/export")
+async def export_account(
+    gzip: bool = Query(False, description="Return the NDJSON gzip-compressed (.ndjson.gz)"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Stream every goal, day plan, note and chat message of the account as
+    NDJSON. Rows are read with cursors and written as they are fetched, so
+    large accounts export in constant memory.
+    """
+    buffer = chat_buffer.get_chat_buffer()
+    if buffer is not None:
+        # Include chat messages still waiting in the write-behind buffer
+        await asyncio.to_thread(buffer.flush)
+
+    user_id = current_user.id
+
+    def stream():
+        # Own session: the response body is produced after the route returns
+        db = ReadSessionLocal()
+        try:
+            user = db.get(User, user_id)
+            yield from account_transfer.export_stream(db, user, gzip=gzip)
+        finally:
+            db.close()
+
+    filename = f"goal-achiever-export-{datetime.utcnow():%Y%m%d}.ndjson" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream(),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/import", response_model=AccountImportResponse)
+async def import_account(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Import an export stream (NDJSON body, plain or gzip) into the current
+    account. Everything gets new ids, so importing into the account it came
+    from duplicates it. The body is parsed as it arrives and written in
+    batches; the whole import is one transaction.
+    """
+    decoder = account_transfer.NDJSONDecoder()
+    importer = account_transfer.AccountImporter(db, current_user.id)
+    batch = []
+    try:
+        async for chunk in request.stream():
+            for record in decoder.feed(chunk):
+                batch.append(record)
+                if len(batch) >= account_transfer.IMPORT_BATCH_SIZE:
+                    await asyncio.to_thread(importer.feed, batch)
+                    batch = []
+        batch.extend(decoder.close())
+        await asyncio.to_thread(importer.feed, batch)
+        imported = await asyncio.to_thread(importer.finish)
+        db.commit()
+    except account_transfer.ImportFormatError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return AccountImportResponse(
+        goals=imported["goal"],
+        day_plans=imported["day_plan"],
+        notes=imported["note"],
+        chat_messages=imported["chat_message"],
+        content=imported["content"],
+        skipped=importer.skipped
+    )
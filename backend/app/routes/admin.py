@@ -0,0 +1,73 @@
+"""
+Admin routes - usage monitoring and request profiles
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models import User
+from app.schemas import TopConsumersResponse, UsageConsumer
+from app.auth import get_admin_user
+from app.services import profiler, quotas
+
+router = APIRouter()
+
+
+@router.get("/usage/top", response_model=TopConsumersResponse)
+async def get_top_consumers(
+    days: int = Query(1, ge=1, le=90, description="Window in UTC days, ending today"),
+    limit: int = Query(20, ge=1, le=200),
+    admin: User = Depends(get_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Users ranked by LLM tokens used over the last `days` days"""
+    # Include this process's usage that has not been written yet
+    await asyncio.to_thread(quotas.get_usage_tracker().flush)
+
+    until = datetime.utcnow().date()
+    since = until - timedelta(days=days - 1)
+    rows = quotas.top_consumers(db, since, until, limit)
+    return TopConsumersResponse(
+        since=since,
+        until=until,
+        consumers=[UsageConsumer.model_validate(r._mapping) for r in rows]
+    )
+
+
+@router.get("/profiles", response_model=list[dict])
+async def list_profiles(admin: User = Depends(get_admin_user)):
+    """Stored request profiles, newest first"""
+    return [p.summary() for p in profiler.get_profile_store().list()]
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(
+    profile_id: str,
+    format: Literal["speedscope", "collapsed", "json"] = Query("speedscope"),
+    admin: User = Depends(get_admin_user)
+):
+    """
+    Download a profile: speedscope JSON (open at https://www.speedscope.app),
+    collapsed stacks (flamegraph.pl), or json with the captured SQL statements.
+    """
+    profile = profiler.get_profile_store().get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    if format == "collapsed":
+        body, media_type, filename = profile.to_collapsed(), "text/plain", f"{profile_id}.folded"
+    elif format == "speedscope":
+        body, media_type, filename = json.dumps(profile.to_speedscope()), "application/json", f"{profile_id}.speedscope.json"
+    else:
+        detail = dict(
+            profile.summary(),
+            sql=[{"statement": s, "ms": ms} for s, ms in profile.sql],
+            sql_by_statement=profile.sql_by_statement(),
+            stacks=profile.to_collapsed(),
+        )
+        body, media_type, filename = json.dumps(detail), "application/json", f"{profile_id}.json"
+    return Response(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -2,25 +2,30 @@
 Chat routes - Interactive LLM-based practice conversations
 """
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, status
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, get_read_db, SessionLocal
 from app.models import User, ChatMessage
 from app.schemas import ChatRequest, ChatResponse, ChatHistoryResponse, ChatMessageResponse
-from app.auth import get_current_user
-from app.services.ai_generator import AIPlanGenerator
+from app.auth import get_admin_user, get_current_user, get_user_from_token
+from app.services.ai_generator import AIPlanGenerator, get_ai_generator
+from app.services import chat_archive, chat_buffer, chat_store, tutor_prompts
+from app.services.semantic_cache import SemanticCache, get_semantic_cache
+from app.services.chat_socket import ChatConnection
+from app.services.quotas import QuotaExceeded
+from app.config import settings
 
 router = APIRouter()
 
-# Shared AI instance
-_ai = AIPlanGenerator()
-
 
 @router.post("", response_model=ChatResponse)
 async def send_chat_message(
     chat_data: ChatRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    ai_generator: AIPlanGenerator = Depends(get_ai_generator),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache)
 ):
     """
     Send a message to the AI tutor and get an interactive response.
@@ -29,83 +34,94 @@ async def send_chat_message(
     session_id = chat_data.session_id or str(uuid.uuid4())
 
     # Load recent conversation history for context (last 10 messages)
-    history = db.query(ChatMessage).filter(
-        ChatMessage.user_id == current_user.id,
-        ChatMessage.session_id == session_id
-    ).order_by(ChatMessage.created_at.desc()).limit(10).all()
-
-    history.reverse()  # chronological order
-
-    # Build conversation context
-    conversation_parts = []
-    for msg in history:
-        conversation_parts.append(f"{'User' if msg.role == 'user' else 'Assistant'}: {msg.content}")
-    conversation_parts.append(f"User: {chat_data.message}")
-    conversation_text = "\n".join(conversation_parts)
-
-    # Build prompt
-    context_hint = ""
-    if chat_data.context_topic:
-        context_hint = f"\nThe user is currently studying: {chat_data.context_topic}. Tailor your response to this topic."
-
-    prompt = f"""You are an expert AI tutor specializing in technical interview preparation covering Data Structures & Algorithms (DSA), System Design, and Generative AI.
-
-Your role:
-- Explain concepts clearly with examples
-- When asked about DSA, provide Python code solutions with step-by-step explanations
-- When asked about System Design, discuss architecture, tradeoffs, and scalability
-- When asked about GenAI, explain LLM concepts, transformers, RAG, fine-tuning, etc.
-- Give constructive feedback on the user's answers
-- Ask follow-up questions to deepen understanding
-- Keep responses concise but thorough
-- Use code blocks for any code snippets{context_hint}
-
-Conversation so far:
-{conversation_text}
-
-Provide a helpful, encouraging response as the AI tutor:"""
+    buffered = chat_buffer.buffered_messages(current_user.id, session_id)
+    history = chat_archive.session_messages(db, current_user.id, session_id, limit=10)
+    history = chat_buffer.merge(history, buffered)[-10:]  # chronological order
 
-    try:
-        reply = await _ai._call_gemini_api(prompt)
-    except Exception as e:
-        print(f"Chat AI failed: {e}")
-        reply = "I'm having trouble connecting to the AI service right now. Please try again in a moment."
-
-    # Save user message
-    user_msg = ChatMessage(
-        user_id=current_user.id,
-        session_id=session_id,
-        role="user",
-        content=chat_data.message,
-        context_topic=chat_data.context_topic
+    prompt = tutor_prompts.build_tutor_prompt(
+        [(msg.role, msg.content) for msg in history], chat_data.message, chat_data.context_topic
     )
-    db.add(user_msg)
 
-    # Save assistant reply
-    assistant_msg = ChatMessage(
-        user_id=current_user.id,
-        session_id=session_id,
-        role="assistant",
-        content=reply,
-        context_topic=chat_data.context_topic
+    # Context-free first turns can be answered from the semantic cache
+    use_cache = (
+        settings.SEMANTIC_CACHE_ENABLED and chat_data.use_cache
+        and not history and not chat_data.history
+    )
+    reply = semantic_cache.lookup(chat_data.message, chat_data.context_topic) if use_cache else None
+    cached = reply is not None
+
+    if not cached:
+        try:
+            reply = await ai_generator._call_gemini_api(prompt)
+            if use_cache and ai_generator.client is not None:
+                semantic_cache.store(chat_data.message, reply, chat_data.context_topic)
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Chat AI failed: {e}")
+            reply = "I'm having trouble connecting to the AI service right now. Please try again in a moment."
+
+    # Save the user message and assistant reply
+    await chat_buffer.save_chat_messages(
+        db, chat_store.build_chat_turn(current_user.id, session_id, chat_data.message, reply, chat_data.context_topic)
     )
-    db.add(assistant_msg)
     db.commit()
 
-    return ChatResponse(reply=reply, session_id=session_id)
+    return ChatResponse(reply=reply, session_id=session_id, cached=cached)
+
+
+@router.websocket("/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None, description="JWT (browsers cannot set headers on WebSockets)"),
+    ai_generator: AIPlanGenerator = Depends(get_ai_generator),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache)
+):
+    """
+    Persistent chat channel: authenticates once, multiplexes sessions and
+    streams replies. See app/services/chat_socket.py for the frame protocol.
+    """
+    if token is None:
+        scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+
+    db = SessionLocal()
+    try:
+        user_id = get_user_from_token(db, token).id if token else None
+    except HTTPException:
+        user_id = None
+    finally:
+        db.close()
+
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    await ChatConnection(websocket, user_id, ai_generator, semantic_cache).run()
+
+
+@router.get("/cache/stats", response_model=dict)
+async def get_cache_stats(
+    admin: User = Depends(get_admin_user),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache)
+):
+    """Semantic answer cache metrics (hit rate, size, evictions); admins only"""
+    return semantic_cache.stats()
 
 
 @router.get("/history/{session_id}", response_model=ChatHistoryResponse)
 async def get_chat_history(
     session_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get chat history for a session"""
-    messages = db.query(ChatMessage).filter(
-        ChatMessage.user_id == current_user.id,
-        ChatMessage.session_id == session_id
-    ).order_by(ChatMessage.created_at.asc()).all()
+    # Snapshot the write-behind buffer first so a message committed meanwhile is still seen
+    buffered = chat_buffer.buffered_messages(current_user.id, session_id)
+    # Archived sessions are read through transparently
+    messages = chat_archive.session_messages(db, current_user.id, session_id)
+    messages = chat_buffer.merge(messages, buffered)
 
     return ChatHistoryResponse(
         session_id=session_id,
@@ -116,30 +132,60 @@ async def get_chat_history(
 @router.get("/sessions", response_model=list[dict])
 async def list_chat_sessions(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List all chat sessions for the current user"""
-    from sqlalchemy import func, distinct
+    from sqlalchemy import and_, func
 
-    sessions = db.query(
+    # One row per session (a session may have changed topic), then the topic of its last message
+    latest = db.query(
         ChatMessage.session_id,
-        ChatMessage.context_topic,
         func.min(ChatMessage.created_at).label("started_at"),
-        func.count(ChatMessage.id).label("message_count")
+        func.count(ChatMessage.id).label("message_count"),
+        func.max(ChatMessage.created_at).label("last_message_at")
     ).filter(
         ChatMessage.user_id == current_user.id
     ).group_by(
-        ChatMessage.session_id, ChatMessage.context_topic
+        ChatMessage.session_id
     ).order_by(
         func.max(ChatMessage.created_at).desc()
-    ).limit(20).all()
-
-    return [
-        {
+    ).limit(20).subquery()
+
+    sessions = db.query(latest, ChatMessage.context_topic).join(
+        ChatMessage, and_(
+            ChatMessage.user_id == current_user.id,
+            ChatMessage.session_id == latest.c.session_id,
+            ChatMessage.created_at == latest.c.last_message_at
+        )
+    ).all()
+
+    listed = {}
+    for s in sessions:
+        # setdefault: messages sharing the last timestamp yield one entry
+        listed.setdefault(s.session_id, {
             "session_id": s.session_id,
             "context_topic": s.context_topic,
-            "started_at": s.started_at.isoformat() if s.started_at else None,
-            "message_count": s.message_count
-        }
-        for s in sessions
-    ]
+            "started_at": s.started_at,
+            "message_count": s.message_count,
+            "last_message_at": s.last_message_at
+        })
+    # Archived sessions count too; the 20 most recently active overall are returned.
+    # A session resumed after archival is partly archived: both parts are counted.
+    for archive in chat_archive.archived_sessions(db, current_user.id, 20, include=set(listed)):
+        entry = listed.get(archive.session_id)
+        if entry is not None:
+            entry["message_count"] += archive.message_count
+            entry["started_at"] = archive.started_at
+        else:
+            listed[archive.session_id] = {
+                "session_id": archive.session_id,
+                "context_topic": archive.context_topic,
+                "started_at": archive.started_at,
+                "message_count": archive.message_count,
+                "last_message_at": archive.last_message_at
+            }
+    recent = sorted(listed.values(), key=lambda s: s["last_message_at"], reverse=True)[:20]
+    for s in recent:
+        del s["last_message_at"]
+        s["started_at"] = s["started_at"].isoformat()
+    return recent
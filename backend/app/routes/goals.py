@@ -4,98 +4,267 @@ Goal routes
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from datetime import datetime, date, timedelta
-from app.database import get_db
-from app.models import User, Goal, DayPlan
-from app.schemas import GoalCreateRequest, GoalResponse
+from app.database import get_db, get_read_db
+from app.models import User, Goal, DayPlan, Note, generate_uuid
+from app.schemas import GoalCreateRequest, GoalResponse, GoalReplanRequest, GoalReplanResponse
 from app.auth import get_current_user
-from app.services.ai_generator import AIPlanGenerator
+from app.services.ai_generator import AIPlanGenerator, get_ai_generator
+from app.services.quotas import QuotaExceeded
+from app.services import template_library, change_log, search, stats
 
 router = APIRouter()
-ai_generator = AIPlanGenerator()
 
 @router.post("", response_model=GoalResponse, status_code=status.HTTP_201_CREATED)
 async def create_goal(
     goal_data: GoalCreateRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    ai_generator: AIPlanGenerator = Depends(get_ai_generator)
 ):
     """
     Create a new goal and generate the daily outline.
+
+    The outline and day contents are generated before anything is written, so
+    a request stopped by the AI quota (429) leaves no half-created goal behind.
     """
     start_date = date.fromisoformat(goal_data.start_date) if goal_data.start_date else date.today()
-    
+
+    # Curated programs from the template library need no LLM calls at all
+    library_days = None
+    if goal_data.use_ai:
+        template = template_library.find_goal_template(
+            db, goal_data.title, goal_data.total_days, goal_data.description
+        )
+        if template:
+            library_days = template.days
+
+    # Generate daily outline
+    topics = []
+    if library_days:
+        topics = [d["topic"] for d in library_days]
+    elif goal_data.use_ai:
+        try:
+            topics = await ai_generator.generate_goal_outline(goal_data.title, goal_data.description, goal_data.total_days)
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Goal outline generation failed: {e}")
+
+    # Fallback to defaults
+    if not topics or len(topics) < goal_data.total_days:
+        topics = [f"Daily progress for {goal_data.title}" for i in range(goal_data.total_days)]
+    topics = topics[:goal_data.total_days]
+
+    plan_hashes = [d["content_hash"] for d in library_days] if library_days else [None] * len(topics)
+
+    # If AI requested, resolve daily contents from the library, generating only unseen topics
+    if goal_data.use_ai and not library_days:
+        try:
+            plan_hashes = await template_library.build_day_contents(
+                db,
+                ai_generator,
+                goal_data.title,
+                goal_data.description,
+                topics,
+                range(1, len(topics) + 1)
+            )
+        except QuotaExceeded:
+            # Keep the library content generated so far; a retry reuses it
+            db.commit()
+            raise
+
     new_goal = Goal(
+        id=generate_uuid(),
         user_id=current_user.id,
         title=goal_data.title,
         description=goal_data.description,
         total_days=goal_data.total_days,
         start_date=start_date
     )
-    
     db.add(new_goal)
-    db.commit()
-    db.refresh(new_goal)
 
-    # Generate daily outline
-    topics = []
-    if goal_data.use_ai:
-        try:
-            topics = await ai_generator.generate_goal_outline(new_goal.title, new_goal.description, new_goal.total_days)
-        except Exception as e:
-            print(f"Goal outline generation failed: {e}")
-
-    # Fallback to defaults
-    if not topics or len(topics) < new_goal.total_days:
-        topics = [f"Daily progress for {new_goal.title}" for i in range(new_goal.total_days)]
-
-    day_plans = []
-    for i in range(new_goal.total_days):
-        day_date = start_date + timedelta(days=i)
-        topic = topics[i]
-        
-        day_plan = DayPlan(
+    plan_ids = []
+    for i, (topic, content_hash) in enumerate(zip(topics, plan_hashes)):
+        plan_id = generate_uuid()
+        plan_ids.append(plan_id)
+        db.add(DayPlan(
+            id=plan_id,
             goal_id=new_goal.id,
             day_number=i + 1,
-            date=day_date,
+            date=start_date + timedelta(days=i),
             topic=topic,
-            content=None,
+            content_hash=content_hash,
             completed=False
-        )
-        day_plans.append(day_plan)
-        db.add(day_plan)
-        
+        ))
+
+    # A goal entry in the change log covers the goal and all of its day plans
+    change_log.record_change(db, current_user.id, change_log.GOAL, new_goal.id)
+    stats.on_goal_created(db, current_user.id, new_goal.id, len(plan_ids))
+    # Library content added above must be visible to the search indexer
+    db.flush()
+
+    # Index day topics and content for search
+    search.index_day_plans(db, current_user.id, [
+        (plan_id, new_goal.id, topic, content_hash)
+        for plan_id, topic, content_hash in zip(plan_ids, topics, plan_hashes)
+    ])
     db.commit()
 
-    # If AI requested, generate all daily contents concurrently
-    if goal_data.use_ai:
-        import asyncio
-        async def fetch_day_content(dp: DayPlan):
-            try:
-                result = await ai_generator.generate_daily_content(
-                    new_goal.title,
-                    new_goal.description,
-                    dp.day_number,
-                    dp.topic
-                )
-                dp.content = result
-            except Exception as e:
-                print(f"Failed to generate content for Day {dp.day_number}: {e}")
-        
-        # Batch max 10 to avoid rapid rate limits on free Gemini tier
-        batch_size = 10
-        for i in range(0, len(day_plans), batch_size):
-            batch = day_plans[i:i + batch_size]
-            await asyncio.gather(*(fetch_day_content(dp) for dp in batch))
-            
-        db.commit()
-    
     return new_goal
 
 @router.get("", response_model=list[GoalResponse])
 async def get_goals(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get all goals for current user"""
     goals = db.query(Goal).filter(Goal.user_id == current_user.id).order_by(Goal.created_at.desc()).all()
     return goals
+
+@router.post("/{goal_id}/replan", response_model=GoalReplanResponse)
+async def replan_goal(
+    goal_id: str,
+    replan_data: GoalReplanRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    ai_generator: AIPlanGenerator = Depends(get_ai_generator)
+):
+    """
+    Re-plan the days of a goal that are not completed yet.
+    Completed days are kept; remaining days get a new outline starting from
+    start_date, reusing existing content wherever the topic is unchanged.
+    Goals created without AI are only moved and resized, never generated for.
+    """
+    try:
+        start_date = date.fromisoformat(replan_data.start_date) if replan_data.start_date else date.today()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date format"
+        )
+
+    goal = db.query(Goal).filter(Goal.id == goal_id, Goal.user_id == current_user.id).first()
+    if not goal:
+        raise HTTPException(status_code=404, detail="Goal not found")
+
+    # Only hashes are needed here, not the content itself
+    plans = db.query(DayPlan).filter(
+        DayPlan.goal_id == goal.id
+    ).order_by(DayPlan.day_number).all()
+    completed = [p for p in plans if p.completed]
+    remaining = [p for p in plans if not p.completed]
+
+    remaining_days = replan_data.remaining_days or len(remaining)
+    if remaining_days == 0:
+        raise HTTPException(status_code=400, detail="All days are completed; pass remaining_days to extend the goal")
+    # Same cap as goal creation
+    if len(completed) + remaining_days > 365:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A goal can have at most 365 days; {len(completed)} are completed"
+        )
+
+    # Goals created with use_ai=False have no day content at all
+    use_ai = any(p.content_hash or p.inline_content for p in plans)
+
+    new_topics = []
+    if use_ai:
+        recent_notes = db.query(Note.content).join(Note.day_plan).filter(
+            DayPlan.goal_id == goal.id
+        ).order_by(Note.created_at.desc()).limit(10).all()
+
+        new_topics = await ai_generator.generate_replan_outline(
+            goal.title,
+            goal.description,
+            [p.topic for p in completed],
+            [n.content for n in reversed(recent_notes)],
+            remaining_days,
+            replan_data.adjustment
+        ) or []
+    # Fill anything the model did not return with the previous plan
+    old_topics = [p.topic for p in remaining]
+    topics = new_topics + old_topics[len(new_topics):remaining_days]
+    topics += [f"Daily progress for {goal.title}"] * (remaining_days - len(topics))
+
+    # Unchanged topics keep their content; only the others are (re)generated
+    old_content = {}
+    for p in remaining:
+        if p.content_hash:
+            old_content.setdefault(template_library.normalize_key(p.topic), p.content_hash)
+    hashes = [old_content.get(template_library.normalize_key(t)) for t in topics]
+    changed = [i for i, h in enumerate(hashes) if h is None] if use_ai else []
+    if changed:
+        try:
+            generated = await template_library.build_day_contents(
+                db,
+                ai_generator,
+                goal.title,
+                goal.description,
+                [topics[i] for i in changed],
+                [len(completed) + i + 1 for i in changed]
+            )
+        except QuotaExceeded:
+            # Nothing of the goal has changed yet; keep the library content generated so far
+            db.commit()
+            raise
+        for i, h in zip(changed, generated):
+            hashes[i] = h
+
+    # Drop surplus rows, preferring days without notes
+    removed = []
+    surplus = len(remaining) - remaining_days
+    if surplus > 0:
+        with_notes = {
+            plan_id for (plan_id,) in db.query(Note.day_plan_id).filter(
+                Note.day_plan_id.in_([p.id for p in remaining])
+            ).distinct()
+        }
+        for p in sorted(reversed(remaining), key=lambda p: p.id in with_notes)[:surplus]:
+            removed.append(p)
+        remaining = [p for p in remaining if p not in removed]
+    removed_note_ids = []
+    if removed:
+        removed_note_ids = [n_id for (n_id,) in db.query(Note.id).filter(Note.day_plan_id.in_([p.id for p in removed]))]
+        for p in removed:
+            db.delete(p)
+
+    last_completed = max((p.date for p in completed), default=None)
+    if last_completed and last_completed >= start_date:
+        start_date = last_completed + timedelta(days=1)
+
+    for number, p in enumerate(completed, 1):
+        p.day_number = number
+
+    rows = remaining + [DayPlan(id=generate_uuid(), goal_id=goal.id, completed=False) for _ in range(remaining_days - len(remaining))]
+    for i, p in enumerate(rows):
+        p.day_number = len(completed) + i + 1
+        p.date = start_date + timedelta(days=i)
+        if p.topic is not None and template_library.normalize_key(p.topic) != template_library.normalize_key(topics[i]):
+            # Content kept on the row belongs to the old topic
+            p.inline_content = None
+        p.topic = topics[i]
+        p.content_hash = hashes[i]
+        if p not in remaining:
+            db.add(p)
+
+    delta_days = len(completed) + remaining_days - goal.total_days
+    goal.total_days = len(completed) + remaining_days
+
+    change_log.record_change(db, current_user.id, change_log.GOAL, goal.id)
+    change_log.record_changes(db, current_user.id, change_log.DAY_PLAN, [p.id for p in removed], op="delete")
+    change_log.record_changes(db, current_user.id, change_log.NOTE, removed_note_ids, op="delete")
+    search.remove_documents(db, search.DAY_PLAN, [p.id for p in removed])
+    search.remove_documents(db, search.NOTE, removed_note_ids)
+    search.index_day_plans(db, current_user.id, [(p.id, goal.id, p.topic, p.content_hash) for p in rows])
+    if delta_days:
+        stats.on_goal_resized(db, current_user.id, goal.id, delta_days)
+    db.commit()
+    db.refresh(goal)
+
+    return GoalReplanResponse(
+        goal=goal,
+        kept_days=len(completed),
+        reused_days=remaining_days - len(changed) if use_ai else 0,
+        regenerated_days=len(changed),
+        removed_days=len(removed)
+    )
@@ -2,25 +2,30 @@
 Day Plan routes
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from datetime import date, datetime
+from sqlalchemy.orm import Session, contains_eager, joinedload
+from datetime import date
 from typing import List
 import uuid
 
-from app.database import get_db
-from app.models import User, Goal, DayPlan, Note, ChatMessage
-from app.schemas import DayPlanResponse, DayPlanUpdateRequest, NoteCreateRequest, NoteResponse
+from app.database import get_db, get_read_db
+from app.models import User, Goal, DayPlan, Note
+from app.schemas import (
+    DayPlanResponse, DayPlanUpdateRequest, NoteCreateRequest, NoteResponse,
+    BatchCompleteRequest, BatchCompleteResponse, BatchCompleteResult,
+    BatchNotesRequest, BatchNotesResponse, BatchNoteResult
+)
 from app.auth import get_current_user
-from app.services.ai_generator import AIPlanGenerator
+from app.services.ai_generator import AIPlanGenerator, get_ai_generator
+from app.services.quotas import QuotaExceeded
+from app.services import plan_mutations, chat_buffer, chat_store, tutor_prompts
 
 router = APIRouter()
-ai_generator = AIPlanGenerator()
 
 @router.get("/date/{plan_date}", response_model=DayPlanResponse)
 async def get_plan_by_date(
     plan_date: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     try:
         target_date = date.fromisoformat(plan_date)
@@ -30,7 +35,7 @@ async def get_plan_by_date(
             detail="Invalid date format"
         )
 
-    plan = db.query(DayPlan).join(DayPlan.goal).filter(
+    plan = db.query(DayPlan).join(DayPlan.goal).options(joinedload(DayPlan.template)).filter(
         DayPlan.date == target_date,
         Goal.user_id == current_user.id
     ).first()
@@ -47,7 +52,7 @@ async def get_plan_by_date(
 async def get_dynamic_plan_content(
     plan_date: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get day plan. LLM content is now pre-generated at Goal Creation, 
@@ -61,7 +66,7 @@ async def get_dynamic_plan_content(
             detail="Invalid date format"
         )
 
-    plan = db.query(DayPlan).join(DayPlan.goal).filter(
+    plan = db.query(DayPlan).join(DayPlan.goal).options(joinedload(DayPlan.template)).filter(
         DayPlan.date == target_date,
         Goal.user_id == current_user.id
     ).first()
@@ -87,6 +92,60 @@ async def get_dynamic_plan_content(
     
     return result
 
+# Batch routes are declared before "/{plan_id}/..." so "batch" is not taken as a plan id
+@router.post("/batch/complete", response_model=BatchCompleteResponse)
+async def mark_plans_complete(
+    batch: BatchCompleteRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Mark several plans complete: one ownership query, one commit, per-item results."""
+    plans = plan_mutations.load_owned_plans(db, current_user.id, batch.plan_ids)
+
+    results = []
+    for plan_id in batch.plan_ids:
+        plan = plans.get(plan_id)
+        if plan is None:
+            results.append(BatchCompleteResult(plan_id=plan_id, status="not_found"))
+            continue
+        changed = plan_mutations.complete_plan(db, current_user.id, plan)
+        results.append(BatchCompleteResult(
+            plan_id=plan_id,
+            status="completed" if changed else "already_completed",
+            completed_at=plan.completed_at
+        ))
+
+    db.commit()
+    return BatchCompleteResponse(results=results)
+
+@router.post("/batch/notes", response_model=BatchNotesResponse)
+async def add_notes(
+    batch: BatchNotesRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Add notes to several plans: one ownership query, one commit, per-item results."""
+    plans = plan_mutations.load_owned_plans(db, current_user.id, (item.plan_id for item in batch.notes))
+
+    results = []
+    notes = []
+    for item in batch.notes:
+        plan = plans.get(item.plan_id)
+        if plan is None:
+            results.append(BatchNoteResult(plan_id=item.plan_id, status="not_found"))
+            continue
+        result = BatchNoteResult(plan_id=item.plan_id, status="created")
+        notes.append((result, plan_mutations.add_plan_note(db, current_user.id, plan, item.content)))
+        results.append(result)
+
+    # Serialize notes before commit expires them (avoids a reload per note)
+    db.flush()
+    for result, note in notes:
+        result.note = NoteResponse.model_validate(note)
+    db.commit()
+
+    return BatchNotesResponse(results=results)
+
 @router.post("/{plan_id}/complete", response_model=DayPlanResponse)
 async def mark_plan_complete(
     plan_id: str,
@@ -101,8 +160,7 @@ async def mark_plan_complete(
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
 
-    plan.completed = True
-    plan.completed_at = datetime.utcnow()
+    plan_mutations.complete_plan(db, current_user.id, plan)
     db.commit()
     db.refresh(plan)
     
@@ -123,11 +181,7 @@ async def add_note(
     if not plan:
         raise HTTPException(status_code=404, detail="Plan not found")
 
-    note = Note(
-        day_plan_id=plan.id,
-        content=note_data.content
-    )
-    db.add(note)
+    note = plan_mutations.add_plan_note(db, current_user.id, plan, note_data.content)
     db.commit()
     db.refresh(note)
     
@@ -137,27 +191,34 @@ async def add_note(
 async def get_notes(
     plan_id: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    plan = db.query(DayPlan).join(DayPlan.goal).filter(
+    """A day plan's notes, oldest first (the order they were added in)."""
+    # Ownership check and the notes in one statement; the day content is not needed
+    rows = db.query(DayPlan).join(DayPlan.goal).outerjoin(DayPlan.notes).options(
+        contains_eager(DayPlan.notes)
+    ).filter(
         DayPlan.id == plan_id,
         Goal.user_id == current_user.id
-    ).first()
+    ).order_by(Note.created_at).all()
 
-    if not plan:
+    if not rows:
         raise HTTPException(status_code=404, detail="Plan not found")
 
-    return plan.notes
+    return rows[0].notes
 
 @router.post("/{plan_id}/topic-chat")
 async def plan_topic_chat(
     plan_id: str,
     chat_data: dict,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    ai_generator: AIPlanGenerator = Depends(get_ai_generator)
 ):
     """Contextual chat within a day plan for doubt clarification."""
-    plan = db.query(DayPlan).join(DayPlan.goal).filter(
+    plan = db.query(DayPlan).join(DayPlan.goal).options(
+        contains_eager(DayPlan.goal), joinedload(DayPlan.template)
+    ).filter(
         DayPlan.id == plan_id,
         Goal.user_id == current_user.id
     ).first()
@@ -171,38 +232,14 @@ async def plan_topic_chat(
     if not message.strip():
         raise HTTPException(status_code=400, detail="Empty message")
 
-    goal = db.query(Goal).filter(Goal.id == plan.goal_id).first()
-
-    context_parts = [
-        f"Goal: {goal.title}",
-        f"Today is Day {plan.day_number}.",
-        f"Topic: {plan.topic}"
-    ]
-    if plan.content:
-        context_parts.append(f"Content: {plan.content}")
-
-    plan_context = "\\n".join(context_parts)
-
-    conv_parts = [f"{'User' if m.get('role') == 'user' else 'Assistant'}: {m.get('content')}" for m in history[-10:]]
-    conv_parts.append(f"User: {message}")
-    conversation_text = "\\n".join(conv_parts)
-
-    prompt = f"""You are an expert AI coach helping a user with their goal.{' (e.g., losing weight, learning skills, etc.)'}
-Context for today:
-{plan_context}
-
-Your role:
-- Answer doubts related to today's topic and content.
-- Be encouraging, practical, and clear.
-- Use markdown formatting.
-
-Conversation:
-{conversation_text}
-
-Provide a helpful response:"""
+    context = tutor_prompts.plan_context(plan.goal.title, plan.day_number, plan.topic, plan.content)
+    turns = [(m.get('role'), m.get('content')) for m in history[-10:]]
+    prompt = tutor_prompts.build_topic_prompt(context, turns, message)
 
     try:
         reply = await ai_generator._call_gemini_api(prompt)
+    except QuotaExceeded:
+        raise
     except Exception as e:
         print(f"Topic chat failed: {e}")
         reply = "I'm having trouble connecting right now."
@@ -210,8 +247,9 @@ Provide a helpful response:"""
     session_id = chat_data.get("session_id", str(uuid.uuid4()))
     
     # Save the conversation
-    db.add(ChatMessage(user_id=current_user.id, session_id=session_id, role="user", content=message, context_topic=plan.topic))
-    db.add(ChatMessage(user_id=current_user.id, session_id=session_id, role="assistant", content=reply, context_topic=plan.topic))
+    await chat_buffer.save_chat_messages(
+        db, chat_store.build_chat_turn(current_user.id, session_id, message, reply, plan.topic)
+    )
     db.commit()
 
     return {"reply": reply, "session_id": session_id}
@@ -0,0 +1,255 @@
+"""
+Cohort program routes - define a goal program once, invite many users
+"""
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.database import get_db, get_read_db
+from app.models import User, GoalStats, Program, ProgramEnrollment, ProgramInvitation
+from app.schemas import (
+    ProgramCreateRequest, ProgramResponse, ProgramInviteRequest, ProgramInviteResponse,
+    ProgramInviteResult, ProgramProgressResponse, ProgramMemberProgress,
+    ProgramInvitationResponse, ProgramAcceptResponse
+)
+from app.auth import get_coach_user, get_current_user
+from app.services.ai_generator import AIPlanGenerator, get_ai_generator
+from app.services.quotas import QuotaExceeded
+from app.services import programs, stats
+
+router = APIRouter()
+
+
+def _get_owned_program(db: Session, program_id: str, owner: User) -> Program:
+    program = db.query(Program).filter(Program.id == program_id, Program.owner_id == owner.id).first()
+    if not program:
+        raise HTTPException(status_code=404, detail="Program not found")
+    return program
+
+
+def _program_response(program: Program, enrolled_count: int = 0) -> ProgramResponse:
+    return ProgramResponse(
+        id=program.id,
+        owner_id=program.owner_id,
+        title=program.title,
+        description=program.description,
+        total_days=program.total_days,
+        created_at=program.created_at,
+        enrolled_count=enrolled_count
+    )
+
+
+@router.post("", response_model=ProgramResponse, status_code=status.HTTP_201_CREATED)
+async def create_program(
+    program_data: ProgramCreateRequest,
+    coach: User = Depends(get_coach_user),
+    db: Session = Depends(get_db),
+    ai_generator: AIPlanGenerator = Depends(get_ai_generator)
+):
+    """Create a program, generating its outline and day content once for the whole cohort"""
+    try:
+        days = await programs.generate_program_days(
+            db, ai_generator, program_data.title, program_data.description, program_data.total_days, program_data.use_ai
+        )
+    except QuotaExceeded:
+        # Keep the library content generated so far; a retry reuses it
+        db.commit()
+        raise
+    program = Program(
+        owner_id=coach.id,
+        title=program_data.title,
+        description=program_data.description,
+        total_days=program_data.total_days,
+        days=days
+    )
+    db.add(program)
+    db.commit()
+    db.refresh(program)
+    return _program_response(program)
+
+
+@router.get("", response_model=list[ProgramResponse])
+async def list_programs(
+    coach: User = Depends(get_coach_user),
+    db: Session = Depends(get_read_db)
+):
+    """Programs owned by the current coach, with their cohort sizes"""
+    rows = db.query(Program, func.count(ProgramEnrollment.id)).outerjoin(
+        ProgramEnrollment, ProgramEnrollment.program_id == Program.id
+    ).filter(Program.owner_id == coach.id).group_by(Program.id).order_by(Program.created_at.desc()).all()
+    return [_program_response(program, count) for program, count in rows]
+
+
+@router.post("/{program_id}/invite", response_model=ProgramInviteResponse)
+async def invite_members(
+    program_id: str,
+    invite_data: ProgramInviteRequest,
+    coach: User = Depends(get_coach_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Invite each member (by email or user id), starting on their start_date.
+    Nobody is enrolled by this call: a member's goal is created from the
+    program, without LLM calls, when they accept their invitation. The result
+    is "invited" whether or not an account exists, so the endpoint does not
+    reveal who is registered. Members already enrolled (who are on the
+    progress view anyway) and pending invitations are not invited again. All
+    invitations are bulk inserted in one transaction.
+    """
+    try:
+        default_start = date.fromisoformat(invite_data.start_date) if invite_data.start_date else date.today()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date format"
+        )
+    program = _get_owned_program(db, program_id, coach)
+
+    user_ids = {m.user_id for m in invite_data.members if m.user_id}
+    known_ids = {
+        user_id for (user_id,) in db.query(User.id).filter(User.id.in_(user_ids))
+    } if user_ids else set()
+    enrolled = db.query(ProgramEnrollment.user_id, User.email).join(
+        User, User.id == ProgramEnrollment.user_id
+    ).filter(ProgramEnrollment.program_id == program.id).all()
+    enrolled_ids = {row.user_id for row in enrolled}
+    enrolled_emails = {row.email.lower() for row in enrolled}
+    pending = db.query(ProgramInvitation.email, ProgramInvitation.user_id).filter(
+        ProgramInvitation.program_id == program.id
+    ).all()
+    pending_emails = {row.email for row in pending if row.email}
+    pending_ids = {row.user_id for row in pending if row.user_id}
+
+    results = []
+    to_invite = []
+    for member in invite_data.members:
+        result = ProgramInviteResult(email=member.email, user_id=member.user_id, status="invited")
+        email = member.email.lower() if member.email else None
+        try:
+            start_date = date.fromisoformat(member.start_date) if member.start_date else default_start
+        except ValueError:
+            start_date = None
+        if start_date is None or (not email and not member.user_id):
+            result.status = "invalid"
+        elif member.user_id in enrolled_ids or (not member.user_id and email in enrolled_emails):
+            result.status = "already_enrolled"
+        else:
+            result.start_date = start_date
+            if member.user_id:
+                # Unknown ids are reported the same way but not stored
+                if member.user_id in known_ids and member.user_id not in pending_ids:
+                    pending_ids.add(member.user_id)
+                    to_invite.append((None, member.user_id, start_date))
+            elif email not in pending_emails:
+                pending_emails.add(email)
+                to_invite.append((email, None, start_date))
+        results.append(result)
+
+    if to_invite:
+        programs.invite(db, program, to_invite)
+        db.commit()
+
+    invited = sum(1 for r in results if r.status == "invited")
+    return ProgramInviteResponse(program_id=program.id, invited=invited, results=results)
+
+
+@router.get("/invitations", response_model=list[ProgramInvitationResponse])
+async def list_invitations(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Programs the current user has been invited to and not answered yet"""
+    rows = programs.invitations_for(db, current_user).join(
+        Program, Program.id == ProgramInvitation.program_id
+    ).add_columns(Program).order_by(ProgramInvitation.invited_at.desc()).all()
+    seen, invitations = set(), []
+    for invitation, program in rows:
+        # Invited both by email and by account: list the program once
+        if program.id in seen:
+            continue
+        seen.add(program.id)
+        invitations.append(ProgramInvitationResponse(
+            id=invitation.id,
+            program_id=program.id,
+            title=program.title,
+            description=program.description,
+            total_days=program.total_days,
+            start_date=invitation.start_date,
+            invited_at=invitation.invited_at
+        ))
+    return invitations
+
+
+@router.post("/invitations/{invitation_id}/accept", response_model=ProgramAcceptResponse)
+async def accept_invitation(
+    invitation_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Join the program: the user's own goal is created from it. No LLM calls."""
+    invitation = programs.invitations_for(db, current_user).filter(ProgramInvitation.id == invitation_id).first()
+    if not invitation:
+        raise HTTPException(status_code=404, detail="Invitation not found")
+    program = db.get(Program, invitation.program_id)
+    start_date = invitation.start_date
+
+    programs.invitations_for(db, current_user).filter(
+        ProgramInvitation.program_id == program.id
+    ).delete(synchronize_session=False)
+    if db.query(ProgramEnrollment.id).filter(
+        ProgramEnrollment.program_id == program.id, ProgramEnrollment.user_id == current_user.id
+    ).first():
+        db.commit()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Already enrolled in this program")
+
+    goal_id, = programs.enroll(db, program, [(current_user.id, start_date)])
+    db.commit()
+    return ProgramAcceptResponse(program_id=program.id, goal_id=goal_id, start_date=start_date)
+
+
+@router.delete("/invitations/{invitation_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def decline_invitation(
+    invitation_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Decline an invitation; the coach is not told"""
+    invitation = programs.invitations_for(db, current_user).filter(ProgramInvitation.id == invitation_id).first()
+    if not invitation:
+        raise HTTPException(status_code=404, detail="Invitation not found")
+    programs.invitations_for(db, current_user).filter(
+        ProgramInvitation.program_id == invitation.program_id
+    ).delete(synchronize_session=False)
+    db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get("/{program_id}/progress", response_model=ProgramProgressResponse)
+async def get_program_progress(
+    program_id: str,
+    coach: User = Depends(get_coach_user),
+    db: Session = Depends(get_read_db)
+):
+    """Each member's progress on their copy of the program, from the precomputed counters"""
+    program = _get_owned_program(db, program_id, coach)
+    rows = db.query(ProgramEnrollment, User.email, GoalStats).join(
+        User, User.id == ProgramEnrollment.user_id
+    ).outerjoin(
+        GoalStats, GoalStats.goal_id == ProgramEnrollment.goal_id
+    ).filter(ProgramEnrollment.program_id == program.id).order_by(User.email).all()
+
+    members = []
+    for enrollment, email, goal_stats in rows:
+        completed = goal_stats.completed_count if goal_stats else 0
+        total = goal_stats.total_days if goal_stats else program.total_days
+        members.append(ProgramMemberProgress(
+            user_id=enrollment.user_id,
+            email=email,
+            goal_id=enrollment.goal_id,
+            start_date=enrollment.start_date,
+            completed_count=completed,
+            total_days=total,
+            completion_percentage=round(100.0 * completed / total, 1) if total else 0.0,
+            current_streak=stats.effective_streak(goal_stats) if goal_stats else 0
+        ))
+    return ProgramProgressResponse(program_id=program.id, members=members)
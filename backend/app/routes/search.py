@@ -0,0 +1,42 @@
+"""
+Search routes - full-text search over notes, chat history and plan content
+"""
+from dataclasses import asdict
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from app.database import get_read_db
+from app.models import User
+from app.schemas import SearchResponse, SearchResult
+from app.auth import get_current_user
+from app.services import search as search_service
+
+router = APIRouter()
+
+
+@router.get("", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[List[str]] = Query(None, description="Restrict to note, chat and/or day_plan"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Ranked search with highlighted snippets, paginated by offset"""
+    kinds = kind or list(search_service.KINDS)
+    unknown = set(kinds) - set(search_service.KINDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown kind: {', '.join(sorted(unknown))}"
+        )
+
+    hits = search_service.search(db, current_user.id, q, kinds, limit=limit + 1, offset=offset)
+
+    return SearchResponse(
+        query=q,
+        results=[SearchResult(**asdict(hit)) for hit in hits[:limit]],
+        offset=offset,
+        has_more=len(hits) > limit
+    )
@@ -0,0 +1,68 @@
+"""
+Progress and streak statistics routes
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from app.database import get_read_db
+from app.models import User, GoalStats, UserStats
+from app.schemas import GoalStatsResponse, UserStatsResponse
+from app.auth import get_current_user
+from app.services import stats as stats_service
+
+router = APIRouter()
+
+
+def _percentage(completed: int, total: int) -> float:
+    return round(100.0 * completed / total, 1) if total else 0.0
+
+
+def _goal_stats_response(stats: GoalStats) -> GoalStatsResponse:
+    return GoalStatsResponse(
+        goal_id=stats.goal_id,
+        total_days=stats.total_days,
+        completed_count=stats.completed_count,
+        completion_percentage=_percentage(stats.completed_count, stats.total_days),
+        current_streak=stats_service.effective_streak(stats),
+        longest_streak=stats.longest_streak,
+        last_completed_date=stats.last_completed_date
+    )
+
+
+@router.get("", response_model=UserStatsResponse)
+async def get_stats(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Overall and per-goal progress, read from the precomputed counters"""
+    user_stats = db.get(UserStats, current_user.id)
+    goal_stats = db.query(GoalStats).filter(GoalStats.user_id == current_user.id).all()
+
+    if user_stats is None:
+        return UserStatsResponse(
+            goals_count=0, total_days=0, completed_count=0, completion_percentage=0.0,
+            current_streak=0, longest_streak=0
+        )
+
+    return UserStatsResponse(
+        goals_count=user_stats.goals_count,
+        total_days=user_stats.total_days,
+        completed_count=user_stats.completed_count,
+        completion_percentage=_percentage(user_stats.completed_count, user_stats.total_days),
+        current_streak=stats_service.effective_streak(user_stats),
+        longest_streak=user_stats.longest_streak,
+        last_completed_date=user_stats.last_completed_date,
+        goals=[_goal_stats_response(s) for s in goal_stats]
+    )
+
+
+@router.get("/goals/{goal_id}", response_model=GoalStatsResponse)
+async def get_goal_stats(
+    goal_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """Progress for a single goal"""
+    stats = db.get(GoalStats, goal_id)
+    if stats is None or stats.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Goal not found")
+    return _goal_stats_response(stats)
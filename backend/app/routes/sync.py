@@ -0,0 +1,179 @@
+"""
+Delta sync routes for offline-first clients
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import get_db, get_read_db
+from app.models import User, Goal, DayPlan, Note, ChangeLog
+from app.schemas import (
+    SyncResponse, SyncDeleted, DayPlanSummary, SyncPushRequest, SyncPushResponse, SyncMutationResult,
+    NoteResponse
+)
+from app.auth import get_current_user
+from app.services import change_log, plan_mutations
+
+router = APIRouter()
+
+# Summary columns only; day content is fetched per day when opened
+SUMMARY_COLUMNS = (
+    DayPlan.id, DayPlan.goal_id, DayPlan.day_number, DayPlan.date,
+    DayPlan.topic, DayPlan.completed, DayPlan.completed_at
+)
+
+
+def _snapshot_page(db: Session, user_id: str, page: Optional[str], limit: int) -> SyncResponse:
+    """
+    One page of a full snapshot: whole goals in id order, as many as fit in
+    `limit` day plans (at least one). The cursor is taken when the first page
+    is served and carried in `next_page`, so changes made while the client
+    pages through are pulled again afterwards rather than missed.
+    """
+    after = ""
+    if page:
+        cursor, _, after = page.partition(":")
+        if not cursor.isdigit() or not after:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid snapshot page")
+        cursor = int(cursor)
+    else:
+        cursor = change_log.current_cursor(db, user_id)
+
+    remaining = db.query(Goal, func.count(DayPlan.id)).outerjoin(
+        DayPlan, DayPlan.goal_id == Goal.id
+    ).filter(
+        Goal.user_id == user_id,
+        Goal.id > after
+    ).group_by(Goal.id).order_by(Goal.id.asc()).all()
+
+    goals, plan_count = [], 0
+    for goal, count in remaining:
+        if goals and plan_count + count > limit:
+            break
+        goals.append(goal)
+        plan_count += count
+    has_more = len(goals) < len(remaining)
+
+    plans, notes = [], []
+    if goals:
+        goal_ids = [goal.id for goal in goals]
+        plans = db.query(*SUMMARY_COLUMNS).filter(DayPlan.goal_id.in_(goal_ids)).all()
+        notes = db.query(Note).join(Note.day_plan).filter(DayPlan.goal_id.in_(goal_ids)).all()
+
+    return SyncResponse(
+        # Not a cursor to pull from until the last page: the rest of the snapshot is still owed
+        cursor=0 if has_more else cursor,
+        has_more=has_more,
+        next_page=f"{cursor}:{goals[-1].id}" if has_more else None,
+        goals=goals,
+        day_plans=[DayPlanSummary.model_validate(p._mapping) for p in plans],
+        notes=notes
+    )
+
+
+@router.get("", response_model=SyncResponse)
+async def pull_changes(
+    since: int = Query(0, ge=0, description="Cursor returned by the previous sync (0 for a full sync)"),
+    limit: int = Query(500, ge=1, le=2000),
+    page: Optional[str] = Query(None, description="`next_page` of the previous full sync page"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Return everything that changed for the user since the cursor.
+    A changed goal includes all of its day plans.
+
+    Both kinds of sync are paged by `limit`. While `has_more` is set, an
+    incremental sync continues with `since=<cursor>`, and a full sync
+    (since=0) with `since=0&page=<next_page>`.
+    """
+    if since == 0:
+        # Full snapshot; also covers data created before the change log existed
+        return _snapshot_page(db, current_user.id, page, limit)
+
+    changes = db.query(ChangeLog).filter(
+        ChangeLog.user_id == current_user.id,
+        ChangeLog.id > since
+    ).order_by(ChangeLog.id.asc()).limit(limit + 1).all()
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = changes[-1].id if changes else since
+
+    # Latest op per entity wins
+    latest = {}
+    for change in changes:
+        latest[(change.entity_type, change.entity_id)] = change.op
+
+    deleted = [SyncDeleted(entity_type=t, id=i) for (t, i), op in latest.items() if op == "delete"]
+    live = {(t, i) for (t, i), op in latest.items() if op != "delete"}
+    goal_ids = {i for t, i in live if t == change_log.GOAL}
+    plan_ids = {i for t, i in live if t == change_log.DAY_PLAN}
+    note_ids = {i for t, i in live if t == change_log.NOTE}
+
+    goals, plans, notes = [], [], []
+    if goal_ids:
+        goals = db.query(Goal).filter(Goal.id.in_(goal_ids), Goal.user_id == current_user.id).all()
+        plans = db.query(*SUMMARY_COLUMNS).filter(DayPlan.goal_id.in_(goal_ids)).all()
+        plan_ids -= {p.id for p in plans}
+    if plan_ids:
+        plans += db.query(*SUMMARY_COLUMNS).join(DayPlan.goal).filter(
+            DayPlan.id.in_(plan_ids),
+            Goal.user_id == current_user.id
+        ).all()
+    if note_ids:
+        notes = db.query(Note).join(Note.day_plan).join(DayPlan.goal).filter(
+            Note.id.in_(note_ids),
+            Goal.user_id == current_user.id
+        ).all()
+
+    return SyncResponse(
+        cursor=cursor,
+        has_more=has_more,
+        goals=goals,
+        day_plans=[DayPlanSummary.model_validate(p._mapping) for p in plans],
+        notes=notes,
+        deleted=deleted
+    )
+
+
+@router.post("", response_model=SyncPushResponse)
+async def push_changes(
+    push: SyncPushRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Apply a batch of offline mutations (completions, notes) in one transaction.
+    Ownership of every referenced plan is verified with a single query.
+
+    No cursor is returned: changes other devices made since the client's last
+    pull sit below this push's own, so the client pulls again with the cursor
+    it already has (and receives its own changes back, which is harmless).
+    """
+    plans = plan_mutations.load_owned_plans(db, current_user.id, (m.plan_id for m in push.mutations))
+
+    results = []
+    notes = []
+    for mutation in push.mutations:
+        result = SyncMutationResult(type=mutation.type, plan_id=mutation.plan_id, client_id=mutation.client_id, status="applied")
+        plan = plans.get(mutation.plan_id)
+        if plan is None:
+            result.status = "not_found"
+        elif mutation.type == "complete":
+            if not plan_mutations.complete_plan(db, current_user.id, plan, mutation.occurred_at):
+                result.status = "unchanged"
+        elif not mutation.content:
+            result.status = "invalid"
+        else:
+            notes.append((result, plan_mutations.add_plan_note(db, current_user.id, plan, mutation.content, mutation.occurred_at)))
+        results.append(result)
+
+    # Serialize notes before commit expires them (avoids a reload per note)
+    db.flush()
+    for result, note in notes:
+        result.note = NoteResponse.model_validate(note)
+    db.commit()
+
+    return SyncPushResponse(results=results)
@@ -3,7 +3,7 @@ Pydantic schemas for API request/response validation
 """
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime, date
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List, Literal
 
 # ==================== Auth Schemas ====================
 class UserRegisterRequest(BaseModel):
@@ -76,16 +76,45 @@ class NoteResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# ==================== Batch Schemas ====================
+class BatchCompleteRequest(BaseModel):
+    plan_ids: List[str] = Field(..., min_length=1, max_length=366)
+
+class BatchCompleteResult(BaseModel):
+    plan_id: str
+    status: str # "completed", "already_completed" or "not_found"
+    completed_at: Optional[datetime] = None
+
+class BatchCompleteResponse(BaseModel):
+    results: List[BatchCompleteResult]
+
+class BatchNoteItem(BaseModel):
+    plan_id: str
+    content: str = Field(..., min_length=1)
+
+class BatchNotesRequest(BaseModel):
+    notes: List[BatchNoteItem] = Field(..., min_length=1, max_length=500)
+
+class BatchNoteResult(BaseModel):
+    plan_id: str
+    status: str # "created" or "not_found"
+    note: Optional[NoteResponse] = None
+
+class BatchNotesResponse(BaseModel):
+    results: List[BatchNoteResult]
+
 # ==================== Chat Schemas ====================
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=2000)
     session_id: Optional[str] = None
     history: Optional[list] = []
     context_topic: Optional[str] = None
+    use_cache: bool = Field(True, description="Allow answering a first question from the semantic cache")
 
 class ChatResponse(BaseModel):
     reply: str
     session_id: str
+    cached: bool = False
 
 class ChatMessageResponse(BaseModel):
     id: str
@@ -99,3 +128,183 @@ class ChatMessageResponse(BaseModel):
 class ChatHistoryResponse(BaseModel):
     session_id: str
     messages: list[ChatMessageResponse]
+
+# ==================== Sync Schemas ====================
+class DayPlanSummary(BaseModel):
+    id: str
+    goal_id: str
+    day_number: int
+    date: Any
+    topic: Optional[str] = None
+    completed: bool
+    completed_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+class SyncDeleted(BaseModel):
+    entity_type: str
+    id: str
+
+class SyncResponse(BaseModel):
+    cursor: int
+    has_more: bool = False
+    next_page: Optional[str] = None # Full sync only: pass as `page` to get the rest of the snapshot
+    goals: List[GoalResponse] = []
+    day_plans: List[DayPlanSummary] = []
+    notes: List[NoteResponse] = []
+    deleted: List[SyncDeleted] = []
+
+class SyncMutation(BaseModel):
+    type: Literal["complete", "note"]
+    plan_id: str
+    client_id: Optional[str] = Field(None, description="Client-side id echoed back in the result")
+    content: Optional[str] = Field(None, min_length=1, description="Note text (type=note)")
+    occurred_at: Optional[datetime] = Field(None, description="When the mutation happened offline")
+
+class SyncPushRequest(BaseModel):
+    mutations: List[SyncMutation] = Field(..., max_length=500)
+
+class SyncMutationResult(BaseModel):
+    type: str
+    plan_id: str
+    client_id: Optional[str] = None
+    status: str # "applied", "unchanged", "not_found" or "invalid"
+    note: Optional[NoteResponse] = None
+
+class SyncPushResponse(BaseModel):
+    results: List[SyncMutationResult]
+
+# ==================== Search Schemas ====================
+class SearchResult(BaseModel):
+    kind: str # "note", "chat" or "day_plan"
+    ref_id: str
+    parent_id: Optional[str] = None # day plan of a note, session of a chat message, goal of a day plan
+    title: Optional[str] = None
+    snippet: str
+    rank: float
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    offset: int
+    has_more: bool
+
+# ==================== Stats Schemas ====================
+class GoalStatsResponse(BaseModel):
+    goal_id: str
+    total_days: int
+    completed_count: int
+    completion_percentage: float
+    current_streak: int
+    longest_streak: int
+    last_completed_date: Optional[date] = None
+
+class UserStatsResponse(BaseModel):
+    goals_count: int
+    total_days: int
+    completed_count: int
+    completion_percentage: float
+    current_streak: int
+    longest_streak: int
+    last_completed_date: Optional[date] = None
+    goals: List[GoalStatsResponse] = []
+
+# ==================== Re-plan Schemas ====================
+class GoalReplanRequest(BaseModel):
+    remaining_days: Optional[int] = Field(None, ge=1, le=365, description="Days left to plan, defaults to the days not yet completed")
+    start_date: Optional[str] = Field(None, description="First re-planned day, defaults to today")
+    adjustment: Optional[str] = Field(None, max_length=500, description="e.g. 'missed a week', 'lower the intensity'")
+
+class GoalReplanResponse(BaseModel):
+    goal: GoalResponse
+    kept_days: int # completed days left untouched
+    reused_days: int # re-planned days whose content was reused
+    regenerated_days: int
+    removed_days: int
+
+# ==================== Admin Schemas ====================
+class UsageConsumer(BaseModel):
+    user_id: str
+    email: str
+    requests: int
+    llm_calls: int
+    tokens: int
+
+class TopConsumersResponse(BaseModel):
+    since: date
+    until: date
+    consumers: List[UsageConsumer]
+
+# ==================== Program Schemas ====================
+class ProgramCreateRequest(BaseModel):
+    title: str = Field(..., min_length=1, max_length=200)
+    description: Optional[str] = None
+    total_days: int = Field(..., ge=1, le=365)
+    use_ai: bool = True
+
+class ProgramResponse(BaseModel):
+    id: str
+    owner_id: str
+    title: str
+    description: Optional[str]
+    total_days: int
+    created_at: datetime
+    enrolled_count: int = 0
+
+class ProgramMember(BaseModel):
+    email: Optional[EmailStr] = None
+    user_id: Optional[str] = None
+    start_date: Optional[str] = Field(None, description="Defaults to the request's start_date")
+
+class ProgramInviteRequest(BaseModel):
+    members: List[ProgramMember] = Field(..., min_length=1, max_length=5000)
+    start_date: Optional[str] = Field(None, description="Default start date, defaults to today")
+
+class ProgramInviteResult(BaseModel):
+    email: Optional[str] = None
+    user_id: Optional[str] = None
+    # "invited" whether or not the member has an account; their goal is created when they accept
+    status: Literal["invited", "already_enrolled", "invalid"]
+    start_date: Optional[date] = None
+
+class ProgramInviteResponse(BaseModel):
+    program_id: str
+    invited: int
+    results: List[ProgramInviteResult]
+
+class ProgramInvitationResponse(BaseModel):
+    id: str
+    program_id: str
+    title: str
+    description: Optional[str]
+    total_days: int
+    start_date: date
+    invited_at: datetime
+
+class ProgramAcceptResponse(BaseModel):
+    program_id: str
+    goal_id: str
+    start_date: date
+
+class ProgramMemberProgress(BaseModel):
+    user_id: str
+    email: str
+    goal_id: str
+    start_date: date
+    completed_count: int
+    total_days: int
+    completion_percentage: float
+    current_streak: int
+
+class ProgramProgressResponse(BaseModel):
+    program_id: str
+    members: List[ProgramMemberProgress]
+
+# ==================== Account Transfer Schemas ====================
+class AccountImportResponse(BaseModel):
+    goals: int
+    day_plans: int
+    notes: int
+    chat_messages: int
+    content: int = Field(..., description="Day content records in the stream (already known ones are reused)")
+    skipped: int = Field(..., description="Records whose parent was not in the stream")
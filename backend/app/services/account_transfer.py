@@ -0,0 +1,405 @@
+"""
+Full-account export and import as NDJSON (one JSON record per line).
+
+The export streams every goal, day plan, note and chat message (hot and
+archived) of a user with `yield_per` cursors (server-side on PostgreSQL), so
+memory stays constant however large the account is. Records are written
+parents first:
+
+    {"type": "header", "format": "goal-achiever-export", "version": 1, ...}
+    {"type": "content", "hash": ..., ...}        day content the plans reference
+    {"type": "goal", "id": ..., ...}
+    {"type": "day_plan", "id": ..., "goal_id": ..., ...}
+    {"type": "note", "id": ..., "day_plan_id": ..., ...}
+    {"type": "chat_message", "id": ..., "session_id": ..., ...}
+    {"type": "end", "counts": {...}}
+
+The import reads the same stream (plain or gzip) incrementally. Every record
+gets a new id, references are remapped through the ids seen earlier in the
+stream, and rows are written with executemany inserts IMPORT_BATCH_SIZE at a
+time together with their search documents. Stats and change-log entries are
+updated once at the end. Content records must carry the hash of their own
+content and join the shared library without a topic key, so imported content
+is only used by the plans that reference it, never offered to other goals.
+"""
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models import ChatArchive, ChatMessage, ContentTemplate, DayPlan, Goal, Note, User, generate_uuid
+from app.services import change_log, search, stats, template_library
+from app.services.chat_archive import archived_messages
+
+FORMAT = "goal-achiever-export"
+VERSION = 1
+YIELD_PER = 1000  # Rows fetched per round trip while exporting
+CHUNK_BYTES = 64 * 1024  # Export output is flushed in chunks of about this size
+IMPORT_BATCH_SIZE = 1000  # Records per executemany while importing
+MAX_LINE_BYTES = 8 * 1024 * 1024
+RECORD_TYPES = ("content", "goal", "day_plan", "note", "chat_message")
+
+GOAL_FIELDS = ("title", "description", "total_days", "start_date", "created_at")
+DAY_PLAN_FIELDS = ("day_number", "date", "topic", "content_hash", "completed", "completed_at", "created_at")
+NOTE_FIELDS = ("content", "created_at", "updated_at")
+CHAT_FIELDS = ("role", "content", "context_topic", "created_at")
+
+
+class ImportFormatError(ValueError):
+    """The uploaded stream is not a valid export"""
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _line(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=_json_default).encode("utf-8") + b"\n"
+
+
+# ==================== Export ====================
+
+def export_records(db: Session, user: User) -> Iterator[Dict[str, Any]]:
+    """Every record of the user's account, parents before children"""
+    counts = dict.fromkeys(RECORD_TYPES, 0)
+    yield {
+        "type": "header", "format": FORMAT, "version": VERSION, "exported_at": datetime.utcnow(),
+        "user": {"email": user.email, "created_at": user.created_at},
+    }
+
+    plan_hashes = select(DayPlan.content_hash).join(DayPlan.goal).filter(
+        Goal.user_id == user.id, DayPlan.content_hash.isnot(None)
+    ).distinct()
+    contents = db.execute(
+        select(ContentTemplate.hash, ContentTemplate.topic_key, ContentTemplate.content)
+        .filter(ContentTemplate.hash.in_(plan_hashes))
+        .execution_options(yield_per=YIELD_PER)
+    )
+    for row in contents:
+        counts["content"] += 1
+        yield {"type": "content", **row._mapping}
+
+    goals = db.execute(
+        select(Goal.id, *(getattr(Goal, f) for f in GOAL_FIELDS))
+        .filter(Goal.user_id == user.id).order_by(Goal.created_at, Goal.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    for row in goals:
+        counts["goal"] += 1
+        yield {"type": "goal", **row._mapping}
+
+    plans = db.execute(
+        select(DayPlan.id, DayPlan.goal_id, DayPlan.inline_content, *(getattr(DayPlan, f) for f in DAY_PLAN_FIELDS))
+        .join(DayPlan.goal).filter(Goal.user_id == user.id).order_by(DayPlan.goal_id, DayPlan.day_number)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    for row in plans:
+        counts["day_plan"] += 1
+        yield {"type": "day_plan", **row._mapping}
+
+    notes = db.execute(
+        select(Note.id, Note.day_plan_id, *(getattr(Note, f) for f in NOTE_FIELDS))
+        .join(Note.day_plan).join(DayPlan.goal).filter(Goal.user_id == user.id).order_by(Note.created_at, Note.id)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    for row in notes:
+        counts["note"] += 1
+        yield {"type": "note", **row._mapping}
+
+    # Archived sessions first (they are older), unpacked one session at a time
+    archives = db.execute(
+        select(ChatArchive).filter(ChatArchive.user_id == user.id).order_by(ChatArchive.started_at)
+        .execution_options(yield_per=50)
+    ).scalars()
+    for archive in archives:
+        for m in archived_messages(archive):
+            counts["chat_message"] += 1
+            yield {"type": "chat_message", "id": m.id, "session_id": m.session_id, **{f: getattr(m, f) for f in CHAT_FIELDS}}
+
+    messages = db.execute(
+        select(ChatMessage.id, ChatMessage.session_id, *(getattr(ChatMessage, f) for f in CHAT_FIELDS))
+        .filter(ChatMessage.user_id == user.id).order_by(ChatMessage.created_at)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    for row in messages:
+        counts["chat_message"] += 1
+        yield {"type": "chat_message", **row._mapping}
+
+    yield {"type": "end", "counts": counts}
+
+
+def export_stream(db: Session, user: User, gzip: bool = False) -> Iterator[bytes]:
+    """NDJSON bytes of the export in CHUNK_BYTES chunks, gzip-compressed on request"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    buffer: List[bytes] = []
+    size = 0
+    for record in export_records(db, user):
+        line = _line(record)
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            data = b"".join(buffer)
+            buffer, size = [], 0
+            data = compressor.compress(data) if compressor else data
+            if data:
+                yield data
+    data = b"".join(buffer)
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+# ==================== Import ====================
+
+class NDJSONDecoder:
+    """Incremental NDJSON parser for a plain or gzip byte stream (detected from the first bytes)"""
+
+    def __init__(self, max_line_bytes: int = MAX_LINE_BYTES):
+        self.max_line_bytes = max_line_bytes
+        self.line_number = 0
+        self._decompressor = None
+        self._head = b""  # First bytes, until the stream type is known
+        self._sniffed = False
+        self._pending = b""  # Incomplete last line
+
+    def feed(self, chunk: bytes) -> Iterator[Dict[str, Any]]:
+        if not self._sniffed:
+            self._head += chunk
+            if len(self._head) < 2:
+                return
+            chunk, self._head = self._head, b""
+            self._sniffed = True
+            if chunk[:2] == b"\x1f\x8b":
+                self._decompressor = zlib.decompressobj(31)
+
+        if self._decompressor is None:
+            yield from self._split(chunk)
+            return
+        # Bounded steps so a highly compressed upload never expands all at once
+        data = self._decompressor.decompress(chunk, self.max_line_bytes)
+        while True:
+            yield from self._split(data)
+            tail = self._decompressor.unconsumed_tail
+            if not tail:
+                return
+            data = self._decompressor.decompress(tail, self.max_line_bytes)
+
+    def close(self) -> Iterator[Dict[str, Any]]:
+        if not self._sniffed:
+            yield from self._split(self._head)
+        elif self._decompressor is not None:
+            yield from self._split(self._decompressor.flush())
+            if not self._decompressor.eof:
+                raise ImportFormatError("Truncated gzip stream")
+        tail, self._pending = self._pending, b""
+        if tail.strip():
+            yield self._parse(tail)
+
+    def _split(self, data: bytes) -> Iterator[Dict[str, Any]]:
+        *lines, self._pending = (self._pending + data).split(b"\n")
+        if len(self._pending) > self.max_line_bytes:
+            raise ImportFormatError(f"Line {self.line_number + 1} exceeds {self.max_line_bytes} bytes")
+        for line in lines:
+            if line.strip():
+                yield self._parse(line)
+
+    def _parse(self, line: bytes) -> Dict[str, Any]:
+        self.line_number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ImportFormatError(f"Line {self.line_number}: invalid JSON")
+        if not isinstance(record, dict) or not isinstance(record.get("type"), str):
+            raise ImportFormatError(f"Line {self.line_number}: expected an object with a type")
+        return record
+
+
+def _date(value: Optional[str]) -> Optional[date]:
+    return date.fromisoformat(value) if value else None
+
+
+def _datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class AccountImporter:
+    """
+    Writes exported records into a user's account with new ids. Feed records
+    in stream order, then call finish(). Does not commit.
+    """
+
+    def __init__(self, db: Session, user_id: str, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.imported = dict.fromkeys(RECORD_TYPES, 0)
+        self.skipped = 0
+        self._header_seen = False
+        self._ended = False
+        self._now = datetime.utcnow()
+
+        # Old id -> new id (plans also keep their topic for note search documents)
+        self._goals: Dict[str, str] = {}
+        self._plans: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._sessions: Dict[str, str] = {}
+        self._content_text: Dict[str, str] = {}  # Resolvable content hash -> search text
+
+        self._contents: List[Dict[str, Any]] = []
+        self._goal_rows: List[Dict[str, Any]] = []
+        self._plan_rows: List[Dict[str, Any]] = []
+        self._note_rows: List[Dict[str, Any]] = []
+        self._chat_rows: List[Dict[str, Any]] = []
+        self._pending = 0
+
+    def feed(self, records: Iterable[Dict[str, Any]]):
+        for record in records:
+            self.add(record)
+
+    def add(self, record: Dict[str, Any]):
+        kind = record["type"]
+        if not self._header_seen:
+            if kind != "header" or record.get("format") != FORMAT:
+                raise ImportFormatError("Stream does not start with an export header")
+            if record.get("version") != VERSION:
+                raise ImportFormatError(f"Unsupported export version {record.get('version')}")
+            self._header_seen = True
+            return
+        if self._ended:
+            raise ImportFormatError("Records after the end marker")
+        if kind == "end":
+            self._ended = True
+            return
+
+        try:
+            accepted = getattr(self, f"_add_{kind}")(record) if kind in RECORD_TYPES else False
+        except (KeyError, TypeError, ValueError) as e:
+            raise ImportFormatError(f"Invalid {kind} record: {e}")
+        if not accepted:
+            self.skipped += 1
+            return
+        self.imported[kind] += 1
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def _add_content(self, r: Dict[str, Any]) -> bool:
+        if not isinstance(r["content"], dict):
+            raise ValueError("content must be an object")
+        # The library is shared by all users: the hash must address this content,
+        # and imported content is never offered to other goals by topic
+        if template_library.content_hash(r["content"]) != r["hash"]:
+            raise ValueError("hash does not match content")
+        self._contents.append({"hash": r["hash"], "topic_key": None, "content": r["content"]})
+        return True
+
+    def _add_goal(self, r: Dict[str, Any]) -> bool:
+        goal_id = generate_uuid()
+        self._goals[r["id"]] = goal_id
+        self._goal_rows.append({
+            "id": goal_id, "user_id": self.user_id, "title": r["title"], "description": r.get("description"),
+            "total_days": int(r["total_days"]), "start_date": _date(r["start_date"]),
+            "created_at": _datetime(r.get("created_at")) or self._now,
+        })
+        return True
+
+    def _add_day_plan(self, r: Dict[str, Any]) -> bool:
+        goal_id = self._goals.get(r["goal_id"])
+        if goal_id is None:
+            return False
+        plan_id = generate_uuid()
+        self._plans[r["id"]] = (plan_id, r.get("topic"))
+        self._plan_rows.append({
+            "id": plan_id, "goal_id": goal_id, "day_number": int(r["day_number"]), "date": _date(r["date"]),
+            "topic": r.get("topic"), "content": r.get("inline_content"), "content_hash": r.get("content_hash"),
+            "completed": bool(r.get("completed")), "completed_at": _datetime(r.get("completed_at")),
+            "created_at": _datetime(r.get("created_at")) or self._now,
+        })
+        return True
+
+    def _add_note(self, r: Dict[str, Any]) -> bool:
+        plan = self._plans.get(r["day_plan_id"])
+        if plan is None:
+            return False
+        self._note_rows.append({
+            "id": generate_uuid(), "day_plan_id": plan[0], "content": r["content"],
+            "created_at": _datetime(r.get("created_at")) or self._now,
+            "updated_at": _datetime(r.get("updated_at")) or self._now,
+            "_topic": plan[1],
+        })
+        return True
+
+    def _add_chat_message(self, r: Dict[str, Any]) -> bool:
+        session_id = self._sessions.setdefault(r["session_id"], generate_uuid())
+        self._chat_rows.append({
+            "id": generate_uuid(), "user_id": self.user_id, "session_id": session_id, "role": r["role"],
+            "content": r["content"], "context_topic": r.get("context_topic"),
+            "created_at": _datetime(r.get("created_at")) or self._now,
+        })
+        return True
+
+    def flush(self):
+        """Insert everything buffered, parents first"""
+        db = self.db
+        if self._contents:
+            hashes = {c["hash"] for c in self._contents}
+            existing = set(db.scalars(select(ContentTemplate.hash).filter(ContentTemplate.hash.in_(hashes))))
+            new = {c["hash"]: c for c in self._contents if c["hash"] not in existing}
+            if new:
+                db.execute(ContentTemplate.__table__.insert(), [dict(c, created_at=self._now) for c in new.values()])
+            self._contents = []
+
+        if self._goal_rows:
+            db.execute(Goal.__table__.insert(), self._goal_rows)
+            self._goal_rows = []
+
+        if self._plan_rows:
+            self._resolve_hashes(self._plan_rows)
+            db.execute(DayPlan.__table__.insert(), self._plan_rows)
+            search.bulk_add_documents(db, search.DAY_PLAN, [
+                (self.user_id, p["id"], p["goal_id"], p["topic"],
+                 self._content_text.get(p["content_hash"], "") if p["content_hash"] else search.content_text(p["content"]))
+                for p in self._plan_rows
+            ])
+            self._plan_rows = []
+
+        if self._note_rows:
+            docs = [(self.user_id, n["id"], n["day_plan_id"], n.pop("_topic"), n["content"]) for n in self._note_rows]
+            db.execute(Note.__table__.insert(), self._note_rows)
+            search.bulk_add_documents(db, search.NOTE, docs)
+            change_log.record_changes(db, self.user_id, change_log.NOTE, [n["id"] for n in self._note_rows])
+            self._note_rows = []
+
+        if self._chat_rows:
+            db.execute(ChatMessage.__table__.insert(), self._chat_rows)
+            search.bulk_add_documents(db, search.CHAT, [
+                (self.user_id, m["id"], m["session_id"], m["context_topic"], m["content"]) for m in self._chat_rows
+            ])
+            self._chat_rows = []
+        self._pending = 0
+
+    def _resolve_hashes(self, plans: List[Dict[str, Any]]):
+        """Drop content references the database cannot resolve; load search text for the rest"""
+        hashes = {p["content_hash"] for p in plans if p["content_hash"]}
+        missing = hashes - self._content_text.keys()
+        if missing:
+            rows = self.db.execute(
+                select(ContentTemplate.hash, ContentTemplate.content).filter(ContentTemplate.hash.in_(missing))
+            )
+            for h, content in rows:
+                self._content_text[h] = search.content_text(content)
+        for p in plans:
+            if p["content_hash"] and p["content_hash"] not in self._content_text:
+                p["content_hash"] = None
+
+    def finish(self) -> Dict[str, int]:
+        """Write the rest, then stats and sync entries. Returns imported counts per record type."""
+        if not self._ended:
+            raise ImportFormatError("Stream ended before the end record (truncated upload?)")
+        self.flush()
+        stats.rebuild_user_stats(self.db, self.user_id)
+        change_log.record_changes(self.db, self.user_id, change_log.GOAL, self._goals.values())
+        return self.imported
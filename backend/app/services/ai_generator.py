@@ -1,35 +1,98 @@
+import asyncio
 import json
-from typing import Dict, Any, List
-from google import genai
+import math
+from typing import AsyncIterator, Dict, Any, List, Optional
 from app.config import settings
+from app.services import quotas
+
+GEMINI_MODEL = 'gemini-3-flash-preview'
+FALLBACK_DETAILS = "Content generation failed, displaying default template."
+
+
+def is_fallback_content(content: Dict[str, Any]) -> bool:
+    """True if the content is the default template returned when generation failed"""
+    return not content or content.get("details") == FALLBACK_DETAILS
 
 class AIPlanGenerator:
     """Service to interact with Gemini API to general plans and daily content"""
     
     def __init__(self):
         self.api_key = settings.GEMINI_API_KEY
-        if self.api_key:
-            self.client = genai.Client(api_key=self.api_key)
-        else:
-            self.client = None
+        self._client = None
+
+    @property
+    def client(self):
+        """Gemini client, built on first use (importing google.genai is slow)"""
+        if self._client is None and self.api_key:
+            from google import genai
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    async def aclose(self):
+        """Release the client's HTTP connection pool"""
+        if self._client is not None:
+            await self._client.aio.aclose()
+            self._client = None
 
     async def _call_gemini_api(self, prompt: str) -> str:
-        """Call the Gemini API with a text prompt"""
+        """
+        Call the Gemini API with a text prompt. Raises QuotaExceeded when the
+        user is over quota; the generators below pass it on instead of falling
+        back, so the route can answer 429.
+        """
         if not self.client:
             return "AI service not configured: GEMINI_API_KEY is missing."
             
+        quotas.check_llm_quota()
         try:
             response = await self.client.aio.models.generate_content(
-                model='gemini-3-flash-preview',
+                model=GEMINI_MODEL,
                 contents=prompt
             )
+            quotas.record_llm_usage(response.usage_metadata)
             return response.text
         except Exception as e:
             print(f"Gemini API Error: {str(e)}")
             raise
 
+    async def stream_gemini_api(self, prompt: str) -> AsyncIterator[str]:
+        """Stream the reply to a text prompt as text chunks"""
+        if not self.client:
+            yield "AI service not configured: GEMINI_API_KEY is missing."
+            return
+
+        quotas.check_llm_quota()
+        stream = await self.client.aio.models.generate_content_stream(
+            model=GEMINI_MODEL,
+            contents=prompt
+        )
+        usage_metadata = None
+        try:
+            async for chunk in stream:
+                usage_metadata = chunk.usage_metadata or usage_metadata
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            # Cancelled streams are billed for what was used so far
+            quotas.record_llm_usage(usage_metadata)
+
+    @staticmethod
+    def _parse_json(content: str) -> Any:
+        """Parse a JSON model reply, stripping markdown code fences"""
+        content = content.strip()
+        if content.startswith("```json"):
+            content = content[7:]
+        if content.startswith("```"):
+            content = content[3:]
+        if content.endswith("```"):
+            content = content[:-3]
+        return json.loads(content.strip())
+
     async def generate_goal_outline(self, title: str, description: str, total_days: int) -> List[str]:
         """Generate an outline of daily topics for the entire goal duration."""
+        if total_days > settings.OUTLINE_HIERARCHICAL_THRESHOLD:
+            return await self.generate_hierarchical_outline(title, description, total_days)
+
         desc_text = f" Description: {description}" if description else ""
         prompt = f"""You are an expert planner and coach.
 The user has set a goal: '{title}'.{desc_text}
@@ -41,19 +104,10 @@ The array MUST have exactly {total_days} elements.
 Do NOT include any markdown blocks other than the JSON itself.
 """
         full_prompt = "You are an expert planner and coach.\n\nUser request: " + prompt
+        content = ""
         try:
             content = await self._call_gemini_api(full_prompt)
-            # Clean up potential markdown formatting natively
-            content = content.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-            
-            topics = json.loads(content)
+            topics = self._parse_json(content)
             if isinstance(topics, list) and len(topics) > 0:
                 # pad or truncate if needed
                 if len(topics) > total_days:
@@ -61,6 +115,8 @@ Do NOT include any markdown blocks other than the JSON itself.
                 while len(topics) < total_days:
                     topics.append(f"Continued progress for {title}")
                 return topics
+        except quotas.QuotaExceeded:
+            raise
         except Exception as e:
             print(f"Outline generation JSON parsing failed: {e}")
             print(f"FAILED RAW CONTENT:\n{content}")
@@ -68,6 +124,187 @@ Do NOT include any markdown blocks other than the JSON itself.
         # Fallback deterministic topics
         return [f"Day {i+1}: Work on {title}" for i in range(total_days)]
 
+    async def generate_hierarchical_outline(self, title: str, description: str, total_days: int) -> List[str]:
+        """
+        Outline long goals in two levels: a phase plan first, then each phase
+        expanded into daily topics by parallel calls. Keeps every reply short
+        enough not to be truncated and avoids generic filler days.
+        """
+        phase_count = math.ceil(total_days / settings.OUTLINE_PHASE_DAYS)
+        phases = await self._generate_phase_plan(title, description, total_days, phase_count)
+
+        semaphore = asyncio.Semaphore(settings.OUTLINE_MAX_PARALLEL)
+
+        async def expand(index: int, start_day: int) -> List[str]:
+            async with semaphore:
+                return await self._expand_phase(title, description, phases, index, start_day)
+
+        start_days = []
+        day = 1
+        for phase in phases:
+            start_days.append(day)
+            day += phase["days"]
+
+        expanded = await asyncio.gather(*(expand(i, start) for i, start in enumerate(start_days)))
+        return [topic for topics in expanded for topic in topics]
+
+    async def _generate_phase_plan(self, title: str, description: str, total_days: int, phase_count: int) -> List[Dict[str, Any]]:
+        """Split the goal into phases of {"title", "focus", "days"} whose days sum to total_days"""
+        desc_text = f" Description: {description}" if description else ""
+        prompt = f"""You are an expert planner and coach.
+The user has set a goal: '{title}'.{desc_text}
+Duration: {total_days} days.
+
+Split this goal into EXACTLY {phase_count} sequential phases (roughly {settings.OUTLINE_PHASE_DAYS} days each).
+Return ONLY a JSON array of objects like:
+[{{"title": "Phase title", "focus": "What this phase builds", "days": 14}}]
+The "days" values MUST add up to exactly {total_days}.
+"""
+        content = ""
+        phases: List[Dict[str, Any]] = []
+        try:
+            content = await self._call_gemini_api(prompt)
+            data = self._parse_json(content)
+            if isinstance(data, list):
+                phases = [
+                    {"title": str(p.get("title") or f"Phase {i + 1}"), "focus": str(p.get("focus") or ""), "days": p.get("days")}
+                    for i, p in enumerate(data) if isinstance(p, dict)
+                ]
+        except quotas.QuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Phase plan JSON parsing failed: {e}")
+            print(f"FAILED RAW CONTENT:\n{content}")
+
+        if not phases:
+            phases = [{"title": f"Phase {i + 1}", "focus": title, "days": None} for i in range(phase_count)]
+
+        # Trust the model's day counts only if they are valid and add up
+        counts = [p["days"] for p in phases]
+        if not all(isinstance(c, int) and c > 0 for c in counts) or sum(counts) != total_days:
+            phases = phases[:total_days]
+            base, extra = divmod(total_days, len(phases))
+            for i, phase in enumerate(phases):
+                phase["days"] = base + (1 if i < extra else 0)
+        return self._split_long_phases(phases)
+
+    @staticmethod
+    def _split_long_phases(phases: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Re-split phases longer than 2 x OUTLINE_PHASE_DAYS into parts of about
+        OUTLINE_PHASE_DAYS, so no single expansion reply grows long enough to
+        be truncated, whatever day counts the model chose
+        """
+        limit = 2 * settings.OUTLINE_PHASE_DAYS
+        result: List[Dict[str, Any]] = []
+        for phase in phases:
+            if phase["days"] <= limit:
+                result.append(phase)
+                continue
+            parts = math.ceil(phase["days"] / settings.OUTLINE_PHASE_DAYS)
+            base, extra = divmod(phase["days"], parts)
+            for i in range(parts):
+                result.append({
+                    "title": f"{phase['title']} (part {i + 1} of {parts})",
+                    "focus": phase["focus"],
+                    "days": base + (1 if i < extra else 0),
+                })
+        return result
+
+    async def _expand_phase(
+        self, title: str, description: str, phases: List[Dict[str, Any]], index: int, start_day: int
+    ) -> List[str]:
+        """Daily topics for one phase, asking once more for any days the first reply missed"""
+        phase = phases[index]
+        count = phase["days"]
+        end_day = start_day + count - 1
+        desc_text = f" Description: {description}" if description else ""
+        roadmap = "\n".join(f"{i + 1}. {p['title']}: {p['focus']}" for i, p in enumerate(phases))
+
+        topics: List[str] = []
+        for _ in range(2):
+            remaining = count - len(topics)
+            first_day = start_day + len(topics)
+            done_text = ""
+            if topics:
+                done_text = "\nTopics already planned for this phase:\n" + "\n".join(f"- {t}" for t in topics)
+            prompt = f"""You are an expert planner and coach.
+The user has set a goal: '{title}'.{desc_text}
+Phase roadmap:
+{roadmap}
+
+Plan phase {index + 1} ('{phase['title']}': {phase['focus']}), days {start_day} to {end_day}.{done_text}
+Return EXACTLY a JSON array of {remaining} strings, the topics for days {first_day} to {end_day} in order.
+Do NOT include any markdown blocks other than the JSON itself.
+"""
+            content = ""
+            try:
+                content = await self._call_gemini_api(prompt)
+                data = self._parse_json(content)
+                if isinstance(data, list):
+                    topics.extend(str(t) for t in data[:remaining])
+            except quotas.QuotaExceeded:
+                raise
+            except Exception as e:
+                print(f"Phase {index + 1} expansion failed: {e}")
+                print(f"FAILED RAW CONTENT:\n{content}")
+            if len(topics) >= count:
+                break
+
+        # Still short: name the missing days after the phase rather than generic filler
+        for i in range(len(topics), count):
+            topics.append(f"{phase['title']}: {phase['focus']} (day {i + 1} of {count})")
+        return topics
+
+    async def generate_replan_outline(
+        self,
+        title: str,
+        description: str,
+        completed_topics: List[str],
+        recent_notes: List[str],
+        remaining_days: int,
+        adjustment: Optional[str] = None
+    ) -> Optional[List[str]]:
+        """
+        Outline only the remaining days of a goal, using the completed days and
+        the user's recent notes as context. Returns None if generation failed.
+        """
+        context_parts = [f"Progress so far: {len(completed_topics)} days completed."]
+        if completed_topics:
+            context_parts.append("Recently completed topics:\n" + "\n".join(f"- {t}" for t in completed_topics[-20:]))
+        if recent_notes:
+            context_parts.append("Recent notes from the user:\n" + "\n".join(f"- {n}" for n in recent_notes))
+        if adjustment:
+            context_parts.append(f"Requested adjustment: {adjustment}")
+        context = "\n".join(context_parts)
+
+        if remaining_days > settings.OUTLINE_HIERARCHICAL_THRESHOLD:
+            desc = f"{description}\n{context}" if description else context
+            return await self.generate_hierarchical_outline(title, desc, remaining_days)
+
+        desc_text = f" Description: {description}" if description else ""
+        prompt = f"""You are an expert planner and coach.
+The user is re-planning the goal: '{title}'.{desc_text}
+{context}
+
+Continue the plan from where the user is now, adapting to their progress, notes and requested adjustment.
+Return EXACTLY a JSON array of {remaining_days} strings, the topics for the remaining days in order.
+Do NOT repeat topics that were already completed.
+Do NOT include any markdown blocks other than the JSON itself.
+"""
+        content = ""
+        try:
+            content = await self._call_gemini_api(prompt)
+            topics = self._parse_json(content)
+            if isinstance(topics, list) and topics:
+                return [str(t) for t in topics[:remaining_days]]
+        except quotas.QuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Re-plan outline generation failed: {e}")
+            print(f"FAILED RAW CONTENT:\n{content}")
+        return None
+
     async def generate_daily_content(self, title: str, description: str, day_number: int, topic: str) -> Dict[str, Any]:
         """Generate detailed content (e.g. diet and exercise) for a specific day."""
         desc_text = f" Description: {description}" if description else ""
@@ -96,28 +333,41 @@ Return ONLY the JSON object. No other text.
         content = ""
         try:
             content = await self._call_gemini_api(full_prompt)
-            content = content.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-                
-            data = json.loads(content)
+            data = self._parse_json(content)
             return {
                 "overview": data.get("overview", f"Focus on: {topic}"),
                 "tasks": data.get("tasks", []),
                 "details": data.get("details", "Follow the plan."),
                 "tips": data.get("tips", "")
             }
+        except quotas.QuotaExceeded:
+            raise
         except Exception as e:
             print(f"Daily content JSON parsing failed: {e}")
             print(f"FAILED RAW CONTENT:\n{content}")
             return {
                 "overview": f"Focus on: {topic}",
                 "tasks": [f"Work on {topic}"],
-                "details": "Content generation failed, displaying default template.",
+                "details": FALLBACK_DETAILS,
                 "tips": "Stay consistent."
             }
+
+
+# One generator (and Gemini client / connection pool) shared by the whole process
+_shared_generator: Optional[AIPlanGenerator] = None
+
+
+def get_ai_generator() -> AIPlanGenerator:
+    """Dependency returning the process-wide AI generator, created lazily"""
+    global _shared_generator
+    if _shared_generator is None:
+        _shared_generator = AIPlanGenerator()
+    return _shared_generator
+
+
+async def close_ai_generator():
+    """Close the shared generator's client (called on application shutdown)"""
+    global _shared_generator
+    if _shared_generator is not None:
+        await _shared_generator.aclose()
+        _shared_generator = None
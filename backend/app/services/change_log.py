@@ -0,0 +1,64 @@
+"""
+Outbound change log used by the delta sync endpoint.
+
+Every write to a goal, day plan or note records a row in the same transaction,
+so `GET /sync?since=<cursor>` can return exactly what changed for a user.
+
+The cursor is the row id, so a user's ids must become visible in id order: a
+client that synced up to id 11 never asks for id 10 again. On PostgreSQL ids
+come from a sequence when the row is inserted, and a transaction holding id 10
+can commit after another one committed id 11. Writers therefore take a
+per-user advisory lock, held until commit, before their rows get an id. SQLite
+allows one writer at a time, so its ids are in commit order already.
+"""
+from typing import Iterable, Tuple
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from app.models import ChangeLog
+
+GOAL = "goal"
+DAY_PLAN = "day_plan"
+NOTE = "note"
+
+# First key of the two-key advisory locks taken on the change log
+LOCK_NAMESPACE = 7301
+
+
+def _lock_cursor(db: Session, user_ids: Iterable[str]):
+    """PostgreSQL: wait for other uncommitted change-log writers of these users"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    # Sorted, so two multi-user writers cannot deadlock
+    for user_id in sorted(set(user_ids)):
+        db.execute(text("SELECT pg_advisory_xact_lock(:namespace, hashtext(:user_id))"),
+                   {"namespace": LOCK_NAMESPACE, "user_id": user_id})
+
+
+def record_change(db: Session, user_id: str, entity_type: str, entity_id: str, op: str = "upsert"):
+    """Log a change to one entity. Does not commit."""
+    _lock_cursor(db, [user_id])
+    db.add(ChangeLog(user_id=user_id, entity_type=entity_type, entity_id=entity_id, op=op))
+
+
+def record_changes(db: Session, user_id: str, entity_type: str, entity_ids: Iterable[str], op: str = "upsert"):
+    """Log a change to many entities of the same type. Does not commit."""
+    _lock_cursor(db, [user_id])
+    db.add_all([
+        ChangeLog(user_id=user_id, entity_type=entity_type, entity_id=entity_id, op=op)
+        for entity_id in entity_ids
+    ])
+
+
+def record_changes_for_users(db: Session, entity_type: str, changes: Iterable[Tuple[str, str]], op: str = "upsert"):
+    """Log changes to (user_id, entity_id) entities across users. Does not commit."""
+    changes = list(changes)
+    _lock_cursor(db, [user_id for user_id, _ in changes])
+    db.add_all([
+        ChangeLog(user_id=user_id, entity_type=entity_type, entity_id=entity_id, op=op)
+        for user_id, entity_id in changes
+    ])
+
+
+def current_cursor(db: Session, user_id: str) -> int:
+    """Latest change cursor for a user (0 if nothing was logged yet)"""
+    return db.query(func.max(ChangeLog.id)).filter(ChangeLog.user_id == user_id).scalar() or 0
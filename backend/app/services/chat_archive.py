@@ -0,0 +1,208 @@
+"""
+Chat archival and retention.
+
+Sessions without new messages for CHAT_ARCHIVE_IDLE_DAYS are moved out of the
+hot `chat_messages` table into `chat_archives`, one row per session holding
+the messages as zlib-compressed JSON, CHAT_ARCHIVE_BATCH_SIZE sessions per
+transaction. Archived sessions idle for CHAT_RETENTION_DAYS (if set) are
+deleted with their search documents. Reads go through `session_messages()`,
+which transparently combines archived and hot messages, so a resumed session
+keeps its context.
+
+On PostgreSQL the job also creates upcoming monthly partitions of
+`chat_messages` and drops past ones left empty by archival. A database whose
+`chat_messages` predates partitioning keeps its plain table (create_all does
+not convert it); partition maintenance is then skipped with a warning.
+
+Run periodically (cron / scheduler):
+    python -m app.services.chat_archive
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import Collection, Dict, List, Optional, Tuple
+from sqlalchemy import func, text, tuple_
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import ChatArchive, ChatMessage, chat_messages_partitioned, create_chat_partitions
+from app.services import search
+
+
+def _encode(messages: List[Dict]) -> bytes:
+    return zlib.compress(json.dumps(messages, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def _decode(payload: bytes) -> List[Dict]:
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+def _message_dict(m: ChatMessage) -> Dict:
+    return {
+        "id": m.id, "role": m.role, "content": m.content,
+        "context_topic": m.context_topic, "created_at": m.created_at.isoformat()
+    }
+
+
+def archived_messages(archive: ChatArchive) -> List[ChatMessage]:
+    """Unpack an archive into transient ChatMessage objects (never added to a session)"""
+    return [
+        ChatMessage(
+            id=m["id"], user_id=archive.user_id, session_id=archive.session_id, role=m["role"],
+            content=m["content"], context_topic=m["context_topic"], created_at=datetime.fromisoformat(m["created_at"])
+        )
+        for m in _decode(archive.payload)
+    ]
+
+
+def session_messages(db: Session, user_id: str, session_id: str, limit: Optional[int] = None) -> List[ChatMessage]:
+    """
+    A session's messages oldest first, reading through to the archive.
+    With `limit`, only the most recent `limit` messages.
+    """
+    query = db.query(ChatMessage).filter(
+        ChatMessage.user_id == user_id,
+        ChatMessage.session_id == session_id
+    )
+    if limit is None:
+        hot = query.order_by(ChatMessage.created_at.asc()).all()
+    else:
+        hot = list(reversed(query.order_by(ChatMessage.created_at.desc()).limit(limit).all()))
+        if len(hot) >= limit:
+            return hot
+
+    archive = db.get(ChatArchive, (user_id, session_id))
+    if archive is None:
+        return hot
+    messages = archived_messages(archive) + hot
+    return messages if limit is None else messages[-limit:]
+
+
+def archived_sessions(db: Session, user_id: str, limit: int, include: Collection[str] = ()) -> List[ChatArchive]:
+    """
+    The user's most recently active archived sessions, plus (in the same
+    query) the archived part of the `include` sessions, if any
+    """
+    order = [ChatArchive.last_message_at.desc()]
+    if include:
+        order.insert(0, ChatArchive.session_id.in_(include).desc())
+    return db.query(ChatArchive).filter(ChatArchive.user_id == user_id).order_by(
+        *order
+    ).limit(limit + len(include)).all()
+
+
+def _idle_sessions(db: Session, cutoff: datetime, limit: int) -> List[Tuple[str, str]]:
+    return db.query(ChatMessage.user_id, ChatMessage.session_id).group_by(
+        ChatMessage.user_id, ChatMessage.session_id
+    ).having(func.max(ChatMessage.created_at) < cutoff).limit(limit).all()
+
+
+def archive_batch(db: Session, sessions: List[Tuple[str, str]]) -> int:
+    """Move the given (user_id, session_id) sessions into chat_archives. Does not commit."""
+    messages = db.query(ChatMessage).filter(
+        tuple_(ChatMessage.user_id, ChatMessage.session_id).in_(sessions)
+    ).order_by(ChatMessage.created_at.asc()).all()
+    by_session: Dict[Tuple[str, str], List[ChatMessage]] = {}
+    for m in messages:
+        by_session.setdefault((m.user_id, m.session_id), []).append(m)
+
+    existing = {
+        (a.user_id, a.session_id): a for a in db.query(ChatArchive).filter(
+            tuple_(ChatArchive.user_id, ChatArchive.session_id).in_(sessions)
+        )
+    }
+    for (user_id, session_id), session_msgs in by_session.items():
+        payload = [_message_dict(m) for m in session_msgs]
+        archive = existing.get((user_id, session_id))
+        if archive is None:
+            db.add(ChatArchive(
+                user_id=user_id, session_id=session_id, context_topic=session_msgs[0].context_topic,
+                message_count=len(payload), started_at=session_msgs[0].created_at,
+                last_message_at=session_msgs[-1].created_at, payload=_encode(payload)
+            ))
+        else:
+            # Session resumed after an earlier archival: append
+            payload = _decode(archive.payload) + payload
+            archive.payload = _encode(payload)
+            archive.message_count = len(payload)
+            archive.last_message_at = session_msgs[-1].created_at
+            archive.archived_at = datetime.utcnow()
+
+    db.query(ChatMessage).filter(
+        ChatMessage.id.in_([m.id for m in messages])
+    ).delete(synchronize_session=False)
+    return len(messages)
+
+
+def archive_idle_sessions(db: Session, idle_days: int, batch_size: int) -> Tuple[int, int]:
+    """Archive every session idle for idle_days. Commits per batch; returns (sessions, messages)."""
+    cutoff = datetime.utcnow() - timedelta(days=idle_days)
+    total_sessions = total_messages = 0
+    while True:
+        sessions = _idle_sessions(db, cutoff, batch_size)
+        if not sessions:
+            return total_sessions, total_messages
+        total_messages += archive_batch(db, [tuple(s) for s in sessions])
+        total_sessions += len(sessions)
+        db.commit()
+
+
+def purge_archives(db: Session, retention_days: int, batch_size: int) -> int:
+    """Delete archived sessions (and their search documents) idle for retention_days. Commits per batch."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    purged = 0
+    while True:
+        archives = db.query(ChatArchive).filter(ChatArchive.last_message_at < cutoff).limit(batch_size).all()
+        if not archives:
+            return purged
+        message_ids = [m["id"] for a in archives for m in _decode(a.payload)]
+        for start in range(0, len(message_ids), 500):
+            search.remove_documents(db, search.CHAT, message_ids[start:start + 500])
+        for archive in archives:
+            db.delete(archive)
+        purged += len(archives)
+        db.commit()
+
+
+def maintain_partitions(db: Session, idle_days: int):
+    """PostgreSQL: create upcoming monthly partitions and drop past ones archival has emptied"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    if not chat_messages_partitioned(db.connection()):
+        print("Warning: chat_messages is not partitioned (created before partitioning); skipping partition maintenance.")
+        return
+    today = datetime.utcnow().date()
+    create_chat_partitions(db.connection(), today, settings.CHAT_PARTITION_MONTHS_AHEAD + 1)
+
+    cutoff = f"{today - timedelta(days=idle_days):%Y%m}"
+    partitions = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'chat_messages'"
+    )).scalars().all()
+    for name in partitions:
+        month = name.rsplit("_p", 1)[-1]
+        if not name.startswith("chat_messages_p") or not month.isdigit() or month >= cutoff:
+            continue
+        if db.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first() is None:
+            db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
+
+
+def run_retention(db: Session):
+    """Archive idle sessions, apply retention and maintain partitions, per settings"""
+    sessions, messages = archive_idle_sessions(db, settings.CHAT_ARCHIVE_IDLE_DAYS, settings.CHAT_ARCHIVE_BATCH_SIZE)
+    print(f"Archived {sessions} chat sessions ({messages} messages).")
+    if settings.CHAT_RETENTION_DAYS:
+        purged = purge_archives(db, settings.CHAT_RETENTION_DAYS, settings.CHAT_ARCHIVE_BATCH_SIZE)
+        print(f"Deleted {purged} archived sessions past retention.")
+    maintain_partitions(db, settings.CHAT_ARCHIVE_IDLE_DAYS)
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal, init_db
+
+    init_db()
+    session = SessionLocal()
+    try:
+        run_retention(session)
+    finally:
+        session.close()
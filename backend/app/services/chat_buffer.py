@@ -0,0 +1,226 @@
+"""
+Optional write-behind buffer for chat messages (CHAT_WRITE_BEHIND=true).
+
+Chat turns are queued in memory and written by a background task in group
+commits (every CHAT_FLUSH_INTERVAL_MS, or sooner once CHAT_FLUSH_BATCH
+messages are waiting), instead of one insert + commit per reply. When
+CHAT_BUFFER_MAX messages are waiting the caller waits for a flush (run on a
+worker thread, so the event loop keeps serving), which keeps memory bounded
+under sustained load. A batch that fails CHAT_FLUSH_MAX_ATTEMPTS times is
+written one message at a time and the messages that still fail are dropped,
+so one bad row cannot hold up the queue forever. The buffer is flushed on
+shutdown; a crash can lose at most one flush interval of chat messages.
+
+Reads stay consistent for this process: messages are visible through
+`buffered_messages()` until their commit has finished, and `merge()` combines
+them with rows read from the database. The buffered ChatMessage objects are
+handed to request handlers, so they are written without being expired on
+commit: their attributes stay readable after a background flush detaches them.
+"""
+import asyncio
+import threading
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ChatMessage
+from app.services import chat_store, profiler
+
+# Longest wait between retries of a failing flush, in seconds
+MAX_RETRY_DELAY = 30.0
+
+
+class ChatWriteBuffer:
+    """In-memory queue of ChatMessage rows written in batches"""
+
+    def __init__(self, flush_interval: float = 0.25, flush_batch: int = 500, max_messages: int = 5000,
+                 max_attempts: int = 10):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_messages = max_messages
+        self.max_attempts = max_attempts
+        self._pending: List[ChatMessage] = []
+        self._in_flight: List[ChatMessage] = []
+        self._attempts: Dict[str, int] = {}  # Failed writes per queued message id
+        self._lock = threading.Lock()  # Guards _pending / _in_flight
+        self._flush_lock = threading.Lock()  # One writer at a time
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.flushed_messages = 0
+        self.dropped_messages = 0
+
+    async def add(self, messages: List[ChatMessage]):
+        """Queue messages for the next group commit; waits for a flush while the buffer is full"""
+        with self._lock:
+            self._pending.extend(messages)
+            size = len(self._pending)
+
+        if size >= self.max_messages:
+            # Buffer full: the caller waits for the write rather than the buffer
+            # growing without bound (on a thread, the flush lock may be held)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Chat buffer flush failed, retrying: {e}")
+            return
+
+        self._ensure_started()
+        if size >= self.flush_batch:
+            self._wakeup.set()
+
+    def buffered(self, user_id: str, session_id: str) -> List[ChatMessage]:
+        """Messages of a session that are not committed yet"""
+        with self._lock:
+            return [
+                m for m in self._in_flight + self._pending
+                if m.user_id == user_id and m.session_id == session_id
+            ]
+
+    def flush(self) -> int:
+        """Write everything queued so far in batches; returns the number of messages written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[:self.flush_batch]
+                    del self._pending[:self.flush_batch]
+                    self._in_flight = batch
+                if not batch:
+                    return written
+                ids = [m.id for m in batch]
+
+                try:
+                    self._write(batch)
+                    count = len(batch)
+                    self.flushes += 1
+                except Exception:
+                    if self._count_failure(ids):
+                        with self._lock:
+                            # Keep them for the next attempt
+                            self._pending[:0] = batch
+                            self._in_flight = []
+                        raise
+                    # Out of attempts: salvage what can be written on its own
+                    count = self._write_each(batch, ids)
+
+                with self._lock:
+                    self._in_flight = []
+                for message_id in ids:
+                    self._attempts.pop(message_id, None)
+                written += count
+                self.flushed_messages += count
+
+    def _write(self, messages: List[ChatMessage]):
+        # Snapshots taken by readers keep using these objects after the commit
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            chat_store.persist_chat_messages(db, messages)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _count_failure(self, ids: List[str]) -> bool:
+        """Record a failed write of a batch; True while it has attempts left"""
+        attempts = 1 + max(self._attempts.get(message_id, 0) for message_id in ids)
+        if attempts < self.max_attempts:
+            for message_id in ids:
+                self._attempts[message_id] = attempts
+            return True
+        return False
+
+    def _write_each(self, batch: List[ChatMessage], ids: List[str]) -> int:
+        """Write messages one at a time, dropping those that fail; returns the number written"""
+        written = 0
+        for m, message_id in zip(batch, ids):
+            try:
+                self._write([m])
+                written += 1
+            except Exception as e:
+                self.dropped_messages += 1
+                print(f"Dropping chat message {message_id} after {self.max_attempts} failed writes: {e}")
+        return written
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            # Not part of the request that happens to start it (see profiler)
+            self._task = asyncio.get_running_loop().create_task(self._run(), context=profiler.background_context())
+
+    async def _run(self):
+        failures = 0
+        while True:
+            # Back off while writes keep failing, so attempts span an outage
+            delay = min(self.flush_interval * 2 ** failures, MAX_RETRY_DELAY)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+            try:
+                await asyncio.to_thread(self.flush)
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"Chat buffer flush failed, retrying: {e}")
+
+    async def aclose(self):
+        """Stop the background writer and flush what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+_buffer: Optional[ChatWriteBuffer] = None
+
+
+def get_chat_buffer() -> Optional[ChatWriteBuffer]:
+    """Process-wide buffer, or None when write-behind is disabled"""
+    global _buffer
+    if _buffer is None and settings.CHAT_WRITE_BEHIND:
+        _buffer = ChatWriteBuffer(
+            flush_interval=settings.CHAT_FLUSH_INTERVAL_MS / 1000,
+            flush_batch=settings.CHAT_FLUSH_BATCH,
+            max_messages=settings.CHAT_BUFFER_MAX,
+            max_attempts=settings.CHAT_FLUSH_MAX_ATTEMPTS,
+        )
+    return _buffer
+
+
+async def close_chat_buffer():
+    """Flush pending messages on shutdown"""
+    global _buffer
+    if _buffer is not None:
+        await _buffer.aclose()
+        _buffer = None
+
+
+async def save_chat_messages(db: Session, messages: List[ChatMessage]):
+    """Persist chat messages, through the buffer when enabled. Does not commit."""
+    buffer = get_chat_buffer()
+    if buffer is None:
+        chat_store.persist_chat_messages(db, messages)
+    else:
+        await buffer.add(messages)
+
+
+def buffered_messages(user_id: str, session_id: str) -> List[ChatMessage]:
+    """Uncommitted messages of a session (snapshot these before querying the database)"""
+    buffer = get_chat_buffer()
+    return buffer.buffered(user_id, session_id) if buffer is not None else []
+
+
+def merge(rows: Iterable[ChatMessage], buffered: List[ChatMessage]) -> List[ChatMessage]:
+    """Database rows plus buffered messages, oldest first, without duplicates"""
+    merged: Dict[str, ChatMessage] = {m.id: m for m in rows}
+    for m in buffered:
+        merged.setdefault(m.id, m)
+    return sorted(merged.values(), key=lambda m: m.created_at)
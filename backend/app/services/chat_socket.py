@@ -0,0 +1,271 @@
+"""
+WebSocket tutor chat: one authenticated connection carries many chat sessions.
+
+Protocol (JSON text frames):
+    client -> server
+        {"type": "chat", "request_id", "message", "session_id"?, "context_topic"?, "plan_id"?, "use_cache"?}
+        {"type": "cancel", "request_id"}
+        {"type": "ping"} / {"type": "pong"}
+    server -> client
+        {"type": "ready", "user_id"}
+        {"type": "start", "request_id", "session_id"}
+        {"type": "delta", "request_id", "text"}            (repeated)
+        {"type": "done", "request_id", "session_id", "reply", "cached"}
+        {"type": "cancelled", "request_id"}
+        {"type": "error", "request_id"?, "detail", "retry_after"?}
+        {"type": "ping"} / {"type": "pong"}
+
+A session's recent messages (and, with plan_id, the day plan context) are
+loaded from the database on first use and then kept in memory for the life of
+the connection. Completed turns are persisted like the HTTP chat routes.
+
+Stream frames are sent by a single writer task and at most WS_SEND_QUEUE_SIZE
+may be waiting: a slow client makes generations wait, which stops them pulling
+from the model stream. Control frames (pings, protocol errors) skip the line.
+"""
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Tuple
+from fastapi import WebSocket, WebSocketDisconnect, status
+from sqlalchemy.orm import contains_eager, joinedload
+from app.config import settings
+from app.database import SessionLocal
+from app.models import DayPlan, Goal
+from app.services import chat_archive, chat_buffer, chat_store, tutor_prompts
+from app.services.ai_generator import AIPlanGenerator
+from app.services.quotas import QuotaExceeded
+from app.services.semantic_cache import SemanticCache
+
+MAX_MESSAGE_LENGTH = 2000
+AI_ERROR_REPLY = "I'm having trouble connecting to the AI service right now. Please try again in a moment."
+
+_CONTROL, _STREAM = 0, 1
+
+
+class ChatRequestError(Exception):
+    """A chat frame that cannot be served; reported to the client as an error frame"""
+
+
+@dataclass
+class ChatSessionState:
+    turns: Deque[Tuple[str, str]]
+    context_topic: Optional[str] = None
+    plan_context: Optional[str] = None  # Set for day plan topic chats
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class ChatConnection:
+    """Serves one accepted WebSocket for an authenticated user"""
+
+    def __init__(self, websocket: WebSocket, user_id: str, ai_generator: AIPlanGenerator, semantic_cache: SemanticCache):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.ai_generator = ai_generator
+        self.semantic_cache = semantic_cache
+        self.sessions: Dict[str, ChatSessionState] = {}
+        self.active: Dict[str, asyncio.Task] = {}
+        self._outbox: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._stream_slots = asyncio.Semaphore(settings.WS_SEND_QUEUE_SIZE)
+        self._seq = itertools.count()
+
+    # ---- outbound ----
+
+    async def send(self, frame: Dict[str, Any]):
+        """Queue a stream frame, waiting while the client is behind"""
+        await self._stream_slots.acquire()
+        self._outbox.put_nowait((_STREAM, next(self._seq), frame))
+
+    def send_control(self, frame: Dict[str, Any]):
+        """Queue a control frame ahead of pending stream frames"""
+        self._outbox.put_nowait((_CONTROL, next(self._seq), frame))
+
+    async def _writer(self):
+        while True:
+            priority, _, frame = await self._outbox.get()
+            try:
+                await self.websocket.send_text(json.dumps(frame))
+            finally:
+                if priority == _STREAM:
+                    self._stream_slots.release()
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(settings.WS_HEARTBEAT_SECONDS)
+            self.send_control({"type": "ping", "ts": time.time()})
+
+    # ---- inbound ----
+
+    async def run(self):
+        """Serve frames until the client disconnects or goes idle"""
+        writer = asyncio.create_task(self._writer())
+        heartbeat = asyncio.create_task(self._heartbeat())
+        idle = False
+        try:
+            self.send_control({"type": "ready", "user_id": self.user_id})
+            idle = await self._read_loop()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            tasks = [heartbeat, *self.active.values()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+
+        if idle:
+            await self.websocket.close(code=status.WS_1001_GOING_AWAY, reason="idle timeout")
+
+    async def _read_loop(self) -> bool:
+        """Dispatch incoming frames; True when the connection went idle"""
+        while True:
+            try:
+                raw = await asyncio.wait_for(self.websocket.receive_text(), settings.WS_IDLE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                return True
+
+            try:
+                frame = json.loads(raw)
+                if not isinstance(frame, dict):
+                    raise ValueError
+            except ValueError:
+                self.send_control({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+
+            kind = frame.get("type")
+            if kind == "chat":
+                self._start_chat(frame)
+            elif kind == "cancel":
+                task = self.active.get(frame.get("request_id"))
+                if task is not None:
+                    task.cancel()
+            elif kind == "ping":
+                self.send_control({"type": "pong", "ts": frame.get("ts")})
+            elif kind != "pong":
+                self.send_control({"type": "error", "detail": f"Unknown frame type: {kind}"})
+
+    def _start_chat(self, frame: Dict[str, Any]):
+        request_id = str(frame.get("request_id") or uuid.uuid4())
+        message = frame.get("message")
+        if not isinstance(message, str) or not message.strip() or len(message) > MAX_MESSAGE_LENGTH:
+            detail = f"message must be 1-{MAX_MESSAGE_LENGTH} characters"
+        elif request_id in self.active:
+            detail = "request_id is already in progress"
+        elif len(self.active) >= settings.WS_MAX_ACTIVE_STREAMS:
+            detail = "Too many concurrent requests on this connection"
+        else:
+            self.active[request_id] = asyncio.create_task(self._chat(request_id, message, frame))
+            return
+        self.send_control({"type": "error", "request_id": request_id, "detail": detail})
+
+    # ---- chat turns ----
+
+    def _load_session(self, session_id: str, context_topic: Optional[str], plan_id: Optional[str]) -> ChatSessionState:
+        """Recent history and plan context for a session, read once per connection"""
+        buffered = chat_buffer.buffered_messages(self.user_id, session_id)
+        db = SessionLocal()
+        try:
+            history = chat_archive.session_messages(db, self.user_id, session_id, limit=settings.WS_SESSION_HISTORY)
+            history = chat_buffer.merge(history, buffered)
+            state = ChatSessionState(
+                turns=deque([(m.role, m.content) for m in history], maxlen=settings.WS_SESSION_HISTORY),
+                context_topic=context_topic
+            )
+            if plan_id:
+                plan = db.query(DayPlan).join(DayPlan.goal).options(
+                    contains_eager(DayPlan.goal), joinedload(DayPlan.template)
+                ).filter(
+                    DayPlan.id == plan_id,
+                    Goal.user_id == self.user_id
+                ).first()
+                if plan is None:
+                    raise ChatRequestError("Plan not found")
+                state.context_topic = plan.topic
+                state.plan_context = tutor_prompts.plan_context(plan.goal.title, plan.day_number, plan.topic, plan.content)
+            return state
+        finally:
+            db.close()
+
+    async def _persist_turn(self, session_id: str, message: str, reply: str, context_topic: Optional[str]):
+        messages = chat_store.build_chat_turn(self.user_id, session_id, message, reply, context_topic)
+        buffer = chat_buffer.get_chat_buffer()
+        if buffer is not None:
+            await buffer.add(messages)
+            return
+        db = SessionLocal()
+        try:
+            chat_store.persist_chat_messages(db, messages)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _chat(self, request_id: str, message: str, frame: Dict[str, Any]):
+        session_id = str(frame.get("session_id") or uuid.uuid4())
+        try:
+            state = self.sessions.get(session_id)
+            if state is None:
+                state = self._load_session(session_id, frame.get("context_topic"), frame.get("plan_id"))
+                self.sessions[session_id] = state
+
+            # One turn at a time per session so history stays in order
+            async with state.lock:
+                await self.send({"type": "start", "request_id": request_id, "session_id": session_id})
+                reply, cached = await self._generate(request_id, state, message, frame.get("use_cache", True))
+                state.turns.append(("user", message))
+                state.turns.append(("assistant", reply))
+                await self._persist_turn(session_id, message, reply, state.context_topic)
+                await self.send({
+                    "type": "done", "request_id": request_id, "session_id": session_id,
+                    "reply": reply, "cached": cached
+                })
+        except QuotaExceeded as e:
+            self.send_control({"type": "error", "request_id": request_id, "detail": e.detail, "retry_after": e.retry_after})
+        except asyncio.CancelledError:
+            # Partial replies are dropped: not persisted and not kept as context
+            self.send_control({"type": "cancelled", "request_id": request_id})
+        except ChatRequestError as e:
+            self.send_control({"type": "error", "request_id": request_id, "detail": str(e)})
+        except Exception as e:
+            # e.g. a database error loading or saving the session; the connection stays usable
+            print(f"Chat request {request_id} failed: {e}")
+            self.send_control({"type": "error", "request_id": request_id, "detail": "Chat request failed"})
+        finally:
+            self.active.pop(request_id, None)
+
+    async def _generate(self, request_id: str, state: ChatSessionState, message: str, use_cache: bool) -> Tuple[str, bool]:
+        """Stream the reply as delta frames; returns (full reply, served from cache)"""
+        turns = list(state.turns)
+        if state.plan_context is not None:
+            prompt = tutor_prompts.build_topic_prompt(state.plan_context, turns, message)
+            use_cache = False
+        else:
+            prompt = tutor_prompts.build_tutor_prompt(turns, message, state.context_topic)
+            use_cache = settings.SEMANTIC_CACHE_ENABLED and use_cache and not turns
+
+        if use_cache:
+            reply = self.semantic_cache.lookup(message, state.context_topic)
+            if reply is not None:
+                await self.send({"type": "delta", "request_id": request_id, "text": reply})
+                return reply, True
+
+        parts = []
+        try:
+            async for text in self.ai_generator.stream_gemini_api(prompt):
+                parts.append(text)
+                await self.send({"type": "delta", "request_id": request_id, "text": text})
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Chat stream failed: {e}")
+            await self.send({"type": "delta", "request_id": request_id, "text": AI_ERROR_REPLY})
+            return AI_ERROR_REPLY, False
+
+        reply = "".join(parts)
+        if use_cache and self.ai_generator.client is not None:
+            self.semantic_cache.store(message, reply, state.context_topic)
+        return reply, False
@@ -0,0 +1,32 @@
+"""
+Chat message persistence shared by the tutor chat and the day plan topic chat.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from app.models import ChatMessage, generate_uuid
+from app.services import search
+
+
+def build_chat_turn(
+    user_id: str,
+    session_id: str,
+    message: str,
+    reply: str,
+    context_topic: Optional[str] = None
+) -> List[ChatMessage]:
+    """The user message and assistant reply of one turn, with ids and timestamps assigned"""
+    now = datetime.utcnow()
+    return [
+        ChatMessage(id=generate_uuid(), user_id=user_id, session_id=session_id, role="user",
+                    content=message, context_topic=context_topic, created_at=now),
+        ChatMessage(id=generate_uuid(), user_id=user_id, session_id=session_id, role="assistant",
+                    content=reply, context_topic=context_topic, created_at=now + timedelta(microseconds=1)),
+    ]
+
+
+def persist_chat_messages(db: Session, messages: List[ChatMessage]):
+    """Insert chat messages and index them for search. Does not commit."""
+    db.add_all(messages)
+    for m in messages:
+        search.add_document(db, m.user_id, search.CHAT, m.id, m.session_id, m.context_topic, m.content)
@@ -0,0 +1,125 @@
+"""
+Leader election for periodic background jobs.
+
+Every worker runs an elector that tries to take (or renew) a lease in the
+shared state backend every LEADER_LEASE_SECONDS / 3. The holder is the leader
+and runs the periodic jobs below; the others only keep trying, so when the
+leader exits (lease released) or dies (lease expires) another worker takes
+over within one lease period. Each job's last run time is kept in the backend
+too, so a new leader does not repeat a job that just ran.
+
+Per-worker housekeeping (write-behind chat flushes, usage flushes) stays in
+every worker; only work that must happen once per deployment goes here.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from app.config import settings
+from app.services.shared_state import WORKER_ID, StateBackend, get_state_backend
+
+LEASE_NAME = "leader"
+
+
+@dataclass
+class LeaderJob:
+    name: str
+    interval_seconds: float
+    run: Callable[[], None]  # Blocking; runs in a thread
+
+
+def _purge_state():
+    purged = get_state_backend().purge_expired()
+    if purged:
+        print(f"Purged {purged} expired shared-state entries.")
+
+
+def _chat_retention():
+    from app.database import SessionLocal
+    from app.services.chat_archive import run_retention
+
+    db = SessionLocal()
+    try:
+        run_retention(db)
+    finally:
+        db.close()
+
+
+def leader_jobs() -> List[LeaderJob]:
+    jobs = [LeaderJob("purge-state", 60, _purge_state)]
+    if settings.CHAT_RETENTION_INTERVAL_MINUTES > 0:
+        jobs.append(LeaderJob("chat-retention", settings.CHAT_RETENTION_INTERVAL_MINUTES * 60, _chat_retention))
+    return jobs
+
+
+class LeaderElector:
+    """Holds or waits for the leader lease and runs the jobs while leader"""
+
+    def __init__(self, backend: StateBackend, jobs: List[LeaderJob], lease_seconds: float, worker_id: str = WORKER_ID):
+        self.backend = backend
+        self.jobs = jobs
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id
+        self.is_leader = False
+        self._task: Optional[asyncio.Task] = None
+        self._running: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                leader = await asyncio.to_thread(self.backend.acquire_lease, LEASE_NAME, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                print(f"Leader lease check failed: {e}")
+                leader = False
+            if leader != self.is_leader:
+                print(f"Worker {self.worker_id} {'became' if leader else 'is no longer'} leader.")
+                self.is_leader = leader
+            if leader and (self._running is None or self._running.done()):
+                self._running = asyncio.get_running_loop().create_task(self._run_due_jobs())
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    async def _run_due_jobs(self):
+        for job in self.jobs:
+            if not self.is_leader:
+                return
+            key = f"job:{job.name}:last_run"
+            try:
+                last = await asyncio.to_thread(self.backend.get, key)
+                if last is not None and time.time() - float(last) < job.interval_seconds:
+                    continue
+                await asyncio.to_thread(self.backend.set, key, str(time.time()).encode(), job.interval_seconds * 2)
+                await asyncio.to_thread(job.run)
+            except Exception as e:
+                print(f"Leader job {job.name} failed: {e}")
+
+    async def aclose(self):
+        """Stop electing and hand the lease over right away"""
+        for task in (self._task, self._running):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = self._running = None
+        if self.is_leader:
+            self.is_leader = False
+            await asyncio.to_thread(self.backend.release_lease, LEASE_NAME, self.worker_id)
+
+
+_elector: Optional[LeaderElector] = None
+
+
+def get_leader_elector() -> LeaderElector:
+    global _elector
+    if _elector is None:
+        _elector = LeaderElector(get_state_backend(), leader_jobs(), settings.LEADER_LEASE_SECONDS)
+    return _elector
+
+
+async def close_leader_elector():
+    global _elector
+    if _elector is not None:
+        await _elector.aclose()
+        _elector = None
@@ -0,0 +1,66 @@
+"""
+Day plan mutations shared by the single-item, batch and sync routes.
+
+Helpers never commit, so callers can apply many mutations in one transaction.
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+from sqlalchemy.orm import Session
+from app.models import Goal, DayPlan, Note, generate_uuid
+from app.services import change_log, search, stats
+
+
+def load_owned_plans(db: Session, user_id: str, plan_ids: Iterable[str]) -> Dict[str, DayPlan]:
+    """Fetch the given plans that belong to the user with one IN query, keyed by id"""
+    plan_ids = set(plan_ids)
+    if not plan_ids:
+        return {}
+    plans = db.query(DayPlan).join(DayPlan.goal).filter(
+        DayPlan.id.in_(plan_ids),
+        Goal.user_id == user_id
+    ).all()
+    return {plan.id: plan for plan in plans}
+
+
+def _event_time(at: Optional[datetime]) -> datetime:
+    """
+    A client-reported event time as naive UTC, no later than now; the
+    current time if none was given
+    """
+    now = datetime.utcnow()
+    if at is None:
+        return now
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(at, now)
+
+
+def complete_plan(db: Session, user_id: str, plan: DayPlan, completed_at: Optional[datetime] = None) -> bool:
+    """Mark a plan completed. Returns False if it already was."""
+    if plan.completed:
+        return False
+    plan.completed = True
+    plan.completed_at = _event_time(completed_at)
+    change_log.record_change(db, user_id, change_log.DAY_PLAN, plan.id)
+    stats.on_plan_completed(db, user_id, plan.goal_id, plan.completed_at)
+    return True
+
+
+def add_plan_note(
+    db: Session,
+    user_id: str,
+    plan: DayPlan,
+    content: str,
+    created_at: Optional[datetime] = None
+) -> Note:
+    """Attach a note to a plan"""
+    note = Note(
+        id=generate_uuid(),
+        day_plan_id=plan.id,
+        content=content,
+        created_at=_event_time(created_at)
+    )
+    db.add(note)
+    change_log.record_change(db, user_id, change_log.NOTE, note.id)
+    search.add_document(db, user_id, search.NOTE, note.id, plan.id, plan.topic, content)
+    return note
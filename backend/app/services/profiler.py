@@ -0,0 +1,297 @@
+"""
+On-demand request profiling.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>`, or at
+random with probability PROFILE_SAMPLE_RATE. While it runs, a sampler thread
+records the request's stack every PROFILE_INTERVAL_MS:
+
+- when the request's task is executing on the event loop, the live thread stack
+  (bcrypt, ORM, JSON encoding, ...);
+- when it is suspended, the chain of coroutines it is awaiting under a
+  "[waiting]" frame (Gemini, thread pool, locks), so samples add up to wall time.
+
+SQL statements executed for the request are timed through engine events: each
+distinct statement's count and total time, plus the statements of at least
+PROFILE_SQL_THRESHOLD_MS. With PROFILE_SQL_ALWAYS (off by default) this SQL capture
+runs for every request, without the sampler thread, so a request slower than
+PROFILE_SLOW_MS is kept with its SQL even when nobody asked for a profile
+(reason "slow"). Profiles from the header are always kept; sampled ones only
+when slow. The last PROFILE_MAX_STORED profiles are downloadable from
+/admin/profiles in speedscope format (https://www.speedscope.app) or as
+collapsed stacks.
+
+The SQL capture costs two clock reads and a dict update per statement; with
+PROFILE_SQL_ALWAYS off, a request that is not profiled only pays one context
+variable lookup per statement.
+
+The current profile lives in a context variable, which tasks inherit when they
+are created. Long-lived background tasks that may be started from inside a
+request (chat buffer, usage tracker) are created with `background_context()`
+so their SQL never lands in that request's profile.
+"""
+import asyncio
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextvars import Context, ContextVar, copy_context
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.config import settings
+
+FrameKey = Tuple[str, str, int]  # (function, file, first line)
+WAITING: FrameKey = ("[waiting]", "", 0)
+MAX_SQL_STATEMENTS = 200
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+
+@dataclass
+class RequestProfile:
+    method: str
+    path: str
+    reason: str  # "header", "sampled" or "slow" (SQL only)
+    interval_ms: float
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    stacks: Dict[Tuple[FrameKey, ...], int] = field(default_factory=dict)
+    sql: List[Tuple[str, float]] = field(default_factory=list)  # (statement, ms) above the threshold
+    sql_totals: Dict[str, List[float]] = field(default_factory=dict)  # statement -> [count, total ms]
+    sql_count: int = 0
+    sql_ms: float = 0.0
+    status: Optional[int] = None
+    duration_ms: float = 0.0
+
+    def add_sql(self, statement: str, elapsed_ms: float):
+        self.sql_count += 1
+        self.sql_ms += elapsed_ms
+        totals = self.sql_totals.get(statement)
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += elapsed_ms
+        elif len(self.sql_totals) < MAX_SQL_STATEMENTS:
+            self.sql_totals[statement] = [1, elapsed_ms]
+        if elapsed_ms >= settings.PROFILE_SQL_THRESHOLD_MS and len(self.sql) < MAX_SQL_STATEMENTS:
+            self.sql.append((statement[:1000], round(elapsed_ms, 3)))
+
+    def sql_by_statement(self) -> List[Dict[str, Any]]:
+        """Distinct statements by total time, slowest first (an N+1 shows as a high count)"""
+        ranked = sorted(self.sql_totals.items(), key=lambda item: -item[1][1])
+        return [{"statement": s[:1000], "count": int(n), "ms": round(ms, 3)} for s, (n, ms) in ranked]
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.stacks.values())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 1),
+            "samples": self.sample_count,
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_ms, 1),
+        }
+
+    def to_collapsed(self) -> str:
+        """Brendan Gregg's collapsed stack format (one "a;b;c count" line per stack)"""
+        lines = []
+        for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+            lines.append(";".join(f"{name} ({_short_path(path)}:{line})" if path else name for name, path, line in stack) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self) -> Dict[str, Any]:
+        """Speedscope file format: one sampled profile weighted in milliseconds"""
+        frame_index: Dict[FrameKey, int] = {}
+        frames = []
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            indexes = []
+            for key in stack:
+                if key not in frame_index:
+                    frame_index[key] = len(frames)
+                    name, path, line = key
+                    frames.append({"name": name, "file": path, "line": line} if path else {"name": name})
+                indexes.append(frame_index[key])
+            samples.append(indexes)
+            weights.append(count * self.interval_ms)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.path} ({self.id})",
+            "exporter": "goal-achiever-api",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{self.method} {self.path}",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+def _short_path(path: str) -> str:
+    marker = "site-packages/"
+    index = path.rfind(marker)
+    return path[index + len(marker):] if index >= 0 else path
+
+
+def _frame_key(frame) -> FrameKey:
+    code = frame.f_code
+    return (code.co_name, code.co_filename, code.co_firstlineno)
+
+
+def _await_chain(coro) -> List[FrameKey]:
+    """Frames of the coroutines a suspended task is awaiting, outermost first"""
+    keys = []
+    obj = coro
+    while obj is not None:
+        if isinstance(obj, asyncio.Task):
+            obj = obj.get_coro()
+            continue
+        frame = getattr(obj, "cr_frame", None) or getattr(obj, "gi_frame", None) or getattr(obj, "ag_frame", None)
+        if frame is None:
+            break
+        keys.append(_frame_key(frame))
+        obj = getattr(obj, "cr_await", None) or getattr(obj, "gi_yieldfrom", None) or getattr(obj, "ag_await", None)
+    return keys
+
+
+class StackSampler(threading.Thread):
+    """Samples one asyncio task's stack until stopped"""
+
+    def __init__(self, profile: RequestProfile, thread_id: int, coro):
+        super().__init__(name=f"profiler-{profile.id}", daemon=True)
+        self.profile = profile
+        self.thread_id = thread_id
+        self.coro = coro
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        interval = self.profile.interval_ms / 1000
+        while not self._stop_event.wait(interval):
+            self.sample()
+
+    def sample(self):
+        root = self.coro.cr_frame
+        if root is None:
+            return
+        leaf = sys._current_frames().get(self.thread_id)
+        stack = []
+        frame = leaf
+        while frame is not None and frame is not root:
+            stack.append(_frame_key(frame))
+            frame = frame.f_back
+        if frame is root:
+            # Running on the loop right now
+            stack.append(_frame_key(root))
+            key = tuple(reversed(stack))
+        else:
+            key = (WAITING, *_await_chain(self.coro))
+        stacks = self.profile.stacks
+        stacks[key] = stacks.get(key, 0) + 1
+
+
+class ProfileStore:
+    """The most recent profiles, newest last"""
+
+    def __init__(self, max_profiles: int):
+        self._profiles: Deque[RequestProfile] = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[RequestProfile]:
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return next((p for p in self._profiles if p.id == profile_id), None)
+
+
+_store: Optional[ProfileStore] = None
+
+
+def get_profile_store() -> ProfileStore:
+    global _store
+    if _store is None:
+        _store = ProfileStore(settings.PROFILE_MAX_STORED)
+    return _store
+
+
+def background_context() -> Context:
+    """Context for a long-lived task started during a request: no profile attached"""
+    context = copy_context()
+    context.run(_current_profile.set, None)
+    return context
+
+
+def start_sql_capture(method: str, path: str) -> RequestProfile:
+    """Time the current request's SQL only, without a sampler thread"""
+    profile = RequestProfile(method=method, path=path, reason="slow", interval_ms=settings.PROFILE_INTERVAL_MS)
+    _current_profile.set(profile)
+    return profile
+
+
+def start_profile(method: str, path: str, reason: str) -> Tuple[RequestProfile, StackSampler]:
+    """Begin profiling the current task (call from the request's task)"""
+    profile = RequestProfile(method=method, path=path, reason=reason, interval_ms=settings.PROFILE_INTERVAL_MS)
+    _current_profile.set(profile)
+    sampler = StackSampler(profile, threading.get_ident(), asyncio.current_task().get_coro())
+    sampler.start()
+    return profile, sampler
+
+
+def finish_profile(
+    profile: RequestProfile, sampler: Optional[StackSampler], status: Optional[int], duration_ms: float
+) -> bool:
+    """Stop sampling; store the profile if it should be kept. Returns whether it was stored."""
+    if sampler is not None:
+        sampler.stop()
+    _current_profile.set(None)
+    profile.status = status
+    profile.duration_ms = duration_ms
+    if profile.reason == "header" or duration_ms >= settings.PROFILE_SLOW_MS:
+        get_profile_store().add(profile)
+        return True
+    return False
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is not None and conn.info.get("profile_query_start"):
+        elapsed_ms = (time.perf_counter() - conn.info["profile_query_start"].pop()) * 1000
+        profile.add_sql(statement, elapsed_ms)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    conn = context.connection
+    if conn is not None and _current_profile.get() is not None and conn.info.get("profile_query_start"):
+        conn.info["profile_query_start"].pop()
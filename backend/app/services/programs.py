@@ -0,0 +1,126 @@
+"""
+Cohort programs: a goal plan generated once and copied to many users.
+
+The outline and day contents are resolved once when the program is created
+(curated library first, then the LLM), so enrolling a cohort costs no LLM
+calls. A coach invites members; a member's own Goal and DayPlans are created
+with bulk inserts when they accept. The day plans reference the program's
+content by hash, so nothing is copied per user but the rows themselves.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import or_
+from sqlalchemy.orm import Query, Session
+from app.models import ContentTemplate, DayPlan, Goal, Program, ProgramEnrollment, ProgramInvitation, User, generate_uuid
+from app.services import change_log, search, stats, template_library
+from app.services.ai_generator import AIPlanGenerator
+from app.services.quotas import QuotaExceeded
+
+INSERT_CHUNK = 5000  # Rows per executemany
+
+
+async def generate_program_days(
+    db: Session,
+    ai_generator: AIPlanGenerator,
+    title: str,
+    description: Optional[str],
+    total_days: int,
+    use_ai: bool
+) -> List[Dict[str, Any]]:
+    """
+    Day topics and content hashes for a program, [{"topic", "content_hash"}].
+    Raises QuotaExceeded like template_library.build_day_contents. Does not commit.
+    """
+    if use_ai:
+        template = template_library.find_goal_template(db, title, total_days, description)
+        if template:
+            return [dict(day) for day in template.days]
+
+    topics = []
+    if use_ai:
+        try:
+            topics = await ai_generator.generate_goal_outline(title, description, total_days)
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Program outline generation failed: {e}")
+    if not topics or len(topics) < total_days:
+        topics = [f"Daily progress for {title}" for _ in range(total_days)]
+    topics = topics[:total_days]
+
+    hashes: List[Optional[str]] = [None] * total_days
+    if use_ai:
+        hashes = await template_library.build_day_contents(db, ai_generator, title, description, topics)
+    return [{"topic": t, "content_hash": h} for t, h in zip(topics, hashes)]
+
+
+def _insert_chunked(db: Session, model, rows: List[Dict[str, Any]]):
+    """Core executemany inserts (skips per-row ORM bookkeeping)"""
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.execute(model.__table__.insert(), rows[start:start + INSERT_CHUNK])
+
+
+def invite(db: Session, program: Program, members: Sequence[Tuple[Optional[str], Optional[str], date]]):
+    """
+    Pending invitations for (email, user_id, start_date) members, one of
+    email (lower-cased) and user_id set. Does not commit.
+    """
+    now = datetime.utcnow()
+    _insert_chunked(db, ProgramInvitation, [
+        {"id": generate_uuid(), "program_id": program.id, "email": email, "user_id": user_id,
+         "start_date": start_date, "invited_at": now}
+        for email, user_id, start_date in members
+    ])
+
+
+def invitations_for(db: Session, user: User) -> Query:
+    """Pending invitations addressed to the user, by account or by email"""
+    return db.query(ProgramInvitation).filter(
+        or_(ProgramInvitation.user_id == user.id, ProgramInvitation.email == user.email.lower())
+    )
+
+
+def enroll(db: Session, program: Program, members: Sequence[Tuple[str, date]]) -> List[str]:
+    """
+    Give each (user_id, start_date) member their own goal from the program,
+    with stats, change log and search entries. Returns the goal ids in member
+    order. Does not commit.
+    """
+    now = datetime.utcnow()
+    goal_ids = [generate_uuid() for _ in members]
+
+    goals, enrollments, plans, docs = [], [], [], []
+    hashes = {day["content_hash"] for day in program.days if day.get("content_hash")}
+    bodies = {}
+    if hashes:
+        bodies = {
+            h: search.content_text(content) for h, content in
+            db.query(ContentTemplate.hash, ContentTemplate.content).filter(ContentTemplate.hash.in_(hashes))
+        }
+
+    for (user_id, start_date), goal_id in zip(members, goal_ids):
+        goals.append({
+            "id": goal_id, "user_id": user_id, "title": program.title, "description": program.description,
+            "total_days": program.total_days, "start_date": start_date, "created_at": now
+        })
+        enrollments.append({
+            "id": generate_uuid(), "program_id": program.id, "user_id": user_id, "goal_id": goal_id,
+            "start_date": start_date, "enrolled_at": now
+        })
+        for i, day in enumerate(program.days):
+            plan_id = generate_uuid()
+            plans.append({
+                "id": plan_id, "goal_id": goal_id, "day_number": i + 1, "date": start_date + timedelta(days=i),
+                "topic": day["topic"], "content_hash": day.get("content_hash"), "completed": False, "created_at": now
+            })
+            docs.append((user_id, plan_id, goal_id, day["topic"], bodies.get(day.get("content_hash"), "")))
+
+    _insert_chunked(db, Goal, goals)
+    _insert_chunked(db, ProgramEnrollment, enrollments)
+    _insert_chunked(db, DayPlan, plans)
+    for start in range(0, len(docs), INSERT_CHUNK):
+        search.bulk_add_documents(db, search.DAY_PLAN, docs[start:start + INSERT_CHUNK])
+
+    stats.on_goals_created(db, [(user_id, goal_id, program.total_days) for (user_id, _), goal_id in zip(members, goal_ids)])
+    change_log.record_changes_for_users(db, change_log.GOAL, [(user_id, goal_id) for (user_id, _), goal_id in zip(members, goal_ids)])
+    return goal_ids
@@ -0,0 +1,341 @@
+"""
+Per-user request rate limits and LLM usage quotas.
+
+Checks run against the shared state backend (see shared_state.py), so limits
+hold across all workers: token buckets for per-route request rates, and
+per-user counters of today's LLM calls and tokens (seeded from `user_usage`
+when missing) plus a sliding one-minute window of LLM calls. Usage deltas are
+also kept per process and written to `user_usage` in one batch every
+USAGE_FLUSH_SECONDS and on shutdown.
+
+The user a Gemini call is billed to comes from `current_user_id`, set by the
+rate limit middleware for the duration of the request.
+"""
+import asyncio
+import math
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import SessionLocal
+from app.models import User, UserUsage
+from app.services import profiler
+from app.services.shared_state import StateBackend, get_state_backend
+
+DAY_TTL = 2 * 24 * 3600  # Daily counters outlive their UTC day a little
+
+current_user_id: ContextVar[Optional[str]] = ContextVar("current_user_id", default=None)
+
+
+class QuotaExceeded(Exception):
+    """The user has used up an LLM quota; retry after `retry_after` seconds"""
+
+    def __init__(self, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def compile_route_patterns(patterns) -> List[Tuple[str, List[str]]]:
+    """Parse "METHOD /a/*/b" patterns into (method, segments); "*" alone matches everything"""
+    compiled = []
+    for pattern in patterns:
+        if pattern == "*":
+            compiled.append(("*", ["**"]))
+            continue
+        method, _, path = pattern.partition(" ")
+        compiled.append((method.upper(), path.strip("/").split("/")))
+    return compiled
+
+
+def route_matches(compiled: Tuple[str, List[str]], method: str, segments: List[str]) -> bool:
+    pattern_method, pattern_segments = compiled
+    if pattern_segments == ["**"]:
+        return True
+    if pattern_method != method or len(pattern_segments) != len(segments):
+        return False
+    return all(p == "*" or p == s for p, s in zip(pattern_segments, segments))
+
+
+def _seconds_until_tomorrow(now: datetime) -> int:
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(1, math.ceil((tomorrow - now).total_seconds()))
+
+
+class RateLimiter:
+    """Token buckets keyed by (client, rule): `limit` requests per minute with bursts up to `limit`"""
+
+    def __init__(self, rules: Dict[str, int], backend: StateBackend):
+        self.rules = [(compiled, pattern, limit) for compiled, (pattern, limit) in zip(compile_route_patterns(rules), rules.items())]
+        self.backend = backend
+
+    def match(self, method: str, path: str) -> Optional[Tuple[str, int]]:
+        segments = path.strip("/").split("/")
+        for compiled, pattern, limit in self.rules:
+            if route_matches(compiled, method, segments):
+                return pattern, limit
+        return None
+
+    def hit(self, client: str, method: str, path: str) -> int:
+        """Take one token; returns 0 when allowed, else seconds until a token is available"""
+        rule = self.match(method, path)
+        if rule is None:
+            return 0
+        pattern, limit = rule
+        try:
+            wait = self.backend.take_token(f"rate:{client}:{pattern}", limit, limit / 60.0)
+        except Exception as e:
+            print(f"Rate limit check failed, allowing request: {e}")
+            return 0
+        return max(1, math.ceil(wait)) if wait > 0 else 0
+
+
+@dataclass
+class _UserUsage:
+    """A user's usage not yet written to the database"""
+    day: date
+    pending_requests: int = 0
+    pending_calls: int = 0
+    pending_tokens: int = 0
+
+
+class UsageTracker:
+    """Quota checks against shared counters, with periodic batched writes to user_usage"""
+
+    def __init__(self, backend: StateBackend, daily_calls: int, daily_tokens: int, minute_calls: int, flush_interval: float):
+        self.backend = backend
+        self.daily_calls = daily_calls
+        self.daily_tokens = daily_tokens
+        self.minute_calls = minute_calls
+        self.flush_interval = flush_interval
+        self._users: Dict[str, _UserUsage] = {}
+        self._stale: List[Tuple[str, _UserUsage]] = []  # Previous days with unwritten deltas
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _day_keys(user_id: str, day: date) -> Tuple[str, str]:
+        return f"usage:{day.isoformat()}:{user_id}:calls", f"usage:{day.isoformat()}:{user_id}:tokens"
+
+    @staticmethod
+    def _minute_key(user_id: str, minute: int) -> str:
+        return f"usage:minute:{user_id}:{minute}"
+
+    def _seed(self, user_id: str, day: date) -> Tuple[int, int]:
+        """Create today's shared counters from user_usage (first check of the day, or state was lost)"""
+        db = SessionLocal()
+        try:
+            row = db.get(UserUsage, (user_id, day))
+        finally:
+            db.close()
+        calls_key, tokens_key = self._day_keys(user_id, day)
+        # Another worker may seed at the same time; the first one wins
+        self.backend.add_int(calls_key, row.llm_calls if row else 0, DAY_TTL)
+        self.backend.add_int(tokens_key, row.tokens if row else 0, DAY_TTL)
+        calls, tokens = self.backend.get_ints([calls_key, tokens_key])
+        return calls or 0, tokens or 0
+
+    def _pending(self, user_id: str, day: date) -> _UserUsage:
+        """Unwritten deltas for a user and day (call with the lock held)"""
+        usage = self._users.get(user_id)
+        if usage is None or usage.day != day:
+            if usage is not None and (usage.pending_requests or usage.pending_calls or usage.pending_tokens):
+                self._stale.append((user_id, usage))
+            usage = self._users[user_id] = _UserUsage(day=day)
+        return usage
+
+    def check(self, user_id: str):
+        """Raise QuotaExceeded if the user may not make another LLM call right now"""
+        today = datetime.utcnow().date()
+        now = time.time()
+        minute, elapsed = divmod(now, 60)
+        calls_key, tokens_key = self._day_keys(user_id, today)
+        try:
+            calls, tokens, this_minute, last_minute = self.backend.get_ints([
+                calls_key, tokens_key, self._minute_key(user_id, int(minute)), self._minute_key(user_id, int(minute) - 1)
+            ])
+            if calls is None or tokens is None:
+                calls, tokens = self._seed(user_id, today)
+        except Exception as e:
+            print(f"Quota check failed, allowing call: {e}")
+            return
+
+        if calls >= self.daily_calls or tokens >= self.daily_tokens:
+            raise QuotaExceeded("Daily AI quota exceeded", _seconds_until_tomorrow(datetime.utcnow()))
+        # Sliding one-minute window estimated from the current and previous fixed minutes
+        recent = (last_minute or 0) * (1 - elapsed / 60) + (this_minute or 0)
+        if recent >= self.minute_calls:
+            raise QuotaExceeded("Too many AI requests per minute", max(1, math.ceil(60 - elapsed)))
+
+    def record_llm_call(self, user_id: str, tokens: int):
+        today = datetime.utcnow().date()
+        with self._lock:
+            usage = self._pending(user_id, today)
+            usage.pending_calls += 1
+            usage.pending_tokens += tokens
+        calls_key, tokens_key = self._day_keys(user_id, today)
+        try:
+            self.backend.incr(calls_key, 1, DAY_TTL)
+            self.backend.incr(tokens_key, tokens, DAY_TTL)
+            self.backend.incr(self._minute_key(user_id, int(time.time() // 60)), 1, 120)
+        except Exception as e:
+            print(f"Recording LLM usage in shared state failed: {e}")
+        self._ensure_started()
+
+    def record_request(self, user_id: str):
+        with self._lock:
+            self._pending(user_id, datetime.utcnow().date()).pending_requests += 1
+        self._ensure_started()
+
+    def flush(self):
+        """Add pending deltas to user_usage in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                deltas = []
+                for user_id, usage in self._stale + list(self._users.items()):
+                    if usage.pending_requests or usage.pending_calls or usage.pending_tokens:
+                        deltas.append((user_id, usage.day, usage.pending_requests, usage.pending_calls, usage.pending_tokens))
+                        usage.pending_requests = usage.pending_calls = usage.pending_tokens = 0
+                self._stale = []
+                # Forget users not seen today
+                today = datetime.utcnow().date()
+                self._users = {user_id: usage for user_id, usage in self._users.items() if usage.day == today}
+            if not deltas:
+                return
+
+            db = SessionLocal()
+            try:
+                _apply_deltas(db, deltas)
+                db.commit()
+            except Exception:
+                db.rollback()
+                with self._lock:
+                    # Put the deltas back for the next attempt
+                    for user_id, day, requests, calls, tokens in deltas:
+                        self._stale.append((user_id, _UserUsage(
+                            day=day, pending_requests=requests, pending_calls=calls, pending_tokens=tokens
+                        )))
+                raise
+            finally:
+                db.close()
+
+    def _ensure_started(self):
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Called from a worker thread; the next call on the loop starts it
+        # Not part of the request that happens to start it (see profiler)
+        self._task = loop.create_task(self._run(), context=profiler.background_context())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                print(f"Usage flush failed, retrying: {e}")
+
+    async def aclose(self):
+        """Stop the background writer and write what is left"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+def _apply_deltas(db: Session, deltas: List[Tuple[str, date, int, int, int]]):
+    for user_id, day, requests, calls, tokens in deltas:
+        updated = db.execute(
+            update(UserUsage).where(UserUsage.user_id == user_id, UserUsage.day == day).values(
+                requests=UserUsage.requests + requests,
+                llm_calls=UserUsage.llm_calls + calls,
+                tokens=UserUsage.tokens + tokens
+            )
+        ).rowcount
+        if updated:
+            continue
+        try:
+            with db.begin_nested():
+                db.add(UserUsage(user_id=user_id, day=day, requests=requests, llm_calls=calls, tokens=tokens))
+        except IntegrityError:
+            # Another process inserted the row first
+            db.execute(
+                update(UserUsage).where(UserUsage.user_id == user_id, UserUsage.day == day).values(
+                    requests=UserUsage.requests + requests,
+                    llm_calls=UserUsage.llm_calls + calls,
+                    tokens=UserUsage.tokens + tokens
+                )
+            )
+
+
+def top_consumers(db: Session, since: date, until: date, limit: int = 20):
+    """Users by total tokens over [since, until], with their email and totals"""
+    return db.query(
+        UserUsage.user_id,
+        User.email,
+        func.sum(UserUsage.requests).label("requests"),
+        func.sum(UserUsage.llm_calls).label("llm_calls"),
+        func.sum(UserUsage.tokens).label("tokens")
+    ).join(User, User.id == UserUsage.user_id).filter(
+        UserUsage.day >= since,
+        UserUsage.day <= until
+    ).group_by(UserUsage.user_id, User.email).order_by(
+        func.sum(UserUsage.tokens).desc(), func.sum(UserUsage.llm_calls).desc()
+    ).limit(limit).all()
+
+
+_tracker: Optional[UsageTracker] = None
+_limiter: Optional[RateLimiter] = None
+
+
+def get_usage_tracker() -> UsageTracker:
+    global _tracker
+    if _tracker is None:
+        _tracker = UsageTracker(
+            get_state_backend(),
+            daily_calls=settings.QUOTA_DAILY_LLM_CALLS,
+            daily_tokens=settings.QUOTA_DAILY_TOKENS,
+            minute_calls=settings.QUOTA_MINUTE_LLM_CALLS,
+            flush_interval=settings.USAGE_FLUSH_SECONDS,
+        )
+    return _tracker
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter(settings.RATE_LIMITS, get_state_backend())
+    return _limiter
+
+
+async def close_usage_tracker():
+    """Write buffered usage on shutdown"""
+    global _tracker
+    if _tracker is not None:
+        await _tracker.aclose()
+        _tracker = None
+
+
+def check_llm_quota():
+    """Before a Gemini call: raise QuotaExceeded if the current user is over quota"""
+    user_id = current_user_id.get()
+    if user_id is not None:
+        get_usage_tracker().check(user_id)
+
+
+def record_llm_usage(usage_metadata):
+    """After a Gemini call: bill its tokens to the current user"""
+    user_id = current_user_id.get()
+    if user_id is not None:
+        tokens = getattr(usage_metadata, "total_token_count", None) or 0
+        get_usage_tracker().record_llm_call(user_id, tokens)
@@ -0,0 +1,252 @@
+"""
+Full-text search over notes, chat history and day plan content.
+
+Writes keep `search_documents` up to date in the same transaction as the
+source row. The database does the indexing: SQLite through the FTS5 table
+`search_fts` (BM25 ranking, snippet()), PostgreSQL through a tsvector GIN
+index (ts_rank, ts_headline). Other backends fall back to LIKE matching.
+
+Rebuild the index from scratch (e.g. for data created before search existed):
+    python -m app.services.search
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.models import SearchDocument, ContentTemplate, ChatArchive, ChatMessage, DayPlan, Goal, Note
+
+NOTE = "note"
+CHAT = "chat"
+DAY_PLAN = "day_plan"
+KINDS = (NOTE, CHAT, DAY_PLAN)
+
+SNIPPET_START = "**"
+SNIPPET_END = "**"
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    ref_id: str
+    parent_id: Optional[str]
+    title: Optional[str]
+    snippet: str
+    rank: float
+
+
+def content_text(content: Optional[Dict[str, Any]]) -> str:
+    """Flatten day content JSON (overview, tasks, details, tips) into plain text"""
+    if not content:
+        return ""
+    parts = [content.get("overview") or ""]
+    parts.extend(str(t) for t in content.get("tasks") or [])
+    parts.append(content.get("details") or "")
+    parts.append(content.get("tips") or "")
+    return "\n".join(p for p in parts if p)
+
+
+def add_documents(db: Session, user_id: str, kind: str, docs: Iterable[Tuple[str, Optional[str], Optional[str], str]]):
+    """Index new (ref_id, parent_id, title, body) documents. Does not commit."""
+    db.add_all([
+        SearchDocument(user_id=user_id, kind=kind, ref_id=ref_id, parent_id=parent_id, title=title, body=body or "")
+        for ref_id, parent_id, title, body in docs
+    ])
+
+
+def bulk_add_documents(db: Session, kind: str, docs: Iterable[Tuple[str, str, Optional[str], Optional[str], str]]):
+    """Index many new (user_id, ref_id, parent_id, title, body) documents with executemany inserts. Does not commit."""
+    db.execute(SearchDocument.__table__.insert(), [
+        {"user_id": user_id, "kind": kind, "ref_id": ref_id, "parent_id": parent_id, "title": title, "body": body or ""}
+        for user_id, ref_id, parent_id, title, body in docs
+    ])
+
+
+def add_document(db: Session, user_id: str, kind: str, ref_id: str, parent_id: Optional[str], title: Optional[str], body: str):
+    """Index one new document. Does not commit."""
+    add_documents(db, user_id, kind, [(ref_id, parent_id, title, body)])
+
+
+def index_day_plans(db: Session, user_id: str, plans: Sequence[Tuple[str, str, Optional[str], Optional[str]]]):
+    """
+    Index or re-index (plan_id, goal_id, topic, content_hash) day plans,
+    resolving library content with a single query. Does not commit.
+    """
+    hashes = {h for _, _, _, h in plans if h}
+    contents = {}
+    if hashes:
+        contents = dict(db.query(ContentTemplate.hash, ContentTemplate.content).filter(ContentTemplate.hash.in_(hashes)))
+
+    existing = {}
+    plan_ids = [plan_id for plan_id, _, _, _ in plans]
+    if plan_ids:
+        existing = {
+            doc.ref_id: doc for doc in db.query(SearchDocument).filter(
+                SearchDocument.kind == DAY_PLAN,
+                SearchDocument.ref_id.in_(plan_ids)
+            )
+        }
+
+    new_docs = []
+    for plan_id, goal_id, topic, h in plans:
+        body = content_text(contents.get(h))
+        doc = existing.get(plan_id)
+        if doc is None:
+            new_docs.append((plan_id, goal_id, topic, body))
+        elif doc.title != topic or doc.body != body:
+            doc.title, doc.body = topic, body
+    add_documents(db, user_id, DAY_PLAN, new_docs)
+
+
+def remove_documents(db: Session, kind: str, ref_ids: Iterable[str]):
+    """Drop documents from the index. Does not commit."""
+    ref_ids = list(ref_ids)
+    if ref_ids:
+        db.query(SearchDocument).filter(
+            SearchDocument.kind == kind,
+            SearchDocument.ref_id.in_(ref_ids)
+        ).delete(synchronize_session=False)
+
+
+def _fts5_query(query: str) -> str:
+    """Quote user terms for FTS5 MATCH (all terms required, last one as a prefix)"""
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return ""
+    quoted = ['"' + t.replace('"', '""') + '"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _kind_filter(kinds: Sequence[str], params: Dict[str, Any]) -> str:
+    names = []
+    for i, kind in enumerate(kinds):
+        params[f"kind{i}"] = kind
+        names.append(f":kind{i}")
+    return f" AND d.kind IN ({', '.join(names)})"
+
+
+def search(db: Session, user_id: str, query: str, kinds: Sequence[str] = KINDS, limit: int = 20, offset: int = 0) -> List[SearchHit]:
+    """Ranked search over the user's documents (best match first)"""
+    dialect = db.get_bind().dialect.name
+    params: Dict[str, Any] = {"user_id": user_id, "limit": limit, "offset": offset}
+    kinds_sql = _kind_filter(kinds, params)
+
+    if dialect == "sqlite":
+        params["q"] = _fts5_query(query)
+        if not params["q"]:
+            return []
+        sql = f"""
+            SELECT d.kind, d.ref_id, d.parent_id, d.title,
+                   snippet(search_fts, -1, '{SNIPPET_START}', '{SNIPPET_END}', '…', 16) AS snippet,
+                   bm25(search_fts, 2.0, 1.0) AS rank
+            FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid
+            WHERE search_fts MATCH :q AND d.user_id = :user_id{kinds_sql}
+            ORDER BY rank
+            LIMIT :limit OFFSET :offset
+        """
+        rows = db.execute(text(sql), params).all()
+        # bm25() is lower-is-better; expose higher-is-better scores
+        return [SearchHit(r.kind, r.ref_id, r.parent_id, r.title, r.snippet, -r.rank) for r in rows]
+
+    if dialect == "postgresql":
+        params["q"] = query
+        sql = f"""
+            SELECT d.kind, d.ref_id, d.parent_id, d.title,
+                   ts_headline('english', d.body, q,
+                               'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords=24, MinWords=8') AS snippet,
+                   ts_rank(to_tsvector('english', coalesce(d.title, '') || ' ' || d.body), q) AS rank
+            FROM search_documents d, websearch_to_tsquery('english', :q) q
+            WHERE to_tsvector('english', coalesce(d.title, '') || ' ' || d.body) @@ q
+              AND d.user_id = :user_id{kinds_sql}
+            ORDER BY rank DESC
+            LIMIT :limit OFFSET :offset
+        """
+        rows = db.execute(text(sql), params).all()
+        return [SearchHit(r.kind, r.ref_id, r.parent_id, r.title, r.snippet, float(r.rank)) for r in rows]
+
+    # Unindexed fallback for other backends
+    params["q"] = f"%{query}%"
+    sql = f"""
+        SELECT d.kind, d.ref_id, d.parent_id, d.title, substr(d.body, 1, 200) AS snippet
+        FROM search_documents d
+        WHERE (d.title LIKE :q OR d.body LIKE :q) AND d.user_id = :user_id{kinds_sql}
+        ORDER BY d.updated_at DESC
+        LIMIT :limit OFFSET :offset
+    """
+    rows = db.execute(text(sql), params).all()
+    return [SearchHit(r.kind, r.ref_id, r.parent_id, r.title, r.snippet, 0.0) for r in rows]
+
+
+def _keyset_batches(query, key_column, batch_size: int):
+    """Yield query results in batches ordered by a unique key (safe across commits)"""
+    last = None
+    while True:
+        q = query if last is None else query.filter(key_column > last)
+        rows = q.order_by(key_column).limit(batch_size).all()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1].id
+
+
+def rebuild_search_index(db: Session, batch_size: int = 1000):
+    """Re-index every note, chat message (hot and archived) and day plan. Commits per batch."""
+    db.query(SearchDocument).delete(synchronize_session=False)
+    db.commit()
+
+    notes = db.query(Note.id, Note.day_plan_id, Note.content, DayPlan.topic, Goal.user_id).join(
+        Note.day_plan
+    ).join(DayPlan.goal)
+    for rows in _keyset_batches(notes, Note.id, batch_size):
+        for n in rows:
+            add_document(db, n.user_id, NOTE, n.id, n.day_plan_id, n.topic, n.content)
+        db.commit()
+
+    messages = db.query(
+        ChatMessage.id, ChatMessage.user_id, ChatMessage.session_id, ChatMessage.context_topic, ChatMessage.content
+    )
+    for rows in _keyset_batches(messages, ChatMessage.id, batch_size):
+        for m in rows:
+            add_document(db, m.user_id, CHAT, m.id, m.session_id, m.context_topic, m.content)
+        db.commit()
+
+    # Archived chat sessions stay searchable
+    from app.services.chat_archive import archived_messages
+    archives = db.query(ChatArchive)
+    for start in range(0, archives.count(), batch_size):
+        for archive in archives.order_by(ChatArchive.user_id, ChatArchive.session_id).offset(start).limit(batch_size):
+            for m in archived_messages(archive):
+                add_document(db, m.user_id, CHAT, m.id, m.session_id, m.context_topic, m.content)
+        db.commit()
+
+    plans = db.query(
+        DayPlan.id, DayPlan.goal_id, DayPlan.topic, DayPlan.content_hash, DayPlan.inline_content, Goal.user_id
+    ).join(DayPlan.goal)
+    for rows in _keyset_batches(plans, DayPlan.id, batch_size):
+        by_user: Dict[str, list] = {}
+        for p in rows:
+            if p.content_hash or not p.inline_content:
+                by_user.setdefault(p.user_id, []).append((p.id, p.goal_id, p.topic, p.content_hash))
+            else:
+                # Legacy rows with inline content
+                add_document(db, p.user_id, DAY_PLAN, p.id, p.goal_id, p.topic, content_text(p.inline_content))
+        for user_id, user_plans in by_user.items():
+            index_day_plans(db, user_id, user_plans)
+        db.commit()
+
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(text("INSERT INTO search_fts(search_fts) VALUES ('rebuild')"))
+        db.commit()
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal, init_db
+
+    init_db()
+    session = SessionLocal()
+    try:
+        rebuild_search_index(session)
+        print("Search index rebuilt.")
+    finally:
+        session.close()
@@ -0,0 +1,271 @@
+"""
+Semantic near-duplicate cache for tutor chat answers.
+
+Questions are reduced to their content words (filler words such as articles,
+pronouns and auxiliaries, and plural endings dropped), embedded as hashed
+word / word-bigram / character-trigram vectors (no model download),
+L2-normalised and kept in a preallocated float32 matrix, so a lookup is one
+matrix-vector product. A cached answer is reused when the cosine similarity to
+a question asked under the same context topic reaches that topic's threshold.
+
+Hashed n-grams barely notice a single flipped word, so similarity alone is
+not trusted with words that invert or quantify a question: both questions
+must also have the same negations, numbers and direction words (before /
+after, more / less, lose / gain, ...) in the same order. "lose weight" never
+answers "gain weight", and "3 sets" never answers "5 sets". When full, the
+least recently used entry is evicted; entries also expire after a TTL.
+
+With a shared state backend (several workers), answers are also stored there
+under their exact normalised question, so a question another worker already
+answered is found on a local miss and adopted into this worker's index.
+
+Only context-free first turns are served from the cache (see routes/chat.py).
+"""
+import hashlib
+import re
+import threading
+import time
+import zlib
+from typing import TYPE_CHECKING, Dict, List, Optional
+from app.config import settings
+from app.services.shared_state import StateBackend, get_state_backend
+
+if TYPE_CHECKING:
+    import numpy as np  # Imported on first use; it adds ~100 ms to app startup
+
+_WORD_RE = re.compile(r"\w+")
+
+# Words left out of the embedding: they may differ between two questions with
+# the same answer. Negations, quantities, directions and question words are
+# deliberately not listed.
+_FILLER_WORDS = frozenset("""
+a an the i me my mine myself you your yours we us our it its they them their
+am is are was were be been being do does did doing have has had
+please just really also so very quite some any
+""".split())
+
+# Words that must match exactly (same ones, same order) for a hit
+_GUARD_WORDS = frozenset("""
+not no never nor none nothing nobody without cannot t
+zero one two three four five six seven eight nine ten eleven twelve twenty thirty
+forty fifty hundred thousand half double twice once first second third last
+before after more less most least fewer increase decrease lose gain up down
+over under above below higher lower faster slower longer shorter min max
+""".split())
+
+
+def _content_words(text: str) -> List[str]:
+    """The question's words in order, filler words and plural s dropped"""
+    words = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in _FILLER_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _guard_signature(words: List[str]) -> int:
+    """Hash of the negations, numbers and direction words in order ("t" is the n't of don't)"""
+    guard = [w for w in words if w in _GUARD_WORDS or w.isdigit()]
+    digest = hashlib.blake2b(" ".join(guard).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def _normalize_topic(topic: Optional[str]) -> str:
+    return " ".join((topic or "").lower().split())
+
+
+class SemanticCache:
+    """Fixed-capacity cosine-similarity cache of question -> answer"""
+
+    def __init__(
+        self,
+        capacity: int = 5000,
+        dim: int = 512,
+        threshold: float = 0.92,
+        topic_thresholds: Optional[Dict[str, float]] = None,
+        ttl_seconds: float = 7 * 24 * 3600,
+        shared: Optional[StateBackend] = None,
+    ):
+        self.capacity = capacity
+        self.dim = dim
+        self.threshold = threshold
+        self.topic_thresholds = {_normalize_topic(k): v for k, v in (topic_thresholds or {}).items()}
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+
+        import numpy as np
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._topic_ids = np.full(capacity, -1, dtype=np.int32)
+        self._signatures = np.zeros(capacity, dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._created = np.zeros(capacity, dtype=np.float64)
+        self._answers: List[Optional[str]] = [None] * capacity
+        self._topics: Dict[str, int] = {}
+        self._next_topic_id = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+        self.lookups = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def embed(self, text: str) -> "np.ndarray":
+        """Hashed n-gram embedding of the content words (signed feature hashing, log-scaled counts, unit length)"""
+        return self._embed_words(_content_words(text))
+
+    def _embed_words(self, words: List[str]) -> "np.ndarray":
+        import numpy as np
+        features = list(words)
+        features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def threshold_for(self, topic: Optional[str]) -> float:
+        return self.topic_thresholds.get(_normalize_topic(topic), self.threshold)
+
+    def _topic_id(self, topic: Optional[str], create: bool) -> Optional[int]:
+        key = _normalize_topic(topic)
+        if key not in self._topics and create:
+            if len(self._topics) >= self.capacity:
+                # No more than `capacity` topics can be in use; forget the others
+                used = set(self._topic_ids[:self._size].tolist())
+                self._topics = {k: i for k, i in self._topics.items() if i in used}
+            self._topics[key] = self._next_topic_id
+            self._next_topic_id += 1
+        return self._topics.get(key)
+
+    def _best_match(self, vector: "np.ndarray", topic_id: int, signature: int, now: float):
+        """(slot, similarity) of the closest live entry with the same topic and guard words, or (None, -1)"""
+        import numpy as np
+        size = self._size
+        if size == 0:
+            return None, -1.0
+        similarities = self._vectors[:size] @ vector
+        live = (
+            (self._topic_ids[:size] == topic_id)
+            & (self._signatures[:size] == signature)
+            & (now - self._created[:size] < self.ttl_seconds)
+        )
+        if not live.any():
+            return None, -1.0
+        similarities = np.where(live, similarities, -1.0)
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    @staticmethod
+    def _shared_key(question: str, topic: Optional[str]) -> str:
+        normalized = " ".join(_WORD_RE.findall(question.lower()))
+        return "semantic_cache:" + hashlib.sha1(f"{_normalize_topic(topic)}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def lookup(self, question: str, topic: Optional[str] = None) -> Optional[str]:
+        """Cached answer for a near-duplicate question under the same topic, if any"""
+        words = _content_words(question)
+        vector = self._embed_words(words)
+        signature = _guard_signature(words)
+        now = time.time()
+        with self._lock:
+            self.lookups += 1
+            topic_id = self._topic_id(topic, create=False)
+            if topic_id is not None:
+                slot, similarity = self._best_match(vector, topic_id, signature, now)
+                if slot is not None and similarity >= self.threshold_for(topic):
+                    self.hits += 1
+                    self._last_used[slot] = now
+                    return self._answers[slot]
+        if self.shared is None:
+            return None
+
+        try:
+            answer = self.shared.get(self._shared_key(question, topic))
+        except Exception as e:
+            print(f"Shared semantic cache lookup failed: {e}")
+            return None
+        if answer is None:
+            return None
+        answer = answer.decode("utf-8")
+        self._insert(vector, signature, answer, topic, now)
+        with self._lock:
+            self.hits += 1
+            self.shared_hits += 1
+        return answer
+
+    def store(self, question: str, answer: str, topic: Optional[str] = None):
+        """Cache an answer, evicting the least recently used entry when full"""
+        words = _content_words(question)
+        self._insert(self._embed_words(words), _guard_signature(words), answer, topic, time.time())
+        if self.shared is not None:
+            try:
+                self.shared.set(self._shared_key(question, topic), answer.encode("utf-8"), self.ttl_seconds)
+            except Exception as e:
+                print(f"Shared semantic cache store failed: {e}")
+
+    def _insert(self, vector: "np.ndarray", signature: int, answer: str, topic: Optional[str], now: float):
+        import numpy as np
+        with self._lock:
+            topic_id = self._topic_id(topic, create=True)
+            slot, similarity = self._best_match(vector, topic_id, signature, now)
+            if slot is None or similarity < 0.999:
+                if self._size < self.capacity:
+                    slot = self._size
+                    self._size += 1
+                else:
+                    # Expired entries go first, then the least recently used
+                    expired = now - self._created >= self.ttl_seconds
+                    slot = int(np.argmin(np.where(expired, -1.0, self._last_used)))
+                    self.evictions += 1
+            self._vectors[slot] = vector
+            self._topic_ids[slot] = topic_id
+            self._signatures[slot] = signature
+            self._answers[slot] = answer
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self.stores += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": self._size,
+                "topics": len(self._topics),
+                "capacity": self.capacity,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.lookups - self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+
+_cache: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Process-wide cache configured from settings, created on first use"""
+    global _cache
+    if _cache is None:
+        _cache = SemanticCache(
+            capacity=settings.SEMANTIC_CACHE_CAPACITY,
+            dim=settings.SEMANTIC_CACHE_DIM,
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            topic_thresholds=settings.SEMANTIC_CACHE_TOPIC_THRESHOLDS,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+        )
+        backend = get_state_backend()
+        if backend.shared:
+            _cache.shared = backend
+    return _cache
@@ -0,0 +1,387 @@
+"""
+State shared between API worker processes.
+
+Rate-limit buckets, LLM quota counters, the semantic cache's shared tier and
+the leader lease live in one backend, chosen with STATE_BACKEND:
+
+- "memory": a dict in this process. The default; correct only with a single
+  worker.
+- "sqlite": a small SQLite file (STATE_SQLITE_PATH, WAL mode) that every
+  worker on the same host opens. No extra service needed.
+- "redis": a Redis-compatible server at REDIS_URL, for workers on several
+  hosts. Atomic operations run as Lua scripts.
+
+All values expire; counters are integers, everything else is bytes.
+"""
+import math
+import os
+from abc import ABC, abstractmethod
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class StateBackend(ABC):
+    """Operations every backend provides. Keys are plain strings; TTLs are seconds."""
+
+    shared = False  # Whether other processes see the same state
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float):
+        ...
+
+    @abstractmethod
+    def get_ints(self, keys: List[str]) -> List[Optional[int]]:
+        """Counter values, None for missing keys"""
+
+    @abstractmethod
+    def add_int(self, key: str, value: int, ttl: float) -> bool:
+        """Create a counter unless it exists; returns whether it was created"""
+
+    @abstractmethod
+    def incr(self, key: str, amount: int, ttl: float) -> int:
+        """Add to a counter (created at 0 with the TTL if missing); returns the new value"""
+
+    @abstractmethod
+    def take_token(self, key: str, capacity: int, per_second: float) -> float:
+        """
+        Take one token from a bucket holding up to `capacity` tokens and
+        refilling at `per_second`. Returns 0 when taken, else seconds until one
+        is available.
+        """
+
+    @abstractmethod
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew a lease; true while `owner` holds it"""
+
+    @abstractmethod
+    def release_lease(self, name: str, owner: str):
+        ...
+
+    def purge_expired(self) -> int:
+        """Drop expired entries (backends without native expiry); returns how many"""
+        return 0
+
+    def close(self):
+        pass
+
+
+def _refill(tokens: float, updated: float, now: float, capacity: int, per_second: float) -> float:
+    return min(float(capacity), tokens + max(0.0, now - updated) * per_second)
+
+
+def _take(tokens: float, per_second: float) -> Tuple[float, float]:
+    """(tokens left, seconds to wait)"""
+    if tokens >= 1.0:
+        return tokens - 1.0, 0.0
+    return tokens, (1.0 - tokens) / per_second
+
+
+class MemoryBackend(StateBackend):
+    """Process-local state (single worker)"""
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[object, float]] = {}  # key -> (value, expires_at)
+        self._buckets: Dict[str, Tuple[float, float, int, float]] = {}  # (tokens, updated, capacity, per_second)
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float):
+        entry = self._values.get(key)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry[0]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key, time.time())
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl)
+
+    def get_ints(self, keys: List[str]) -> List[Optional[int]]:
+        now = time.time()
+        with self._lock:
+            return [self._live(key, now) for key in keys]
+
+    def add_int(self, key: str, value: int, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if self._live(key, now) is not None:
+                return False
+            self._values[key] = (value, now + ttl)
+            return True
+
+    def incr(self, key: str, amount: int, ttl: float) -> int:
+        now = time.time()
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or entry[1] <= now:
+                entry = (0, now + ttl)
+            value = entry[0] + amount
+            self._values[key] = (value, entry[1])
+            return value
+
+    def take_token(self, key: str, capacity: int, per_second: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _, _ = self._buckets.get(key, (float(capacity), now, capacity, per_second))
+            tokens, wait = _take(_refill(tokens, updated, now, capacity, per_second), per_second)
+            self._buckets[key] = (tokens, now, capacity, per_second)
+            if len(self._buckets) > 100000:
+                # Drop buckets that have refilled completely; they carry no state
+                self._buckets = {
+                    k: b for k, b in self._buckets.items() if _refill(b[0], b[1], now, b[2], b[3]) < b[2]
+                }
+            return wait
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            holder = self._live(name, now)
+            if holder is not None and holder != owner:
+                return False
+            self._values[name] = (owner, now + ttl)
+            return True
+
+    def release_lease(self, name: str, owner: str):
+        with self._lock:
+            if self._live(name, time.time()) == owner:
+                del self._values[name]
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._values.items() if expires_at <= now]
+            for key in expired:
+                del self._values[key]
+            return len(expired)
+
+
+class SQLiteBackend(StateBackend):
+    """State in a SQLite file shared by the workers of one host"""
+
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._execute("""
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value BLOB,
+                number REAL,
+                updated REAL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # Ephemeral state; losing the last writes on a crash is fine
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, sql: str, params=()):
+        return self._connection().execute(sql, params)
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._execute("SELECT value FROM state WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._execute(
+            "INSERT INTO state (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, time.time() + ttl)
+        )
+
+    def get_ints(self, keys: List[str]) -> List[Optional[int]]:
+        placeholders = ", ".join("?" for _ in keys)
+        rows = dict(self._execute(
+            f"SELECT key, number FROM state WHERE key IN ({placeholders}) AND expires_at > ?", (*keys, time.time())
+        ).fetchall())
+        return [int(rows[key]) if key in rows else None for key in keys]
+
+    def add_int(self, key: str, value: int, ttl: float) -> bool:
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO state (key, number, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET number = excluded.number, expires_at = excluded.expires_at "
+            "WHERE state.expires_at <= ?",
+            (key, value, now + ttl, now)
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key: str, amount: int, ttl: float) -> int:
+        now = time.time()
+        row = self._execute(
+            "INSERT INTO state (key, number, expires_at) VALUES (:key, :amount, :expires) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "number = CASE WHEN state.expires_at <= :now THEN :amount ELSE state.number + :amount END, "
+            "expires_at = CASE WHEN state.expires_at <= :now THEN :expires ELSE state.expires_at END "
+            "RETURNING number",
+            {"key": key, "amount": amount, "expires": now + ttl, "now": now}
+        ).fetchone()
+        return int(row[0])
+
+    def take_token(self, key: str, capacity: int, per_second: float) -> float:
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT number, updated FROM state WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+            tokens = _refill(row[0], row[1], now, capacity, per_second) if row else float(capacity)
+            tokens, wait = _take(tokens, per_second)
+            conn.execute(
+                "INSERT INTO state (key, number, updated, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET number = excluded.number, updated = excluded.updated, "
+                "expires_at = excluded.expires_at",
+                (key, tokens, now, now + capacity / per_second + 1)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO state (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE state.value = excluded.value OR state.expires_at <= ?",
+            (name, owner.encode(), now + ttl, now)
+        )
+        return cursor.rowcount == 1
+
+    def release_lease(self, name: str, owner: str):
+        self._execute("DELETE FROM state WHERE key = ? AND value = ?", (name, owner.encode()))
+
+    def purge_expired(self) -> int:
+        return self._execute("DELETE FROM state WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_REDIS_INCR = """
+local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+if redis.call('PTTL', KEYS[1]) < 0 then redis.call('PEXPIRE', KEYS[1], ARGV[2]) end
+return value
+"""
+
+_REDIS_TAKE_TOKEN = """
+local capacity = tonumber(ARGV[1])
+local per_second = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = capacity
+if bucket[1] then
+    tokens = math.min(capacity, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * per_second)
+end
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / per_second end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / per_second * 1000) + 1000)
+return tostring(wait)
+"""
+
+_REDIS_ACQUIRE = """
+local holder = redis.call('GET', KEYS[1])
+if holder and holder ~= ARGV[1] then return 0 end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+_REDIS_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+class RedisBackend(StateBackend):
+    """State in a Redis-compatible server shared by workers on any host"""
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str):
+        import redis  # Only needed when configured
+
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        self._incr = self.client.register_script(_REDIS_INCR)
+        self._take_token = self.client.register_script(_REDIS_TAKE_TOKEN)
+        self._acquire = self.client.register_script(_REDIS_ACQUIRE)
+        self._release = self.client.register_script(_REDIS_RELEASE)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, px=math.ceil(ttl * 1000))
+
+    def get_ints(self, keys: List[str]) -> List[Optional[int]]:
+        return [int(v) if v is not None else None for v in self.client.mget([self.prefix + k for k in keys])]
+
+    def add_int(self, key: str, value: int, ttl: float) -> bool:
+        return bool(self.client.set(self.prefix + key, value, px=math.ceil(ttl * 1000), nx=True))
+
+    def incr(self, key: str, amount: int, ttl: float) -> int:
+        return int(self._incr(keys=[self.prefix + key], args=[amount, math.ceil(ttl * 1000)]))
+
+    def take_token(self, key: str, capacity: int, per_second: float) -> float:
+        return float(self._take_token(keys=[self.prefix + key], args=[capacity, per_second, time.time()]))
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return bool(self._acquire(keys=[self.prefix + name], args=[owner, math.ceil(ttl * 1000)]))
+
+    def release_lease(self, name: str, owner: str):
+        self._release(keys=[self.prefix + name], args=[owner])
+
+    def close(self):
+        self.client.close()
+
+
+_backend: Optional[StateBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_state_backend() -> StateBackend:
+    """Process-wide backend configured from settings, created on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if settings.STATE_BACKEND == "sqlite":
+                    _backend = SQLiteBackend(settings.STATE_SQLITE_PATH)
+                elif settings.STATE_BACKEND == "redis":
+                    _backend = RedisBackend(settings.REDIS_URL, settings.STATE_KEY_PREFIX)
+                elif settings.STATE_BACKEND == "memory":
+                    _backend = MemoryBackend()
+                else:
+                    raise ValueError(f"Unknown STATE_BACKEND {settings.STATE_BACKEND!r}")
+    return _backend
+
+
+def close_state_backend():
+    global _backend
+    if _backend is not None:
+        _backend.close()
+        _backend = None
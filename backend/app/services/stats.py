@@ -0,0 +1,212 @@
+"""
+Progress and streak analytics.
+
+`goal_stats` and `user_stats` are updated in the same transaction as the goal
+creation or plan completion that changes them, so the dashboard reads progress
+in O(1) instead of scanning every DayPlan. A streak counts consecutive calendar
+days (UTC) on which the user completed at least one day plan.
+
+Repair the counters from the underlying day plans with:
+    python -m app.services.stats [user_id ...]
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+from app.models import Goal, DayPlan, GoalStats, UserStats, User
+
+
+def _get_for_update(db: Session, model, key):
+    """Row lock on first access in the transaction; later accesses hit the identity map"""
+    obj = db.identity_map.get(identity_key(model, key))
+    if obj is not None:
+        return obj
+    return db.query(model).filter(*(col == key for col in model.__table__.primary_key.columns)).with_for_update().first()
+
+
+def _advance_streak(stats, day: date):
+    """Fold a completion day at or after the last one into the streak counters"""
+    last = stats.last_completed_date
+    if last is None or day > last:
+        stats.current_streak = stats.current_streak + 1 if last is not None and day == last + timedelta(days=1) else 1
+        stats.last_completed_date = day
+        stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+    # Completions on an already counted day don't move the streak
+
+
+def _completion_days(db: Session, user_id: str, goal_id: Optional[str] = None) -> Set[date]:
+    """Days on which the user (or one of their goals) completed a plan"""
+    query = db.query(DayPlan.completed_at).join(DayPlan.goal).filter(
+        Goal.user_id == user_id,
+        DayPlan.completed == True,  # noqa: E712
+        DayPlan.completed_at.isnot(None)
+    )
+    if goal_id is not None:
+        query = query.filter(DayPlan.goal_id == goal_id)
+    return {completed_at.date() for (completed_at,) in query}
+
+
+def effective_streak(stats, today: Optional[date] = None) -> int:
+    """Current streak as of today: it breaks once a whole day passes without a completion"""
+    today = today or datetime.utcnow().date()
+    if stats.last_completed_date is None or stats.last_completed_date < today - timedelta(days=1):
+        return 0
+    return stats.current_streak
+
+
+def on_goal_created(db: Session, user_id: str, goal_id: str, total_days: int):
+    """Start counters for a new goal. Does not commit."""
+    db.add(GoalStats(goal_id=goal_id, user_id=user_id, total_days=total_days))
+    user_stats = _get_for_update(db, UserStats, user_id)
+    if user_stats is None:
+        db.flush()
+        rebuild_user_stats(db, user_id)
+        return
+    user_stats.goals_count += 1
+    user_stats.total_days += total_days
+
+
+def on_goals_created(db: Session, goals: Sequence[Tuple[str, str, int]]):
+    """Start counters for many new (user_id, goal_id, total_days) goals at once. Does not commit."""
+    db.bulk_insert_mappings(GoalStats, [
+        {"goal_id": goal_id, "user_id": user_id, "total_days": total_days}
+        for user_id, goal_id, total_days in goals
+    ])
+    added: Dict[str, Tuple[int, int]] = {}
+    for user_id, _, total_days in goals:
+        count, days = added.get(user_id, (0, 0))
+        added[user_id] = (count + 1, days + total_days)
+
+    existing = {
+        s.user_id: s for s in db.query(UserStats).filter(UserStats.user_id.in_(added)).with_for_update()
+    }
+    missing = [user_id for user_id in added if user_id not in existing]
+    for user_id, stats in existing.items():
+        count, days = added[user_id]
+        stats.goals_count += count
+        stats.total_days += days
+    if missing:
+        db.flush()
+        # Users whose only goals are these start fresh; others predate stats and are recomputed
+        goal_counts = dict(db.query(Goal.user_id, func.count(Goal.id)).filter(
+            Goal.user_id.in_(missing)
+        ).group_by(Goal.user_id))
+        for user_id in missing:
+            count, days = added[user_id]
+            if goal_counts.get(user_id) == count:
+                db.add(UserStats(user_id=user_id, goals_count=count, total_days=days))
+            else:
+                rebuild_user_stats(db, user_id)
+
+
+def on_goal_resized(db: Session, user_id: str, goal_id: str, delta_days: int):
+    """Adjust totals when day plans are added to or removed from a goal. Does not commit."""
+    goal_stats = _get_for_update(db, GoalStats, goal_id)
+    user_stats = _get_for_update(db, UserStats, user_id)
+    if goal_stats is None or user_stats is None:
+        db.flush()
+        rebuild_user_stats(db, user_id)
+        return
+    goal_stats.total_days += delta_days
+    user_stats.total_days += delta_days
+
+
+def on_plan_completed(db: Session, user_id: str, goal_id: str, completed_at: datetime):
+    """Count a newly completed plan. Does not commit."""
+    goal_stats = _get_for_update(db, GoalStats, goal_id)
+    user_stats = _get_for_update(db, UserStats, user_id)
+    if goal_stats is None or user_stats is None:
+        # Data from before stats existed: recompute once, including this completion
+        db.flush()
+        rebuild_user_stats(db, user_id)
+        return
+
+    day = completed_at.date()
+    flushed = False
+    for stats, scope in ((goal_stats, goal_id), (user_stats, None)):
+        stats.completed_count += 1
+        if stats.last_completed_date is None or day >= stats.last_completed_date:
+            _advance_streak(stats, day)
+            continue
+        # A day before the last one (offline sync, batch, another device) can join or
+        # bridge earlier runs: recompute the streaks from the completion days
+        if not flushed:
+            db.flush()
+            flushed = True
+        stats.current_streak, stats.longest_streak, stats.last_completed_date = _streaks(
+            _completion_days(db, user_id, scope)
+        )
+
+
+def _streaks(days: Iterable[date]) -> Tuple[int, int, Optional[date]]:
+    """(streak ending on the last day, longest streak, last day) for a set of completion days"""
+    current = longest = 0
+    previous = None
+    for day in sorted(set(days)):
+        current = current + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    return current, longest, previous
+
+
+def rebuild_user_stats(db: Session, user_id: str):
+    """Recompute a user's goal and user counters from their day plans. Does not commit."""
+    counts = db.query(
+        DayPlan.goal_id,
+        func.count(DayPlan.id),
+        func.sum(case((DayPlan.completed == True, 1), else_=0))  # noqa: E712
+    ).join(DayPlan.goal).filter(Goal.user_id == user_id).group_by(DayPlan.goal_id).all()
+
+    completion_days: Dict[str, Set[date]] = {}
+    completed = db.query(DayPlan.goal_id, DayPlan.completed_at).join(DayPlan.goal).filter(
+        Goal.user_id == user_id,
+        DayPlan.completed == True,  # noqa: E712
+        DayPlan.completed_at.isnot(None)
+    )
+    for goal_id, completed_at in completed:
+        completion_days.setdefault(goal_id, set()).add(completed_at.date())
+
+    goal_ids = [goal_id for (goal_id,) in db.query(Goal.id).filter(Goal.user_id == user_id)]
+    totals = {goal_id: (total, done or 0) for goal_id, total, done in counts}
+    existing = {s.goal_id: s for s in db.query(GoalStats).filter(GoalStats.user_id == user_id)}
+
+    for goal_id in goal_ids:
+        stats = existing.get(goal_id)
+        if stats is None:
+            stats = GoalStats(goal_id=goal_id, user_id=user_id)
+            db.add(stats)
+        stats.total_days, stats.completed_count = totals.get(goal_id, (0, 0))
+        stats.current_streak, stats.longest_streak, stats.last_completed_date = _streaks(completion_days.get(goal_id, ()))
+
+    user_stats = db.get(UserStats, user_id)
+    if user_stats is None:
+        user_stats = UserStats(user_id=user_id)
+        db.add(user_stats)
+    user_stats.goals_count = len(goal_ids)
+    user_stats.total_days = sum(total for total, _ in totals.values())
+    user_stats.completed_count = sum(done for _, done in totals.values())
+    all_days = set().union(*completion_days.values()) if completion_days else set()
+    user_stats.current_streak, user_stats.longest_streak, user_stats.last_completed_date = _streaks(all_days)
+
+
+def rebuild_stats(db: Session, user_ids: Optional[List[str]] = None):
+    """Repair job: recompute stats for the given users (all users by default). Commits per user."""
+    if user_ids is None:
+        user_ids = [user_id for (user_id,) in db.query(User.id)]
+    for user_id in user_ids:
+        rebuild_user_stats(db, user_id)
+        db.commit()
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database import SessionLocal, init_db
+
+    init_db()
+    session = SessionLocal()
+    try:
+        rebuild_stats(session, sys.argv[1:] or None)
+        print("Stats rebuilt.")
+    finally:
+        session.close()
@@ -0,0 +1,253 @@
+"""
+Shared plan-template library.
+
+Generated day content is stored once in `content_templates`, keyed by the
+SHA-256 of its canonical JSON, and day plans reference it by hash. Content is
+also tagged with a topic key (goal title, description and day topic) so the
+same outline topic is generated only once across goals. Curated goal programs in `goal_templates`
+let `create_goal` build a whole plan from the library without any LLM calls.
+
+Precompute the curated programs at deploy time with:
+    python -m app.services.template_library
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import ContentTemplate, GoalTemplate
+from app.services.ai_generator import AIPlanGenerator, is_fallback_content
+from app.services.quotas import QuotaExceeded
+
+# Max concurrent Gemini calls per batch (free tier rate limits)
+GENERATION_BATCH_SIZE = 10
+
+# Popular goals precomputed at deploy time
+CURATED_GOALS: List[Dict[str, Any]] = [
+    {"title": "Crack coding interviews", "description": "Data structures, algorithms and system design practice", "total_days": 90},
+    {"title": "Learn Python", "description": "From the basics to building small projects", "total_days": 30},
+    {"title": "Lose weight", "description": "Sustainable diet and exercise routine", "total_days": 90},
+    {"title": "Run a 5K", "description": "Couch to 5K running program", "total_days": 60},
+    {"title": "Learn generative AI", "description": "LLMs, prompting, RAG and fine-tuning", "total_days": 30},
+]
+
+
+def normalize_key(text: Optional[str]) -> str:
+    """Case- and whitespace-insensitive lookup key"""
+    return " ".join((text or "").lower().split())
+
+
+def topic_key(title: str, topic: str, description: Optional[str] = None) -> str:
+    """
+    Library key for the content of one outline topic within a goal. Content is
+    generated from the goal description too, so a description (by digest, the
+    text can be long) is part of the key.
+    """
+    key = f"{normalize_key(title)}|{normalize_key(topic)}"
+    described = normalize_key(description)
+    if described:
+        key += "|" + hashlib.sha256(described.encode("utf-8")).hexdigest()[:16]
+    return key
+
+
+def content_hash(content: Dict[str, Any]) -> str:
+    """Content address: SHA-256 of the canonical JSON encoding"""
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _existing_hashes(db: Session, hashes: Set[str]) -> Set[str]:
+    if not hashes:
+        return set()
+    return {row.hash for row in db.query(ContentTemplate.hash).filter(ContentTemplate.hash.in_(hashes))}
+
+
+def _insert_contents(db: Session, rows: List[Dict[str, Any]]):
+    """
+    Insert library rows, skipping hashes another request inserted since they
+    were looked up (two goals storing the same fallback content at once)
+    """
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        db.execute(insert(ContentTemplate).values(rows).on_conflict_do_nothing(index_elements=["hash"]))
+        return
+    for row in rows:
+        try:
+            with db.begin_nested():
+                db.add(ContentTemplate(**row))
+        except IntegrityError:
+            pass
+
+
+def store_contents(db: Session, items: Sequence[Tuple[Dict[str, Any], Optional[str]]]) -> List[str]:
+    """
+    Save (content, topic_key) pairs into the library, once per unique content.
+    Returns the content hash for each item. Does not commit.
+    """
+    hashes = [content_hash(content) for content, _ in items]
+    existing = _existing_hashes(db, set(hashes))
+
+    rows = []
+    for h, (content, key) in zip(hashes, items):
+        if h in existing:
+            continue
+        rows.append({"hash": h, "topic_key": key, "content": content})
+        existing.add(h)
+    _insert_contents(db, rows)
+
+    return hashes
+
+
+def store_content(db: Session, content: Dict[str, Any], key: Optional[str] = None) -> str:
+    """Save a single content object into the library. Does not commit."""
+    return store_contents(db, [(content, key)])[0]
+
+
+def find_topic_contents(
+    db: Session, title: str, topics: Sequence[str], description: Optional[str] = None
+) -> Dict[str, str]:
+    """Map topic keys already present in the library to their content hash"""
+    keys = {topic_key(title, t, description) for t in topics if t}
+    if not keys:
+        return {}
+    rows = db.query(ContentTemplate.topic_key, ContentTemplate.hash).filter(
+        ContentTemplate.topic_key.in_(keys)
+    ).all()
+    return {row.topic_key: row.hash for row in rows}
+
+
+def find_goal_template(
+    db: Session, title: str, total_days: int, description: Optional[str] = None
+) -> Optional[GoalTemplate]:
+    """
+    Curated program matching the goal title and duration, if any. A goal with a
+    description of its own only matches a program with the same description.
+    """
+    template = db.query(GoalTemplate).filter(
+        GoalTemplate.title_key == normalize_key(title),
+        GoalTemplate.total_days == total_days
+    ).first()
+    if template and normalize_key(description) not in ("", normalize_key(template.description)):
+        return None
+    return template
+
+
+async def build_day_contents(
+    db: Session,
+    generator: AIPlanGenerator,
+    title: str,
+    description: Optional[str],
+    topics: Sequence[str],
+    day_numbers: Optional[Sequence[int]] = None,
+) -> List[Optional[str]]:
+    """
+    Resolve the content hash for each day topic, reusing library content for
+    topics seen before and generating (in batches) only the missing ones.
+    Returns one hash per topic, None where generation failed. Does not commit.
+    Raises QuotaExceeded when the user's AI quota runs out, after adding the
+    content generated so far to the session.
+    """
+    day_numbers = list(day_numbers) if day_numbers is not None else list(range(1, len(topics) + 1))
+    known = find_topic_contents(db, title, topics, description)
+    hashes: List[Optional[str]] = [known.get(topic_key(title, t, description)) for t in topics]
+
+    # Generate each distinct missing topic only once
+    missing: Dict[str, int] = {}
+    for i, t in enumerate(topics):
+        if hashes[i] is None and topic_key(title, t, description) not in missing:
+            missing[topic_key(title, t, description)] = i
+
+    async def fetch(i: int) -> Optional[Dict[str, Any]]:
+        try:
+            return await generator.generate_daily_content(title, description, day_numbers[i], topics[i])
+        except QuotaExceeded:
+            raise
+        except Exception as e:
+            print(f"Failed to generate content for Day {day_numbers[i]}: {e}")
+            return None
+
+    pending = list(missing.values())
+    generated: Dict[str, str] = {}
+    for start in range(0, len(pending), GENERATION_BATCH_SIZE):
+        batch = pending[start:start + GENERATION_BATCH_SIZE]
+        results = await asyncio.gather(*(fetch(i) for i in batch), return_exceptions=True)
+        quota_error = next((r for r in results if isinstance(r, QuotaExceeded)), None)
+        done = [(i, content) for i, content in zip(batch, results) if isinstance(content, dict)]
+        # Failed generations are stored for the day but never reused by topic
+        keys = [None if is_fallback_content(c) else topic_key(title, topics[i], description) for i, c in done]
+        stored = store_contents(db, [(c, key) for (_, c), key in zip(done, keys)])
+        for (i, _), key, h in zip(done, keys, stored):
+            if key:
+                generated[key] = h
+            else:
+                hashes[i] = h
+        if quota_error is not None:
+            raise quota_error
+
+    for i, t in enumerate(topics):
+        if hashes[i] is None:
+            hashes[i] = generated.get(topic_key(title, t, description))
+
+    return hashes
+
+
+async def precompute_goal_template(
+    db: Session,
+    generator: AIPlanGenerator,
+    title: str,
+    description: Optional[str],
+    total_days: int,
+) -> GoalTemplate:
+    """Generate (or return the existing) curated template for a goal. Commits."""
+    template = find_goal_template(db, title, total_days, description)
+    if template:
+        return template
+
+    topics = await generator.generate_goal_outline(title, description, total_days)
+    hashes = await build_day_contents(db, generator, title, description, topics)
+
+    template = GoalTemplate(
+        title_key=normalize_key(title),
+        title=title,
+        description=description,
+        total_days=total_days,
+        days=[{"topic": t, "content_hash": h} for t, h in zip(topics, hashes)]
+    )
+    db.add(template)
+    db.commit()
+    return template
+
+
+async def precompute_curated_templates(
+    db: Session,
+    generator: AIPlanGenerator,
+    goals: Sequence[Dict[str, Any]] = CURATED_GOALS,
+) -> None:
+    """Precompute the curated program library (run at deploy time)"""
+    for goal in goals:
+        template = await precompute_goal_template(
+            db, generator, goal["title"], goal.get("description"), goal["total_days"]
+        )
+        print(f"Template ready: {template.title} ({template.total_days} days)")
+
+
+if __name__ == "__main__":
+    from app.config import settings
+    from app.database import SessionLocal, init_db
+
+    if not settings.GEMINI_API_KEY:
+        print("GEMINI_API_KEY is not set, skipping template precomputation.")
+    else:
+        init_db()
+        session = SessionLocal()
+        try:
+            asyncio.run(precompute_curated_templates(session, AIPlanGenerator()))
+        finally:
+            session.close()
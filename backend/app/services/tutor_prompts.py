@@ -0,0 +1,65 @@
+"""
+Prompts for the tutor chat and the day plan topic chat, shared by the HTTP
+routes and the WebSocket channel.
+"""
+from typing import Iterable, Optional, Tuple
+
+
+def format_conversation(turns: Iterable[Tuple[str, str]], message: str) -> str:
+    """Render (role, content) history plus the new user message as a transcript"""
+    parts = [f"{'User' if role == 'user' else 'Assistant'}: {content}" for role, content in turns]
+    parts.append(f"User: {message}")
+    return "\n".join(parts)
+
+
+def build_tutor_prompt(turns: Iterable[Tuple[str, str]], message: str, context_topic: Optional[str] = None) -> str:
+    """Interview-prep tutor prompt"""
+    context_hint = ""
+    if context_topic:
+        context_hint = f"\nThe user is currently studying: {context_topic}. Tailor your response to this topic."
+
+    return f"""You are an expert AI tutor specializing in technical interview preparation covering Data Structures & Algorithms (DSA), System Design, and Generative AI.
+
+Your role:
+- Explain concepts clearly with examples
+- When asked about DSA, provide Python code solutions with step-by-step explanations
+- When asked about System Design, discuss architecture, tradeoffs, and scalability
+- When asked about GenAI, explain LLM concepts, transformers, RAG, fine-tuning, etc.
+- Give constructive feedback on the user's answers
+- Ask follow-up questions to deepen understanding
+- Keep responses concise but thorough
+- Use code blocks for any code snippets{context_hint}
+
+Conversation so far:
+{format_conversation(turns, message)}
+
+Provide a helpful, encouraging response as the AI tutor:"""
+
+
+def plan_context(goal_title: str, day_number: int, topic: Optional[str], content) -> str:
+    """Today's goal, day and content, as given to the topic chat"""
+    context_parts = [
+        f"Goal: {goal_title}",
+        f"Today is Day {day_number}.",
+        f"Topic: {topic}"
+    ]
+    if content:
+        context_parts.append(f"Content: {content}")
+    return "\n".join(context_parts)
+
+
+def build_topic_prompt(context: str, turns: Iterable[Tuple[str, str]], message: str) -> str:
+    """Day plan coach prompt, given the plan_context() of the day"""
+    return f"""You are an expert AI coach helping a user with their goal. (e.g., losing weight, learning skills, etc.)
+Context for today:
+{context}
+
+Your role:
+- Answer doubts related to today's topic and content.
+- Be encouraging, practical, and clear.
+- Use markdown formatting.
+
+Conversation:
+{format_conversation(turns, message)}
+
+Provide a helpful response:"""
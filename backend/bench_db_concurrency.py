@@ -0,0 +1,116 @@
+"""
+Concurrency benchmark for the database layer.
+
+Runs reader threads (plan-by-date lookups) against writer threads (goal
+creation transactions inserting a goal and its day plans) on a temporary
+SQLite file, once with default engine settings and once with the tuned
+production settings (WAL, synchronous=NORMAL, mmap, busy_timeout, cache_size).
+
+Usage:
+    python bench_db_concurrency.py [--readers 8] [--writers 2] [--seconds 5] [--days 90]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, create_db_engine
+from app.models import User, Goal, DayPlan
+
+
+def run(tuned: bool, readers: int, writers: int, seconds: float, days: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_db_engine(f"sqlite:///{path}", tuned=tuned)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    with Session() as db:
+        user = User(email="bench@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+    stop = threading.Event()
+    read_latencies, write_latencies = [], []
+    errors = {"read": 0, "write": 0}
+    lock = threading.Lock()
+
+    def writer():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                with Session() as db:
+                    goal = Goal(user_id=user_id, title="Bench goal", total_days=days, start_date=date.today())
+                    db.add(goal)
+                    db.flush()
+                    for i in range(days):
+                        db.add(DayPlan(goal_id=goal.id, day_number=i + 1,
+                                       date=date.today() + timedelta(days=i), topic=f"Topic {i}"))
+                    db.commit()
+                with lock:
+                    write_latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                with lock:
+                    errors["write"] += 1
+
+    def reader():
+        while not stop.is_set():
+            target = date.today() + timedelta(days=random.randrange(days))
+            started = time.perf_counter()
+            try:
+                with Session() as db:
+                    db.query(DayPlan).join(DayPlan.goal).filter(
+                        DayPlan.date == target, Goal.user_id == user_id
+                    ).first()
+                with lock:
+                    read_latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                with lock:
+                    errors["read"] += 1
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    def p95(values):
+        return statistics.quantiles(values, n=20)[-1] * 1000 if len(values) >= 20 else float("nan")
+
+    return {
+        "mode": "tuned" if tuned else "default",
+        "reads/s": len(read_latencies) / seconds,
+        "read p95 ms": p95(read_latencies),
+        "writes/s": len(write_latencies) / seconds,
+        "write p95 ms": p95(write_latencies),
+        "read errors": errors["read"],
+        "write errors": errors["write"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--days", type=int, default=90)
+    args = parser.parse_args()
+
+    for tuned in (False, True):
+        result = run(tuned, args.readers, args.writers, args.seconds, args.days)
+        print("  ".join(f"{k}: {v:.1f}" if isinstance(v, float) else f"{k}: {v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Payload size and encoding CPU benchmark for the heavy read endpoints.
+
+Seeds a temporary SQLite database with a 30-day and a 365-day goal (markdown
+day content, a note per day, a 60-message chat session), then requests
+
+    GET /sync                 full snapshot of every goal's day plans
+    GET /plans/date/<d>       one day with its content
+    GET /chat/history/<id>    a chat session
+
+through the app with each Accept / Accept-Encoding combination, and reports
+bytes on the wire and process CPU per request (the in-process test client is
+included, so compare variants against each other). A second table sweeps gzip
+levels and brotli qualities over the same bodies, timing the encoder alone, to
+show the size / CPU trade behind the COMPRESSION_* defaults.
+
+Usage:
+    python bench_payloads.py [--requests 50]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import zlib
+from datetime import date, datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["PROFILE_SLOW_MS"] = "100000"
+
+import brotli  # noqa: E402
+import msgpack  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import ChatMessage, ContentTemplate, DayPlan, Goal, Note, User, generate_uuid  # noqa: E402
+
+WORDS = (
+    "warm up stretch breathe focus pace interval recover hydrate posture core strength balance mobility "
+    "practice review notes chapter exercise concept example summary reflect plan schedule habit progress "
+    "milestone energy sleep nutrition protein rest tempo cadence form technique drill repeat minutes sets "
+    "reps gradually increase comfortable challenge consistent journal track measure adjust goal week day"
+).split()
+
+VARIANTS = [
+    ("json", "identity"),
+    ("json", "gzip"),
+    ("json", "br"),
+    ("msgpack", "identity"),
+    ("msgpack", "gzip"),
+    ("msgpack", "br"),
+]
+
+
+def sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def day_content(rng: random.Random, day: int) -> dict:
+    """Day content shaped like the generator's output (markdown details)"""
+    details = [f"## Day {day}: {sentence(rng, 4)}"]
+    for _ in range(4):
+        details.append(f"### {sentence(rng, 3)}")
+        details.append(" ".join(sentence(rng, rng.randint(8, 18)) for _ in range(3)))
+        details.extend(f"- **{rng.choice(WORDS)}**: {sentence(rng, 10)}" for _ in range(3))
+    return {
+        "overview": " ".join(sentence(rng, 14) for _ in range(2)),
+        "tasks": [sentence(rng, 9) for _ in range(5)],
+        "details": "\n\n".join(details),
+        "tips": " ".join(sentence(rng, 12) for _ in range(2)),
+    }
+
+
+def seed() -> tuple:
+    rng = random.Random(42)
+    db = SessionLocal()
+    user = User(email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    today = date.today()
+    for total_days in (30, 365):
+        goal = Goal(user_id=user.id, title=f"{total_days}-day goal", total_days=total_days, start_date=today)
+        db.add(goal)
+        db.flush()
+        for i in range(total_days):
+            content_hash = generate_uuid().replace("-", "")
+            db.add(ContentTemplate(hash=content_hash, content=day_content(rng, i + 1)))
+            plan = DayPlan(goal_id=goal.id, day_number=i + 1, date=today + timedelta(days=i),
+                           topic=sentence(rng, 5), content_hash=content_hash, completed=i < total_days // 3)
+            db.add(plan)
+            db.flush()
+            db.add(Note(day_plan_id=plan.id, content=sentence(rng, 25)))
+
+    session_id = generate_uuid()
+    start = datetime.utcnow() - timedelta(hours=1)
+    for i in range(60):
+        db.add(ChatMessage(
+            user_id=user.id, session_id=session_id, role="user" if i % 2 == 0 else "assistant",
+            content=sentence(rng, 15) if i % 2 == 0 else "\n\n".join(sentence(rng, 20) for _ in range(4)),
+            context_topic="bench", created_at=start + timedelta(seconds=i)
+        ))
+    db.commit()
+    token = create_access_token({"sub": user.id})
+    db.close()
+    return token, session_id, today
+
+
+def measure(client: TestClient, url: str, headers: dict, requests: int) -> tuple:
+    """(wire bytes, ms of server CPU per request)"""
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    wire = response.num_bytes_downloaded
+    started = time.process_time()
+    for _ in range(requests):
+        client.get(url, headers=headers)
+    cpu_ms = (time.process_time() - started) * 1000 / requests
+    return wire, cpu_ms
+
+
+def body_of(client: TestClient, url: str, headers: dict, as_msgpack: bool) -> bytes:
+    """Uncompressed response body"""
+    headers = dict(headers, **{"Accept-Encoding": "identity"})
+    if as_msgpack:
+        headers["Accept"] = "application/msgpack"
+    return client.get(url, headers=headers).content
+
+
+def sweep(body: bytes, runs: int = 20) -> list:
+    rows = []
+    for level in (1, 5, 6, 9):
+        started = time.process_time()
+        for _ in range(runs):
+            c = zlib.compressobj(level, zlib.DEFLATED, 31)
+            size = len(c.compress(body) + c.flush())
+        rows.append((f"gzip-{level}", size, (time.process_time() - started) * 1000 / runs))
+    for quality in (1, 4, 5, 6, 11):
+        n = 2 if quality == 11 else runs
+        started = time.process_time()
+        for _ in range(n):
+            size = len(brotli.compress(body, quality=quality))
+        rows.append((f"br-{quality}", size, (time.process_time() - started) * 1000 / n))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per variant for the CPU figure")
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        token, session_id, today = seed()
+        auth = {"Authorization": f"Bearer {token}"}
+        endpoints = [
+            ("sync snapshot (30 + 365 days)", "/sync"),
+            ("day plan with content", f"/plans/date/{today.isoformat()}"),
+            ("chat history (60 messages)", f"/chat/history/{session_id}"),
+        ]
+
+        print(f"{'endpoint':32} {'variant':18} {'bytes':>9} {'ratio':>6} {'cpu ms/req':>10}")
+        for name, url in endpoints:
+            baseline = None
+            for body_type, encoding in VARIANTS:
+                headers = dict(auth, **{"Accept-Encoding": encoding})
+                if body_type == "msgpack":
+                    headers["Accept"] = "application/msgpack"
+                wire, cpu_ms = measure(client, url, headers, args.requests)
+                baseline = baseline or wire
+                print(f"{name:32} {body_type + '+' + encoding:18} {wire:9d} {wire / baseline:6.2f} {cpu_ms:10.2f}")
+            print()
+
+        for name, url in endpoints:
+            for as_msgpack in (False, True):
+                body = body_of(client, url, auth, as_msgpack)
+                print(f"{name}, {'msgpack' if as_msgpack else 'json'} body of {len(body)} bytes")
+                for codec, size, cpu_ms in sweep(body):
+                    print(f"    {codec:8} {size:9d} bytes {cpu_ms:8.3f} ms")
+                print()
+
+        # Same data must round-trip both ways
+        as_json = client.get(endpoints[0][1], headers=auth).json()
+        as_msgpack = msgpack.unpackb(client.get(endpoints[0][1], headers=dict(auth, Accept="application/msgpack")).content)
+        assert as_json == as_msgpack, "msgpack body differs from JSON"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Throughput benchmark for multi-worker deployments.
+
+Seeds a temporary SQLite database (a user with a 90-day goal), then for each
+worker count starts gunicorn with that many uvicorn workers on the shared
+SQLite state backend and drives it with concurrent keep-alive clients for a
+fixed time, alternating
+
+    GET /goals
+    GET /plans/date/<today>
+
+and reports requests per second with p50 / p99 latency. Rate limiting stays
+on (with a limit the benchmark cannot reach) so every request pays for the
+shared token bucket, as in production.
+
+The load generator runs on the same machine and uses a CPU of its own, so
+throughput stops scaling about one core before the worker count reaches
+cpu_count; use --workers to pick the counts explicitly.
+
+Usage:
+    python bench_workers.py [--workers 1,2,4] [--clients 32] [--seconds 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+workdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+os.environ["STATE_BACKEND"] = "sqlite"
+os.environ["STATE_SQLITE_PATH"] = os.path.join(workdir, "state.db")
+os.environ["RATE_LIMITS"] = json.dumps({"*": 10 ** 9})
+os.environ["PROFILE_SLOW_MS"] = "100000"
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+
+import httpx  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.models import DayPlan, Goal, User  # noqa: E402
+
+
+def seed() -> str:
+    init_db()
+    db = SessionLocal()
+    user = User(email="bench@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    goal = Goal(user_id=user.id, title="Bench goal", total_days=90, start_date=date.today())
+    db.add(goal)
+    db.flush()
+    db.add_all(DayPlan(goal_id=goal.id, day_number=i + 1, date=date.today() + timedelta(days=i),
+                       topic=f"Topic {i + 1}") for i in range(90))
+    db.commit()
+    token = create_access_token({"sub": user.id})
+    db.close()
+    return token
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start")
+
+
+async def load(url: str, token: str, clients: int, seconds: float) -> dict:
+    paths = ["/goals", f"/plans/date/{date.today().isoformat()}"]
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def client(n: int):
+        nonlocal errors
+        headers = {"Authorization": f"Bearer {token}"}
+        async with httpx.AsyncClient(base_url=url, headers=headers, timeout=30) as http:
+            i = n
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await http.get(paths[i % len(paths)])
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+                i += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+def run(workers: int, token: str, clients: int, seconds: float) -> dict:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app.main:app", "-c", "gunicorn.conf.py", "--access-logfile", "/dev/null"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(url)
+        asyncio.run(load(url, token, clients, 1))  # Warm up every worker
+        return asyncio.run(load(url, token, clients, seconds))
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def main():
+    cores = os.cpu_count() or 1
+    default_workers = sorted({1, *(n for n in (2, 4, 8, 16) if n <= cores), cores})
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)), help="Comma-separated worker counts")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent keep-alive clients")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    token = seed()
+    print(f"{cores} CPUs, {args.clients} clients, {args.seconds:g}s per run")
+    print(f"{'workers':>7} {'req/s':>9} {'scaling':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    baseline = None
+    for workers in (int(n) for n in args.workers.split(",")):
+        result = run(workers, token, args.clients, args.seconds)
+        baseline = baseline or result["rps"]
+        print(f"{workers:7d} {result['rps']:9.0f} {result['rps'] / baseline:7.2f}x "
+              f"{result['p50']:8.1f} {result['p99']:8.1f} {result['errors']:7d}")
+
+
+if __name__ == "__main__":
+    main()
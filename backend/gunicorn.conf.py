@@ -0,0 +1,44 @@
+"""
+Gunicorn settings for running several uvicorn workers:
+
+    gunicorn app.main:app -c gunicorn.conf.py
+
+Each worker is a separate process with its own caches and connection pool.
+Rate limits, quota counters, the semantic cache and the leader lease are
+shared through STATE_BACKEND, which must be "sqlite" (one host) or "redis"
+when more than one worker runs. Left unset, it becomes "sqlite"; set
+explicitly to "memory", gunicorn refuses to start more than one worker.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 120  # Plan generation can hold a request for a while
+graceful_timeout = 30  # Time to flush write-behind buffers and release the leader lease
+keepalive = 5
+# Recycle workers now and then; the jitter keeps them from restarting together
+max_requests = int(os.environ.get("MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+
+
+def on_starting(server):
+    from app.config import settings
+
+    if server.cfg.workers > 1:
+        if settings.STATE_BACKEND == "memory":
+            # Per-process state would make every worker its own leader (periodic
+            # jobs run once per worker) and give each one its own rate limits
+            if "STATE_BACKEND" in settings.model_fields_set:
+                raise SystemExit(
+                    f"STATE_BACKEND=memory cannot be shared by {server.cfg.workers} workers; "
+                    "use sqlite or redis, or run one worker (WEB_CONCURRENCY=1)."
+                )
+            # Workers are forked from this process and inherit the setting
+            settings.STATE_BACKEND = "sqlite"
+            os.environ["STATE_BACKEND"] = "sqlite"
+            print(f"Using STATE_BACKEND=sqlite ({settings.STATE_SQLITE_PATH}) for {server.cfg.workers} workers.")
+        if settings.CHAT_WRITE_BEHIND:
+            print("WARNING: CHAT_WRITE_BEHIND buffers per worker; unflushed messages are lost if a worker is killed.")
@@ -0,0 +1,65 @@
+"""
+Account import safety: imported day content goes into the library shared by
+all users, so it must not be able to stand in for other users' content.
+
+Usage:
+    python -m pytest test_account_import.py
+    python test_account_import.py
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'import.db')}"
+
+import pytest  # noqa: E402
+
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.models import ContentTemplate, User  # noqa: E402
+from app.services import account_transfer, template_library  # noqa: E402
+
+CONTENT = {"overview": "Injected", "tasks": ["Do something else"], "details": "", "tips": ""}
+
+
+def _import(records):
+    db = SessionLocal()
+    try:
+        user = User(email=f"{len(records)}-{id(records)}@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        importer = account_transfer.AccountImporter(db, user.id)
+        importer.feed([{"type": "header", "format": account_transfer.FORMAT, "version": account_transfer.VERSION}]
+                      + records + [{"type": "end"}])
+        importer.finish()
+        db.commit()
+    finally:
+        db.close()
+
+
+def setup_module():
+    init_db()
+
+
+def test_import_rejects_hash_that_does_not_match_content():
+    record = {"type": "content", "hash": "deadbeef", "topic_key": None, "content": CONTENT}
+    with pytest.raises(account_transfer.ImportFormatError):
+        _import([record])
+
+
+def test_imported_content_is_not_reused_by_topic():
+    key = template_library.topic_key("Learn Python", "Variables and Types")
+    _import([{"type": "content", "hash": template_library.content_hash(CONTENT), "topic_key": key, "content": CONTENT}])
+
+    db = SessionLocal()
+    try:
+        stored = db.get(ContentTemplate, template_library.content_hash(CONTENT))
+        assert stored is not None and stored.topic_key is None
+        assert template_library.find_topic_contents(db, "learn python", ["Variables and Types"]) == {}
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    setup_module()
+    test_import_rejects_hash_that_does_not_match_content()
+    test_imported_content_is_not_reused_by_topic()
+    print("Imported content cannot be injected into the shared library.")
@@ -0,0 +1,105 @@
+"""
+Batch mutation routes (/plans/batch/complete, /plans/batch/notes): per-item
+results, and plans of other users reported as not found, never changed.
+
+Usage:
+    python -m pytest test_batch.py
+    python test_batch.py
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'batch.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import DayPlan, Note, User, generate_uuid  # noqa: E402
+
+settings.RATE_LIMIT_ENABLED = False
+
+
+@pytest.fixture(scope="module")
+def client():
+    init_db()
+    with TestClient(app) as c:
+        yield c
+
+
+def _account(client, days: int = 3):
+    """A user with one goal; returns (headers, plan ids in day order)"""
+    db = SessionLocal()
+    try:
+        u = User(email=f"batch-{generate_uuid()}@example.com", password_hash="x")
+        db.add(u)
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': u.id})}"}
+    finally:
+        db.close()
+    goal_id = client.post("/goals", json={"title": "Batch", "total_days": days, "use_ai": False}, headers=headers).json()["id"]
+    db = SessionLocal()
+    try:
+        return headers, [i for (i,) in db.query(DayPlan.id).filter(DayPlan.goal_id == goal_id).order_by(DayPlan.day_number)]
+    finally:
+        db.close()
+
+
+def test_batch_complete_reports_each_plan(client):
+    headers, plan_ids = _account(client)
+    _, foreign_ids = _account(client)
+    assert client.post(f"/plans/{plan_ids[0]}/complete", headers=headers).status_code == 200
+
+    response = client.post("/plans/batch/complete", json={"plan_ids": [plan_ids[0], plan_ids[1], foreign_ids[0]]}, headers=headers)
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [(r["plan_id"], r["status"]) for r in results] == [
+        (plan_ids[0], "already_completed"), (plan_ids[1], "completed"), (foreign_ids[0], "not_found")
+    ]
+    assert results[1]["completed_at"] is not None
+
+    db = SessionLocal()
+    try:
+        assert db.get(DayPlan, foreign_ids[0]).completed is False
+    finally:
+        db.close()
+    stats = client.get("/stats", headers=headers).json()
+    assert stats["completed_count"] == 2
+
+
+def test_batch_notes_are_created_per_plan(client):
+    headers, plan_ids = _account(client)
+    _, foreign_ids = _account(client)
+
+    response = client.post("/plans/batch/notes", json={"notes": [
+        {"plan_id": plan_ids[0], "content": "First"},
+        {"plan_id": plan_ids[0], "content": "Second"},
+        {"plan_id": foreign_ids[0], "content": "Not mine"},
+    ]}, headers=headers)
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["created", "created", "not_found"]
+    assert [r["note"]["content"] for r in results[:2]] == ["First", "Second"]
+
+    notes = client.get(f"/plans/{plan_ids[0]}/notes", headers=headers).json()
+    assert sorted(n["content"] for n in notes) == ["First", "Second"]
+    db = SessionLocal()
+    try:
+        assert db.query(Note).filter(Note.day_plan_id == foreign_ids[0]).count() == 0
+    finally:
+        db.close()
+
+
+def test_empty_batch_is_rejected(client):
+    headers, _ = _account(client)
+    assert client.post("/plans/batch/complete", json={"plan_ids": []}, headers=headers).status_code == 422
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,100 @@
+"""
+Chat archival as seen by the session list: a session resumed after
+archival, and one that changed topic, is listed once with all its messages.
+
+Usage:
+    python -m pytest test_chat_archive.py
+    python test_chat_archive.py
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'chat_archive.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import ChatMessage, User, generate_uuid  # noqa: E402
+from app.services import chat_archive  # noqa: E402
+
+settings.RATE_LIMIT_ENABLED = False
+
+
+@pytest.fixture(scope="module")
+def client():
+    init_db()
+    with TestClient(app) as c:
+        yield c
+
+
+def _add_messages(db, user_id: str, session_id: str, topic: str, start: datetime, count: int):
+    for i in range(count):
+        db.add(ChatMessage(user_id=user_id, session_id=session_id, role="user" if i % 2 == 0 else "assistant",
+                           content=f"{topic} {i}", context_topic=topic, created_at=start + timedelta(seconds=i)))
+
+
+def test_resumed_session_with_two_topics_is_listed_once(client):
+    db = SessionLocal()
+    try:
+        user = User(email=f"archive-{generate_uuid()}@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        session_id, other_id = generate_uuid(), generate_uuid()
+        started = datetime.utcnow() - timedelta(days=200)
+        _add_messages(db, user.id, session_id, "scales", started, 4)
+        db.flush()
+        chat_archive.archive_batch(db, [(user.id, session_id)])
+        # Resumed later under two topics, while another session is more recent still
+        now = datetime.utcnow()
+        _add_messages(db, user.id, session_id, "scales", now - timedelta(hours=3), 2)
+        _add_messages(db, user.id, session_id, "chords", now - timedelta(hours=2), 2)
+        _add_messages(db, user.id, other_id, "rhythm", now - timedelta(hours=1), 2)
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': user.id})}"}
+    finally:
+        db.close()
+
+    sessions = client.get("/chat/sessions", headers=headers).json()
+
+    assert [s["session_id"] for s in sessions] == [other_id, session_id]
+    resumed = sessions[1]
+    assert resumed["message_count"] == 8
+    assert resumed["context_topic"] == "chords"
+    assert resumed["started_at"] == started.isoformat()
+    assert "last_message_at" not in resumed
+
+
+def test_session_with_two_topics_takes_one_of_the_twenty_slots(client):
+    db = SessionLocal()
+    try:
+        user = User(email=f"archive-{generate_uuid()}@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        now = datetime.utcnow()
+        session_ids = [generate_uuid() for _ in range(21)]
+        for i, session_id in enumerate(session_ids):
+            _add_messages(db, user.id, session_id, "scales", now - timedelta(hours=i + 1), 2)
+        # The most recent session moved on to a second topic
+        _add_messages(db, user.id, session_ids[0], "chords", now - timedelta(minutes=30), 2)
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': user.id})}"}
+    finally:
+        db.close()
+
+    sessions = client.get("/chat/sessions", headers=headers).json()
+
+    assert [s["session_id"] for s in sessions] == session_ids[:20]
+    assert sessions[0]["context_topic"] == "chords"
+    assert sessions[0]["message_count"] == 4
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
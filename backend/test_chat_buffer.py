@@ -0,0 +1,132 @@
+"""
+Write-behind chat buffer: a full buffer must not block the event loop while
+it flushes, a batch that keeps failing must not be retried forever, and
+buffered messages a reader holds stay readable after they are flushed.
+
+Usage:
+    python -m pytest test_chat_buffer.py
+    python test_chat_buffer.py
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'chat_buffer.db')}"
+
+import pytest  # noqa: E402
+
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.models import ChatMessage, User, generate_uuid  # noqa: E402
+from app.services import chat_buffer, chat_store  # noqa: E402
+from app.services.chat_buffer import ChatWriteBuffer  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def user_id():
+    init_db()
+    db = SessionLocal()
+    try:
+        user = User(email=f"buffer-{generate_uuid()}@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def _turn(user_id: str, session_id: str, text: str):
+    return chat_store.build_chat_turn(user_id, session_id, text, f"Re: {text}", None)
+
+
+def _stored(session_id: str) -> list:
+    db = SessionLocal()
+    try:
+        return [m.content for m in db.query(ChatMessage).filter(ChatMessage.session_id == session_id)]
+    finally:
+        db.close()
+
+
+def test_full_buffer_flushes_off_the_event_loop(user_id, monkeypatch):
+    persist = chat_store.persist_chat_messages
+
+    def slow_persist(db, messages):
+        time.sleep(0.3)
+        persist(db, messages)
+
+    monkeypatch.setattr(chat_store, "persist_chat_messages", slow_persist)
+    buffer = ChatWriteBuffer(flush_interval=60, max_messages=2)
+    session_id = generate_uuid()
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await buffer.add(_turn(user_id, session_id, "hello"))  # Two messages: full
+        task.cancel()
+        await buffer.aclose()
+        return ticks
+
+    ticks = asyncio.run(run())
+    assert ticks >= 10, f"the event loop ran {ticks} times during a 0.3s flush"
+    assert sorted(_stored(session_id)) == ["Re: hello", "hello"]
+
+
+def test_failing_batch_is_salvaged_then_dropped(user_id, monkeypatch):
+    persist = chat_store.persist_chat_messages
+
+    def reject_poison(db, messages):
+        if any(m.content == "poison" for m in messages):
+            raise RuntimeError("constraint violated")
+        persist(db, messages)
+
+    monkeypatch.setattr(chat_store, "persist_chat_messages", reject_poison)
+    buffer = ChatWriteBuffer(max_attempts=3)
+    session_id = generate_uuid()
+    buffer._pending.extend(_turn(user_id, session_id, "good") + _turn(user_id, session_id, "poison"))
+
+    for _ in range(buffer.max_attempts - 1):
+        with pytest.raises(RuntimeError):
+            buffer.flush()
+    assert len(buffer.buffered(user_id, session_id)) == 4, "kept for retry until out of attempts"
+
+    assert buffer.flush() == 3
+    assert buffer.buffered(user_id, session_id) == []
+    assert buffer.dropped_messages == 1
+    assert buffer._attempts == {}
+    assert sorted(_stored(session_id)) == ["Re: good", "Re: poison", "good"]
+
+
+def test_snapshot_stays_readable_after_flush(user_id):
+    buffer = ChatWriteBuffer()
+    session_id = generate_uuid()
+    buffer._pending.extend(_turn(user_id, session_id, "snapshot"))
+
+    snapshot = buffer.buffered(user_id, session_id)
+    assert buffer.flush() == 2
+    # A request handler reads the snapshot after a background flush committed it
+    assert [(m.role, m.content) for m in snapshot] == [("user", "snapshot"), ("assistant", "Re: snapshot")]
+    assert all(m.id and m.user_id == user_id and m.created_at for m in snapshot)
+    assert [m.content for m in chat_buffer.merge([], snapshot)] == ["snapshot", "Re: snapshot"]
+
+
+def test_save_chat_messages_without_buffer_persists_in_session(user_id, monkeypatch):
+    monkeypatch.setattr(chat_buffer, "get_chat_buffer", lambda: None)
+    session_id = generate_uuid()
+    db = SessionLocal()
+    try:
+        asyncio.run(chat_buffer.save_chat_messages(db, _turn(user_id, session_id, "direct")))
+        db.commit()
+    finally:
+        db.close()
+    assert sorted(_stored(session_id)) == ["Re: direct", "direct"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,117 @@
+"""
+WebSocket chat channel (/chat/ws): authentication, the streamed turn
+(start, deltas, done) with its persisted history, and a failing request
+that must answer an error frame instead of going silent.
+
+The AI generator is replaced by one that streams a fixed reply.
+
+Usage:
+    python -m pytest test_chat_socket.py
+    python test_chat_socket.py
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'chat_socket.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from starlette.websockets import WebSocketDisconnect  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import User, generate_uuid  # noqa: E402
+from app.services import chat_store  # noqa: E402
+from app.services.ai_generator import AIPlanGenerator, get_ai_generator  # noqa: E402
+
+settings.RATE_LIMIT_ENABLED = False
+
+CHUNKS = ["Practise ", "a little ", "every day."]
+
+
+class StreamingGenerator(AIPlanGenerator):
+    async def stream_gemini_api(self, prompt: str):
+        for text in CHUNKS:
+            yield text
+
+
+@pytest.fixture(scope="module")
+def client():
+    init_db()
+    app.dependency_overrides[get_ai_generator] = StreamingGenerator
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.pop(get_ai_generator, None)
+
+
+@pytest.fixture
+def token():
+    db = SessionLocal()
+    try:
+        u = User(email=f"socket-{generate_uuid()}@example.com", password_hash="x")
+        db.add(u)
+        db.commit()
+        return create_access_token({"sub": u.id})
+    finally:
+        db.close()
+
+
+def _receive_until(ws, *types):
+    """Frames up to and including the first one of the given types (pings skipped)"""
+    frames = []
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] == "ping":
+            continue
+        frames.append(frame)
+        if frame["type"] in types:
+            return frames
+
+
+def test_connection_without_token_is_refused(client):
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/chat/ws") as ws:
+            ws.receive_json()
+
+
+def test_chat_turn_streams_and_is_saved(client, token):
+    session_id = generate_uuid()
+    with client.websocket_connect(f"/chat/ws?token={token}") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        ws.send_json({"type": "chat", "request_id": "r1", "session_id": session_id,
+                      "message": "How often should I practise?", "use_cache": False})
+        frames = _receive_until(ws, "done", "error")
+
+    assert [f["type"] for f in frames] == ["start"] + ["delta"] * len(CHUNKS) + ["done"]
+    assert all(f["request_id"] == "r1" for f in frames)
+    assert frames[-1]["reply"] == "".join(CHUNKS) and frames[-1]["cached"] is False
+
+    history = client.get(f"/chat/history/{session_id}", headers={"Authorization": f"Bearer {token}"}).json()
+    assert [(m["role"], m["content"]) for m in history["messages"]] == [
+        ("user", "How often should I practise?"), ("assistant", "".join(CHUNKS))
+    ]
+
+
+def test_failed_request_answers_an_error_frame(client, token, monkeypatch):
+    def broken_persist(db, messages):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(chat_store, "persist_chat_messages", broken_persist)
+    with client.websocket_connect(f"/chat/ws?token={token}") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        ws.send_json({"type": "chat", "request_id": "r2", "message": "Hello", "use_cache": False})
+        frames = _receive_until(ws, "done", "error")
+        assert frames[-1] == {"type": "error", "request_id": "r2", "detail": "Chat request failed"}
+
+        # The connection keeps serving
+        ws.send_json({"type": "ping", "ts": 1})
+        assert _receive_until(ws, "pong")[-1] == {"type": "pong", "ts": 1}
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,91 @@
+"""
+Response content negotiation: brotli/gzip per Accept-Encoding above the size
+threshold, and MessagePack for `Accept: application/msgpack` on listed routes.
+
+Usage:
+    python -m pytest test_compression.py
+    python test_compression.py
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'compression.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GEMINI_API_KEY"] = ""
+
+import msgpack  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import User, generate_uuid  # noqa: E402
+
+settings.RATE_LIMIT_ENABLED = False
+
+
+@pytest.fixture(scope="module")
+def client():
+    init_db()
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    """A user with enough goals that GET /goals is above COMPRESSION_MIN_SIZE"""
+    db = SessionLocal()
+    try:
+        u = User(email=f"encoding-{generate_uuid()}@example.com", password_hash="x")
+        db.add(u)
+        db.commit()
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': u.id})}"}
+    finally:
+        db.close()
+    for i in range(8):
+        client.post("/goals", json={"title": f"Goal {i}", "description": "Encoding " * 10, "total_days": 3, "use_ai": False}, headers=headers)
+    return headers
+
+
+@pytest.mark.parametrize("accept_encoding,expected", [
+    ("gzip", "gzip"),
+    ("br", "br"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+])
+def test_large_json_is_compressed_per_accept_encoding(client, headers, accept_encoding, expected):
+    plain = client.get("/goals", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert len(plain.content) >= settings.COMPRESSION_MIN_SIZE
+
+    response = client.get("/goals", headers={**headers, "Accept-Encoding": accept_encoding})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == expected
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json() == plain.json()
+
+
+def test_small_body_is_sent_as_is(client):
+    response = client.get("/health", headers={"Accept-Encoding": "gzip, br"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+
+def test_msgpack_on_listed_route(client, headers):
+    plain = client.get("/goals", headers=headers).json()
+    response = client.get("/goals", headers={**headers, "Accept": "application/msgpack", "Accept-Encoding": "identity"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert "Accept" in response.headers["vary"]
+    assert msgpack.unpackb(response.content, raw=False) == plain
+
+
+def test_msgpack_not_offered_on_other_routes(client, headers):
+    response = client.get("/stats", headers={**headers, "Accept": "application/msgpack"})
+    assert response.headers["content-type"].startswith("application/json")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
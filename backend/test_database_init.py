@@ -0,0 +1,79 @@
+"""
+Schema setup command used by the Dockerfile and scripts/dev.*.
+
+Runs `python -m app.database` against a fresh SQLite file and checks that
+every model's table was created, and against a database from before
+day_plans.content_hash to check that the column is added.
+
+Usage:
+    python -m pytest test_database_init.py
+    python test_database_init.py
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# day_plans as created before the plan-template library
+OLD_DAY_PLANS = """
+CREATE TABLE day_plans (
+    id VARCHAR(36) NOT NULL PRIMARY KEY,
+    goal_id VARCHAR(36) NOT NULL,
+    day_number INTEGER NOT NULL,
+    date DATE NOT NULL,
+    topic VARCHAR,
+    content JSON,
+    completed BOOLEAN NOT NULL,
+    completed_at DATETIME,
+    created_at DATETIME NOT NULL
+)
+"""
+
+
+def _run_init(db_path: str) -> dict:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", CREATE_TABLES_ON_STARTUP="false")
+    subprocess.run([sys.executable, "-m", "app.database"], cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+    return env
+
+
+def test_init_db_command_creates_tables():
+    db_path = os.path.join(tempfile.mkdtemp(), "init.db")
+    env = _run_init(db_path)
+
+    expected = subprocess.run(
+        [sys.executable, "-c", "import app.models, app.database as d; print(' '.join(sorted(d.Base.metadata.tables)))"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout.split()
+    with sqlite3.connect(db_path) as conn:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert expected, "no models registered"
+    missing = set(expected) - tables
+    assert not missing, f"python -m app.database did not create: {sorted(missing)}"
+
+
+def test_init_db_command_adds_content_hash_to_existing_day_plans():
+    db_path = os.path.join(tempfile.mkdtemp(), "old.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(OLD_DAY_PLANS)
+        conn.execute("INSERT INTO day_plans VALUES ('p1', 'g1', 1, '2024-01-01', 'Intro', '{\"overview\": \"x\"}', 0, NULL, '2024-01-01 00:00:00')")
+
+    _run_init(db_path)
+    _run_init(db_path)  # Idempotent
+
+    with sqlite3.connect(db_path) as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(day_plans)")}
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(day_plans)")}
+        row = conn.execute("SELECT topic, content, content_hash FROM day_plans WHERE id = 'p1'").fetchone()
+    assert "content_hash" in columns
+    assert "ix_day_plans_content_hash" in indexes
+    assert row == ("Intro", '{"overview": "x"}', None), "existing rows are kept"
+
+
+if __name__ == "__main__":
+    test_init_db_command_creates_tables()
+    test_init_db_command_adds_content_hash_to_existing_day_plans()
+    print("Schema setup command creates every table and adds new columns.")
@@ -0,0 +1,139 @@
+"""
+AI quota running out while a goal is generated.
+
+The generator is replaced by one whose quota is used up after a few calls.
+Creating or re-planning a goal must answer 429 with Retry-After and leave
+the user's goals as they were, instead of saving fallback content; the day
+content generated before the quota ran out stays in the shared library.
+Chat answers the same 429 as the goal routes.
+
+Usage:
+    python -m pytest test_goal_quota.py
+    python test_goal_quota.py
+"""
+import json
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'goal_quota.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import ContentTemplate, DayPlan, Goal, User, generate_uuid  # noqa: E402
+from app.services.ai_generator import AIPlanGenerator, get_ai_generator  # noqa: E402
+from app.services.quotas import QuotaExceeded  # noqa: E402
+
+DAYS = 4
+
+
+class MeteredGenerator(AIPlanGenerator):
+    """Answers outlines and day content until `allowed` calls were made, then is over quota"""
+
+    def __init__(self, allowed: int):
+        super().__init__()
+        self.allowed = allowed
+        self.calls = 0
+        self.label = generate_uuid()[:8]  # New topics for every generator
+
+    @property
+    def client(self):
+        return object()
+
+    async def _call_gemini_api(self, prompt: str) -> str:
+        if self.calls >= self.allowed:
+            raise QuotaExceeded("Daily AI quota exceeded", 3600)
+        self.calls += 1
+        if "JSON array" in prompt:
+            return json.dumps([f"Topic {self.label}.{i}" for i in range(DAYS)])
+        return json.dumps({"overview": f"Overview {self.calls}", "tasks": [], "details": "Do it.", "tips": ""})
+
+
+@pytest.fixture(scope="module")
+def client():
+    init_db()
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.pop(get_ai_generator, None)
+
+
+@pytest.fixture
+def user():
+    db = SessionLocal()
+    try:
+        u = User(email=f"quota-{generate_uuid()}@example.com", password_hash="x")
+        db.add(u)
+        db.commit()
+        return u.id, {"Authorization": f"Bearer {create_access_token({'sub': u.id})}"}
+    finally:
+        db.close()
+
+
+def _use(generator: AIPlanGenerator):
+    app.dependency_overrides[get_ai_generator] = lambda: generator
+
+
+def _goal_rows(user_id: str):
+    db = SessionLocal()
+    try:
+        goals = db.query(Goal).filter(Goal.user_id == user_id).all()
+        plans = db.query(DayPlan.topic, DayPlan.content_hash).join(DayPlan.goal).filter(
+            Goal.user_id == user_id
+        ).order_by(DayPlan.day_number).all()
+        return len(goals), [tuple(p) for p in plans]
+    finally:
+        db.close()
+
+
+def _library_size() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(ContentTemplate).count()
+    finally:
+        db.close()
+
+
+def test_create_goal_over_quota_is_429_and_saves_nothing(client, user):
+    user_id, headers = user
+    library = _library_size()
+    _use(MeteredGenerator(allowed=3))  # The outline and two of the four days
+    response = client.post("/goals", json={"title": f"Quota goal {user_id}", "total_days": DAYS, "use_ai": True}, headers=headers)
+
+    assert response.status_code == 429, response.text
+    assert response.headers["Retry-After"] == "3600"
+    assert _goal_rows(user_id) == (0, [])
+    assert _library_size() == library + 2, "content generated before the quota ran out is kept"
+
+
+def test_replan_over_quota_is_429_and_keeps_the_plan(client, user):
+    user_id, headers = user
+    _use(MeteredGenerator(allowed=1 + DAYS))
+    response = client.post("/goals", json={"title": f"Replan goal {user_id}", "total_days": DAYS, "use_ai": True}, headers=headers)
+    assert response.status_code == 201, response.text
+    before = _goal_rows(user_id)
+
+    _use(MeteredGenerator(allowed=2))  # New outline, then one day of content
+    response = client.post(f"/goals/{response.json()['id']}/replan", json={}, headers=headers)
+
+    assert response.status_code == 429, response.text
+    assert _goal_rows(user_id) == before
+
+
+def test_chat_over_quota_is_429_like_other_routes(client, user):
+    _, headers = user
+    _use(MeteredGenerator(allowed=0))
+    response = client.post("/chat", json={"message": "How do I start?", "use_cache": False}, headers=headers)
+
+    assert response.status_code == 429, response.text
+    assert response.json() == {"detail": "Daily AI quota exceeded"}
+    assert response.headers["Retry-After"] == "3600"
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
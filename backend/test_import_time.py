@@ -0,0 +1,70 @@
+"""
+Cold-start budget for the API process.
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter and
+fails if importing the app exceeds the budget, pulls in a dependency that is
+only needed later (Gemini SDK, numpy, brotli, msgpack, redis), or touches the
+database.
+
+Absolute import times vary several-fold between machines, so the budget is
+relative: the app may take at most IMPORT_TIME_BUDGET_RATIO times as long as a
+bare `import fastapi` measured the same way (fastapi and pydantic are most of
+any FastAPI app's import time; the rest is SQLAlchemy, auth and our modules).
+
+Usage:
+    python -m pytest test_import_time.py
+    python test_import_time.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+IMPORT_TIME_BUDGET_RATIO = float(os.environ.get("IMPORT_TIME_BUDGET_RATIO", "3.0"))
+RUNS = 3
+# Imported on first use; importing the app must not load them
+LAZY_MODULES = ("google.genai", "numpy", "brotli", "msgpack", "redis")
+
+
+def _import(module: str, db_path: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", CREATE_TABLES_ON_STARTUP="false")
+    code = f"import sys, {module}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def _cumulative_ms(importtime_output: str, module: str) -> float:
+    """Cumulative import time of a top-level module from -X importtime output"""
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.strip() == module and not name.startswith("  "):
+            return int(cumulative) / 1000
+    raise AssertionError(f"{module} not found in importtime output")
+
+
+def test_import_time_within_budget():
+    db_path = os.path.join(tempfile.mkdtemp(), "import_budget.db")
+    app_timings, baseline_timings = [], []
+    for _ in range(RUNS):
+        # Interleaved, so both see the same machine load
+        baseline_timings.append(_cumulative_ms(_import("fastapi", db_path).stderr, "fastapi"))
+        result = _import("app.main", db_path)
+        assert result.stdout.strip() == "", f"imported eagerly: {result.stdout.strip()}"
+        app_timings.append(_cumulative_ms(result.stderr, "app.main"))
+
+    assert not os.path.exists(db_path), "importing app.main must not touch the database"
+    best, baseline = min(app_timings), min(baseline_timings)
+    assert best <= baseline * IMPORT_TIME_BUDGET_RATIO, (
+        f"import app.main took {best:.0f} ms, {best / baseline:.1f}x a bare import fastapi "
+        f"({baseline:.0f} ms; budget {IMPORT_TIME_BUDGET_RATIO}x)"
+    )
+
+
+if __name__ == "__main__":
+    test_import_time_within_budget()
+    print("Import time within budget.")
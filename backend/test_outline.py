@@ -0,0 +1,77 @@
+"""
+Hierarchical outlines for long goals: the phase plan is bounded whatever
+day counts the model returns, and expansion yields exactly total_days topics.
+The Gemini call is stubbed; no API key is needed.
+
+Usage:
+    python -m pytest test_outline.py
+    python test_outline.py
+"""
+import asyncio
+import json
+import re
+
+import pytest
+
+from app.config import settings
+from app.services.ai_generator import AIPlanGenerator
+
+EXPANSION = re.compile(r"JSON array of (\d+) strings, the topics for days (\d+) to (\d+)")
+
+
+class StubGenerator(AIPlanGenerator):
+    """Answers the phase plan prompt with `phase_days`, and expansion prompts day by day"""
+
+    def __init__(self, phase_days, short_by: int = 0):
+        super().__init__()
+        self.phase_days = phase_days
+        self.short_by = short_by
+        self.requested = []
+
+    async def _call_gemini_api(self, prompt: str) -> str:
+        if "sequential phases" in prompt:
+            return json.dumps([{"title": f"P{i + 1}", "focus": "f", "days": d} for i, d in enumerate(self.phase_days)])
+        count, first, last = map(int, EXPANSION.search(prompt).groups())
+        self.requested.append(count)
+        topics = [f"Day {day}" for day in range(first, last + 1)]
+        if self.short_by and len(self.requested) == 1:
+            topics = topics[:-self.short_by]
+        return json.dumps(topics)
+
+
+def _outline(generator, total_days):
+    return asyncio.run(generator.generate_hierarchical_outline("Run a marathon", "", total_days))
+
+
+def test_valid_phase_plan_is_used_as_is():
+    generator = StubGenerator([10, 12, 14, 12, 12])
+    topics = _outline(generator, 60)
+    assert generator.requested == [10, 12, 14, 12, 12]
+    assert topics == [f"Day {d}" for d in range(1, 61)]
+
+
+def test_oversized_phases_are_split():
+    generator = StubGenerator([60, 60, 60])
+    topics = _outline(generator, 180)
+    assert max(generator.requested) <= 2 * settings.OUTLINE_PHASE_DAYS
+    assert sum(generator.requested) == 180
+    assert topics == [f"Day {d}" for d in range(1, 181)]
+
+
+@pytest.mark.parametrize("phase_days", [[30, 30], [0, 45, 45], []])
+def test_invalid_day_counts_are_split_evenly_and_bounded(phase_days):
+    generator = StubGenerator(phase_days)
+    topics = _outline(generator, 90)
+    assert len(topics) == 90
+    assert max(generator.requested) <= 2 * settings.OUTLINE_PHASE_DAYS
+
+
+def test_short_expansion_is_asked_for_the_missing_days():
+    generator = StubGenerator([14, 14, 14, 14], short_by=3)
+    topics = _outline(generator, 56)
+    assert sorted(generator.requested)[:1] == [3]
+    assert len(topics) == 56 and len(set(topics)) == 56
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
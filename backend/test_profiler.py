@@ -0,0 +1,54 @@
+"""
+Request profiler SQL capture: background tasks started during a profiled
+request stay out of its profile, and a failed statement leaves no stale
+start time on the connection.
+
+Usage:
+    python -m pytest test_profiler.py
+    python test_profiler.py
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.services import profiler
+
+
+def test_background_task_sql_stays_out_of_the_request_profile():
+    engine = create_engine("sqlite://")
+
+    async def query():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    async def request():
+        profile = profiler.start_sql_capture("GET", "/test")
+        background = asyncio.get_running_loop().create_task(query(), context=profiler.background_context())
+        await query()
+        await background
+        profiler.finish_profile(profile, None, 200, 1.0)
+        return profile
+
+    profile = asyncio.run(request())
+    assert profile.sql_count == 1
+
+
+def test_failed_statement_does_not_leave_a_start_time():
+    engine = create_engine("sqlite://")
+
+    async def request():
+        profile = profiler.start_sql_capture("GET", "/test")
+        with engine.connect() as conn:
+            with pytest.raises(Exception):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            assert not conn.info.get("profile_query_start")
+            conn.execute(text("SELECT 1"))
+        profiler.finish_profile(profile, None, 200, 1.0)
+        return profile
+
+    assert asyncio.run(request()).sql_count == 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,110 @@
+"""
+Cohort programs: a coach creates a program once and invites members, who
+get their own goal from it when they accept.
+
+Usage:
+    python -m pytest test_programs.py
+    python test_programs.py
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'programs.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import DayPlan, Goal, User, generate_uuid  # noqa: E402
+
+settings.RATE_LIMIT_ENABLED = False
+
+
+@pytest.fixture(scope="module")
+def client():
+    init_db()
+    with TestClient(app) as c:
+        yield c
+
+
+def _user(prefix: str):
+    db = SessionLocal()
+    try:
+        u = User(email=f"{prefix}-{generate_uuid()}@example.com", password_hash="x")
+        db.add(u)
+        db.commit()
+        return u, {"Authorization": f"Bearer {create_access_token({'sub': u.id})}"}
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def coach(monkeypatch):
+    user, headers = _user("coach")
+    monkeypatch.setattr(settings, "COACH_EMAILS", [user.email])
+    return headers
+
+
+@pytest.fixture
+def program_id(client, coach):
+    response = client.post("/programs", json={"title": "Couch to 5K", "total_days": 5, "use_ai": False}, headers=coach)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def test_invited_member_gets_the_program_on_accept(client, coach, program_id):
+    member, member_headers = _user("member")
+    response = client.post(f"/programs/{program_id}/invite", json={
+        "members": [{"email": member.email}, {"email": f"nobody-{generate_uuid()}@example.com"}, {}],
+        "start_date": "2026-11-02",
+    }, headers=coach)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["invited"] == 2
+    assert [r["status"] for r in body["results"]] == ["invited", "invited", "invalid"]
+
+    # Nothing is created for the member before they accept
+    assert client.get(f"/programs/{program_id}/progress", headers=coach).json()["members"] == []
+    invitations = client.get("/programs/invitations", headers=member_headers).json()
+    assert [i["program_id"] for i in invitations] == [program_id]
+
+    response = client.post(f"/programs/invitations/{invitations[0]['id']}/accept", headers=member_headers)
+    assert response.status_code == 200, response.text
+    goal_id = response.json()["goal_id"]
+
+    db = SessionLocal()
+    try:
+        goal = db.get(Goal, goal_id)
+        assert goal.user_id == member.id and goal.start_date.isoformat() == "2026-11-02"
+        assert db.query(DayPlan).filter(DayPlan.goal_id == goal_id).count() == 5
+    finally:
+        db.close()
+    members = client.get(f"/programs/{program_id}/progress", headers=coach).json()["members"]
+    assert [(m["user_id"], m["total_days"]) for m in members] == [(member.id, 5)]
+
+    # Inviting again reports the member as enrolled
+    again = client.post(f"/programs/{program_id}/invite", json={"members": [{"user_id": member.id}]}, headers=coach)
+    assert again.json()["results"][0]["status"] == "already_enrolled"
+
+
+def test_invalid_start_date_is_400(client, coach, program_id):
+    response = client.post(f"/programs/{program_id}/invite", json={
+        "members": [{"email": "someone@example.com"}], "start_date": "soon"
+    }, headers=coach)
+    assert response.status_code == 400, response.text
+
+
+def test_members_cannot_create_programs(client):
+    _, headers = _user("member")
+    response = client.post("/programs", json={"title": "Mine", "total_days": 3, "use_ai": False}, headers=headers)
+    assert response.status_code == 403
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,207 @@
+"""
+SQL statement budgets for the API routes.
+
+Every route in BUDGETS is called against a small and a large account (more
+goals, day plans, notes, chat messages) on a temporary SQLite database while
+the statements sent to the engine are counted. A route fails when it goes
+over its budget, or when its count grows with the data, which is what an
+N+1 (a lazy load per row) looks like. Counts include the auth lookup.
+
+Use the `query_budget` fixture to hold any other block of code to a budget:
+
+    def test_something(query_budget):
+        with query_budget(2):
+            ...
+
+Usage:
+    python -m pytest test_query_budget.py
+    python test_query_budget.py          # prints the count per route
+"""
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'query_budget.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["USAGE_FLUSH_SECONDS"] = "3600"  # Keep background flushes out of the counts
+os.environ["PROFILE_SLOW_MS"] = "100000"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, engine, read_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import ChatMessage, DayPlan, Goal, Note, User, generate_uuid  # noqa: E402
+from app.services.chat_socket import ChatConnection  # noqa: E402
+from app.services.stats import rebuild_user_stats  # noqa: E402
+
+# Another test module collected first may have loaded the settings already
+# (the environment above is then ignored); rate limiting in particular adds
+# statements to LLM routes
+settings.RATE_LIMIT_ENABLED = False
+settings.USAGE_FLUSH_SECONDS = 3600
+settings.PROFILE_SLOW_MS = 100000
+settings.GEMINI_API_KEY = ""
+
+# Statements allowed per request, keyed "METHOD path"; {plan}, {goal}, {day}
+# and {session} are filled in from the seeded account
+BUDGETS = {
+    "GET /goals": 2,
+    "GET /plans/date/{day}": 2,
+    "GET /plans/date/{day}/dynamic": 2,
+    "GET /plans/{plan}/notes": 2,
+    "POST /plans/{plan}/topic-chat": 5,
+    "GET /sync": 5,
+    "GET /stats": 3,
+    "GET /stats/goals/{goal}": 2,
+    "GET /chat/history/{session}": 3,
+    "GET /chat/sessions": 3,
+}
+
+SMALL = {"goals": 2, "days": 3, "notes": 2, "messages": 4}
+LARGE = {"goals": 12, "days": 20, "notes": 15, "messages": 40}
+
+
+class StatementCounter:
+    """Counts statements executed on the app's engines while active"""
+
+    def __init__(self, engines):
+        self.engines = list({id(e): e for e in engines}.values())
+        self.statements = []
+        self._lock = threading.Lock()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __enter__(self):
+        for e in self.engines:
+            event.listen(e, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        for e in self.engines:
+            event.remove(e, "before_cursor_execute", self._record)
+
+
+@contextmanager
+def count_queries():
+    with StatementCounter([engine, read_engine]) as counter:
+        yield counter
+
+
+@contextmanager
+def _budget(max_statements: int):
+    with count_queries() as counter:
+        yield counter
+    assert counter.count <= max_statements, (
+        f"{counter.count} statements, budget {max_statements}:\n" + "\n".join(counter.statements)
+    )
+
+
+@pytest.fixture
+def query_budget():
+    """`with query_budget(n):` fails the test when the block runs more than n statements"""
+    return _budget
+
+
+def seed_account(sizes: dict) -> dict:
+    """A user with goals, day plans, notes and a chat session; returns the route parameters"""
+    db = SessionLocal()
+    try:
+        user = User(email=f"budget-{generate_uuid()}@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        today = date.today()
+        plans = []
+        for g in range(sizes["goals"]):
+            goal = Goal(user_id=user.id, title=f"Goal {g}", total_days=sizes["days"], start_date=today)
+            db.add(goal)
+            db.flush()
+            for d in range(sizes["days"]):
+                plan = DayPlan(goal_id=goal.id, day_number=d + 1, date=today + timedelta(days=d),
+                               topic=f"Topic {d}", content={"overview": f"Day {d + 1}"}, completed=d % 2 == 0)
+                db.add(plan)
+                plans.append(plan)
+        db.flush()
+        for n in range(sizes["notes"]):
+            db.add(Note(day_plan_id=plans[0].id, content=f"Note {n}"))
+        session_id = generate_uuid()
+        started = datetime.utcnow() - timedelta(hours=1)
+        for m in range(sizes["messages"]):
+            db.add(ChatMessage(user_id=user.id, session_id=session_id, role="user" if m % 2 == 0 else "assistant",
+                               content=f"Message {m}", created_at=started + timedelta(seconds=m)))
+        rebuild_user_stats(db, user.id)
+        db.commit()
+        return {
+            "user_id": user.id,
+            "token": create_access_token({"sub": user.id}),
+            "plan": plans[0].id,
+            "goal": plans[0].goal_id,
+            "day": today.isoformat(),
+            "session": session_id,
+        }
+    finally:
+        db.close()
+
+
+def route_statements(client: TestClient, route: str, account: dict) -> int:
+    """Statements executed by one request to `route` for the seeded account"""
+    method, path = route.split(" ", 1)
+    url = path.format(**account)
+    headers = {"Authorization": f"Bearer {account['token']}"}
+    body = {"message": "How long should I practise?"} if method == "POST" else None
+    with count_queries() as counter:
+        response = client.request(method, url, headers=headers, json=body)
+    assert response.status_code == 200, f"{route}: {response.status_code} {response.text}"
+    return counter.count
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="module")
+def accounts(client):
+    return seed_account(SMALL), seed_account(LARGE)
+
+
+@pytest.mark.parametrize("route", list(BUDGETS))
+def test_route_within_query_budget(client, accounts, route):
+    small, large = (route_statements(client, route, account) for account in accounts)
+    assert large <= BUDGETS[route], f"{route} ran {large} statements (budget {BUDGETS[route]})"
+    assert large == small, f"{route} ran {small} statements for a small account and {large} for a large one (N+1)"
+
+
+def test_websocket_plan_context_within_query_budget(accounts, query_budget):
+    # A new session on a day plan: recent messages, the archive and the plan with its goal
+    for account in accounts:
+        connection = ChatConnection(None, account["user_id"], None, None)
+        with query_budget(3):
+            state = connection._load_session(generate_uuid(), None, account["plan"])
+        assert state.context_topic == "Topic 0"
+        assert "Goal 0" in state.plan_context
+
+
+if __name__ == "__main__":
+    with TestClient(app) as c:
+        small_account, large_account = seed_account(SMALL), seed_account(LARGE)
+        print(f"{'route':36} {'small':>5} {'large':>5} {'budget':>6}")
+        for name, budget in BUDGETS.items():
+            small_count = route_statements(c, name, small_account)
+            large_count = route_statements(c, name, large_account)
+            flag = "" if large_count <= budget and small_count == large_count else "  <-- over budget"
+            print(f"{name:36} {small_count:5d} {large_count:5d} {budget:6d}{flag}")
@@ -0,0 +1,142 @@
+"""
+Goal re-planning: input validation, the 365-day cap, goals created without
+AI, and content that must not outlive a changed topic.
+
+The AI generator is replaced by a scripted one, so no API key is needed.
+
+Usage:
+    python -m pytest test_replan.py
+    python test_replan.py
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'replan.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import DayPlan, User, generate_uuid  # noqa: E402
+from app.services.ai_generator import AIPlanGenerator, get_ai_generator  # noqa: E402
+
+settings.RATE_LIMIT_ENABLED = False
+
+
+class ScriptedGenerator(AIPlanGenerator):
+    """Outlines with the given topics; day content fails, like an unavailable model"""
+
+    def __init__(self, topics):
+        super().__init__()
+        self.topics = topics
+        self.calls = 0
+
+    async def generate_replan_outline(self, *args, **kwargs):
+        self.calls += 1
+        return list(self.topics)
+
+    async def generate_daily_content(self, *args, **kwargs):
+        self.calls += 1
+        raise RuntimeError("model unavailable")
+
+
+@pytest.fixture(scope="module")
+def client():
+    init_db()
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.pop(get_ai_generator, None)
+
+
+@pytest.fixture
+def headers():
+    db = SessionLocal()
+    try:
+        u = User(email=f"replan-{generate_uuid()}@example.com", password_hash="x")
+        db.add(u)
+        db.commit()
+        return {"Authorization": f"Bearer {create_access_token({'sub': u.id})}"}
+    finally:
+        db.close()
+
+
+def _use(generator: AIPlanGenerator) -> AIPlanGenerator:
+    app.dependency_overrides[get_ai_generator] = lambda: generator
+    return generator
+
+
+def _create(client, headers, days: int) -> str:
+    response = client.post("/goals", json={"title": f"Goal {generate_uuid()}", "total_days": days, "use_ai": False}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def _plans(goal_id: str):
+    """(id, topic, content) of the goal's days in order"""
+    db = SessionLocal()
+    try:
+        plans = db.query(DayPlan).filter(DayPlan.goal_id == goal_id).order_by(DayPlan.day_number).all()
+        return [(p.id, p.topic, p.content) for p in plans]
+    finally:
+        db.close()
+
+
+def test_invalid_start_date_is_400(client, headers):
+    goal_id = _create(client, headers, 3)
+    response = client.post(f"/goals/{goal_id}/replan", json={"start_date": "next tuesday"}, headers=headers)
+    assert response.status_code == 400, response.text
+
+
+def test_replan_keeps_the_365_day_cap(client, headers):
+    goal_id = _create(client, headers, 3)
+    plan_id = _plans(goal_id)[0][0]
+    assert client.post(f"/plans/{plan_id}/complete", headers=headers).status_code == 200
+
+    response = client.post(f"/goals/{goal_id}/replan", json={"remaining_days": 365}, headers=headers)
+    assert response.status_code == 400, response.text
+    assert len(_plans(goal_id)) == 3
+
+
+def test_goal_without_ai_is_not_generated_for(client, headers):
+    generator = _use(ScriptedGenerator(["New topic"]))
+    goal_id = _create(client, headers, 3)
+    topics = [topic for _, topic, _ in _plans(goal_id)]
+
+    response = client.post(f"/goals/{goal_id}/replan", json={"remaining_days": 4}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["regenerated_days"] == 0
+    assert generator.calls == 0
+    plans = _plans(goal_id)
+    assert [topic for _, topic, _ in plans[:3]] == topics and len(plans) == 4
+    assert all(content is None for _, _, content in plans)
+
+
+def test_changed_topic_drops_content_of_the_old_topic(client, headers):
+    goal_id = _create(client, headers, 2)
+    db = SessionLocal()
+    try:
+        plans = db.query(DayPlan).filter(DayPlan.goal_id == goal_id).order_by(DayPlan.day_number).all()
+        for p in plans:
+            p.content = {"overview": f"About {p.topic}", "tasks": [], "details": "", "tips": ""}
+        old_topic = plans[0].topic
+        db.commit()
+    finally:
+        db.close()
+
+    _use(ScriptedGenerator(["Something else entirely", old_topic]))
+    response = client.post(f"/goals/{goal_id}/replan", json={}, headers=headers)
+    assert response.status_code == 200, response.text
+
+    (_, first_topic, first_content), (_, second_topic, second_content) = _plans(goal_id)
+    assert first_topic == "Something else entirely" and first_content is None
+    assert second_topic == old_topic and second_content["overview"] == f"About {old_topic}"
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
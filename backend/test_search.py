@@ -0,0 +1,110 @@
+"""
+Full-text search (/search): notes and chat history are found by their
+words, results are scoped to the user, and kind filters and pagination apply.
+
+Usage:
+    python -m pytest test_search.py
+    python test_search.py
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import DayPlan, User, generate_uuid  # noqa: E402
+from app.services.chat_store import build_chat_turn, persist_chat_messages  # noqa: E402
+
+settings.RATE_LIMIT_ENABLED = False
+
+
+@pytest.fixture(scope="module")
+def client():
+    init_db()
+    with TestClient(app) as c:
+        yield c
+
+
+def _account(client):
+    """A user with one three-day goal; returns (user_id, headers, plan ids)"""
+    db = SessionLocal()
+    try:
+        u = User(email=f"search-{generate_uuid()}@example.com", password_hash="x")
+        db.add(u)
+        db.commit()
+        user_id = u.id
+    finally:
+        db.close()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+    goal_id = client.post("/goals", json={"title": "Search", "total_days": 3, "use_ai": False}, headers=headers).json()["id"]
+    db = SessionLocal()
+    try:
+        plan_ids = [i for (i,) in db.query(DayPlan.id).filter(DayPlan.goal_id == goal_id).order_by(DayPlan.day_number)]
+    finally:
+        db.close()
+    return user_id, headers, plan_ids
+
+
+def _add_notes(client, headers, plan_id, contents):
+    response = client.post("/plans/batch/notes", json={"notes": [
+        {"plan_id": plan_id, "content": c} for c in contents
+    ]}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [r["note"]["id"] for r in response.json()["results"]]
+
+
+def test_notes_and_chat_are_found_for_their_owner_only(client):
+    user_id, headers, plan_ids = _account(client)
+    _, other_headers, other_plans = _account(client)
+    (note_id,) = _add_notes(client, headers, plan_ids[0], ["Practised the arpeggio drill twice"])
+    _add_notes(client, other_headers, other_plans[0], ["My arpeggio drill notes"])
+    db = SessionLocal()
+    try:
+        messages = build_chat_turn(user_id, "session-1", "How do I speed up an arpeggio?", "Slowly, with a metronome.", None)
+        persist_chat_messages(db, messages)
+        db.commit()
+        question_id = messages[0].id
+    finally:
+        db.close()
+
+    body = client.get("/search", params={"q": "arpeggio"}, headers=headers).json()
+    assert body["query"] == "arpeggio" and body["has_more"] is False
+    hits = {(r["kind"], r["ref_id"]) for r in body["results"]}
+    assert hits == {("note", note_id), ("chat", question_id)}
+    note = next(r for r in body["results"] if r["kind"] == "note")
+    assert note["parent_id"] == plan_ids[0]
+    assert "arpeggio" in note["snippet"].lower()
+
+    only_chat = client.get("/search", params={"q": "arpeggio", "kind": "chat"}, headers=headers).json()
+    assert [r["ref_id"] for r in only_chat["results"]] == [question_id]
+
+
+def test_results_are_paginated(client):
+    _, headers, plan_ids = _account(client)
+    _add_notes(client, headers, plan_ids[1], [f"Metronome session {i}" for i in range(5)])
+
+    first = client.get("/search", params={"q": "metronome", "limit": 3}, headers=headers).json()
+    assert len(first["results"]) == 3 and first["has_more"] is True
+    second = client.get("/search", params={"q": "metronome", "limit": 3, "offset": 3}, headers=headers).json()
+    assert len(second["results"]) == 2 and second["has_more"] is False
+    ids = [r["ref_id"] for r in first["results"] + second["results"]]
+    assert len(set(ids)) == 5
+
+
+def test_unknown_kind_is_400(client):
+    _, headers, _ = _account(client)
+    response = client.get("/search", params={"q": "anything", "kind": "goal"}, headers=headers)
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
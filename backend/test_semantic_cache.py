@@ -0,0 +1,93 @@
+"""
+Semantic cache hit rules: near-duplicate questions share an answer, also when
+their wording differs, while questions that differ in meaning (opposite
+goals, swapped order, negation, another number) never do, even when their
+n-gram vectors are close.
+
+Usage:
+    python -m pytest test_semantic_cache.py
+    python test_semantic_cache.py
+"""
+import pytest
+
+from app.services.semantic_cache import SemanticCache
+
+NEAR_MISSES = [
+    ("How many calories should I eat per day if I want to lose weight fast?",
+     "How many calories should I eat per day if I want to gain weight fast?"),
+    ("Should I do cardio before or after weights?",
+     "Should I do cardio after or before weights?"),
+    ("Is it okay to stretch before running?",
+     "Is it not okay to stretch before running?"),
+    ("How do I practice scales on the piano?",
+     "How do I practice chords on the piano?"),
+    ("How many reps should I do for 3 sets?",
+     "How many reps should I do for 5 sets?"),
+]
+
+PARAPHRASES = [
+    ("How do I practice scales on the piano?",
+     "how do i practice scales on the piano"),
+    ("What is the best way to improve my running endurance over the next month?",
+     "What is the best way to improve running endurance over the next month?"),
+    ("What is the best way to improve my running endurance over the next month?",
+     "what is the best way to improve my running endurance over the next months"),
+    # Different content words, decided by similarity
+    ("How can I improve my running endurance over the next month?",
+     "How do I improve my running endurance over the next month?"),
+    ("How many hours should I sleep to recover after training?",
+     "How many hours should I sleep to recover after a training session?"),
+]
+
+
+def _cache(**kwargs) -> SemanticCache:
+    return SemanticCache(capacity=kwargs.pop("capacity", 100), dim=512, **kwargs)
+
+
+@pytest.mark.parametrize("stored, asked", NEAR_MISSES)
+def test_different_questions_do_not_share_answers(stored, asked):
+    cache = _cache()
+    cache.store(stored, "cached answer", "fitness")
+    assert cache.lookup(asked, "fitness") is None
+
+
+@pytest.mark.parametrize("stored, asked", PARAPHRASES)
+def test_rephrased_question_hits(stored, asked):
+    cache = _cache()
+    cache.store(stored, "cached answer", "practice")
+    assert cache.lookup(asked, "practice") == "cached answer"
+
+
+def test_topic_threshold_overrides_the_default():
+    stored, asked = PARAPHRASES[-1]
+    cache = _cache(topic_thresholds={"Sleep": 0.99})
+    cache.store(stored, "cached answer", "sleep")
+    cache.store(stored, "cached answer", "recovery")
+    assert cache.lookup(asked, "sleep") is None
+    assert cache.lookup(asked, "recovery") == "cached answer"
+
+
+def test_answers_stay_within_their_topic():
+    cache = _cache()
+    cache.store("How long should I rest between sets?", "cached answer", "strength")
+    assert cache.lookup("How long should I rest between sets?", "running") is None
+
+
+def test_topic_table_is_bounded():
+    cache = _cache(capacity=10)
+    for i in range(1000):
+        cache.store(f"Question number {i}", "answer", f"topic {i}")
+    # Topics of live entries plus the one being added
+    assert len(cache._topics) <= cache.capacity + 1
+    assert cache.lookup("Question number 999", "topic 999") == "answer"
+
+
+if __name__ == "__main__":
+    for pair in NEAR_MISSES:
+        test_different_questions_do_not_share_answers(*pair)
+    for pair in PARAPHRASES:
+        test_rephrased_question_hits(*pair)
+    test_topic_threshold_overrides_the_default()
+    test_answers_stay_within_their_topic()
+    test_topic_table_is_bounded()
+    print("Semantic cache hit rules hold.")
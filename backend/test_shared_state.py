@@ -0,0 +1,106 @@
+"""
+Shared state across worker processes: the SQLite backend's token buckets and
+leases must hold when several processes use the same file, and gunicorn must
+not run several workers on per-process state.
+
+Usage:
+    python -m pytest test_shared_state.py
+    python test_shared_state.py
+"""
+import multiprocessing
+import os
+import runpy
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# The app is imported inside the tests, so that modules collected alongside
+# this one can still configure it through the environment first
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+CAPACITY = 20
+
+
+def _backend(path: str):
+    from app.services.shared_state import SQLiteBackend
+    return SQLiteBackend(path)
+
+
+def _take_tokens(path: str, attempts: int) -> int:
+    backend = _backend(path)
+    try:
+        # Refill is negligible for the duration of the test
+        return sum(backend.take_token("rate:client:*", CAPACITY, 0.0001) == 0 for _ in range(attempts))
+    finally:
+        backend.close()
+
+
+def _acquire(path: str, owner: str) -> bool:
+    backend = _backend(path)
+    try:
+        return backend.acquire_lease("leader", owner, 30)
+    finally:
+        backend.close()
+
+
+def _release(path: str, owner: str):
+    backend = _backend(path)
+    try:
+        backend.release_lease("leader", owner)
+    finally:
+        backend.close()
+
+
+@pytest.fixture
+def settings():
+    from app.config import settings
+    return settings
+
+
+@pytest.fixture
+def pool():
+    with multiprocessing.get_context("spawn").Pool(2) as p:
+        yield p
+
+
+def test_sqlite_token_bucket_is_shared_between_processes(pool):
+    path = os.path.join(tempfile.mkdtemp(), "state.db")
+    granted = pool.starmap(_take_tokens, [(path, CAPACITY), (path, CAPACITY)])
+    assert sum(granted) == CAPACITY, f"processes were granted {granted} tokens from one bucket of {CAPACITY}"
+
+
+def test_sqlite_lease_has_one_holder_across_processes(pool):
+    path = os.path.join(tempfile.mkdtemp(), "state.db")
+    assert pool.apply(_acquire, (path, "worker-a"))
+    assert not pool.apply(_acquire, (path, "worker-b"))
+    assert pool.apply(_acquire, (path, "worker-a")), "the holder renews its lease"
+    pool.apply(_release, (path, "worker-a"))
+    assert pool.apply(_acquire, (path, "worker-b"))
+    assert not pool.apply(_acquire, (path, "worker-a"))
+
+
+def _on_starting():
+    return runpy.run_path(os.path.join(BACKEND_DIR, "gunicorn.conf.py"))["on_starting"]
+
+
+def test_gunicorn_moves_default_memory_backend_to_sqlite(monkeypatch, settings):
+    monkeypatch.setattr(settings, "STATE_BACKEND", "memory")
+    monkeypatch.setattr(settings, "__pydantic_fields_set__", set(settings.model_fields_set) - {"STATE_BACKEND"})
+    monkeypatch.delenv("STATE_BACKEND", raising=False)
+    _on_starting()(SimpleNamespace(cfg=SimpleNamespace(workers=2)))
+    assert settings.STATE_BACKEND == "sqlite"
+    assert os.environ["STATE_BACKEND"] == "sqlite"
+
+
+def test_gunicorn_refuses_explicit_memory_backend_with_several_workers(monkeypatch, settings):
+    monkeypatch.setattr(settings, "STATE_BACKEND", "memory")
+    monkeypatch.setattr(settings, "__pydantic_fields_set__", set(settings.model_fields_set) | {"STATE_BACKEND"})
+    with pytest.raises(SystemExit):
+        _on_starting()(SimpleNamespace(cfg=SimpleNamespace(workers=2)))
+    _on_starting()(SimpleNamespace(cfg=SimpleNamespace(workers=1)))
+    assert settings.STATE_BACKEND == "memory"
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
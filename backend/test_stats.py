@@ -0,0 +1,108 @@
+"""
+Incremental progress and streak counters: completions arriving out of day
+order (offline sync, another device) must leave the same counters that a
+rebuild from the day plans computes.
+
+Usage:
+    python -m pytest test_stats.py
+    python test_stats.py
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stats.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import DayPlan, User, generate_uuid  # noqa: E402
+from app.services.stats import rebuild_user_stats  # noqa: E402
+
+settings.RATE_LIMIT_ENABLED = False
+
+
+@pytest.fixture(scope="module")
+def client():
+    init_db()
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def user():
+    db = SessionLocal()
+    try:
+        u = User(email=f"stats-{generate_uuid()}@example.com", password_hash="x")
+        db.add(u)
+        db.commit()
+        return u.id, {"Authorization": f"Bearer {create_access_token({'sub': u.id})}"}
+    finally:
+        db.close()
+
+
+def _plan_ids(goal_id: str) -> list:
+    db = SessionLocal()
+    try:
+        return [plan_id for (plan_id,) in db.query(DayPlan.id).filter(DayPlan.goal_id == goal_id).order_by(DayPlan.day_number)]
+    finally:
+        db.close()
+
+
+def _rebuild(user_id: str):
+    db = SessionLocal()
+    try:
+        rebuild_user_stats(db, user_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_out_of_order_completions_match_a_rebuild(client, user):
+    user_id, headers = user
+    response = client.post("/goals", json={"title": "Streaks", "total_days": 6, "use_ai": False}, headers=headers)
+    assert response.status_code == 201, response.text
+    plan_ids = _plan_ids(response.json()["id"])
+
+    # Days completed 1, 5 and 4 days ago, then 2 and 3 days ago: the late ones bridge a five-day run
+    now = datetime.utcnow()
+    for index, days_ago in enumerate([1, 5, 4, 2, 3]):
+        mutation = {"type": "complete", "plan_id": plan_ids[index], "occurred_at": (now - timedelta(days=days_ago)).isoformat()}
+        response = client.post("/sync", json={"mutations": [mutation]}, headers=headers)
+        assert response.status_code == 200, response.text
+
+    incremental = client.get("/stats", headers=headers).json()
+    assert incremental["completed_count"] == 5
+    assert incremental["current_streak"] == 5
+    assert incremental["longest_streak"] == 5
+    assert incremental["goals"][0]["current_streak"] == 5
+
+    _rebuild(user_id)
+    assert client.get("/stats", headers=headers).json() == incremental
+
+
+def test_batch_completion_of_earlier_days_matches_a_rebuild(client, user):
+    user_id, headers = user
+    response = client.post("/goals", json={"title": "Batch streaks", "total_days": 3, "use_ai": False}, headers=headers)
+    plan_ids = _plan_ids(response.json()["id"])
+
+    # One completion today, then an older gap day arrives through sync
+    assert client.post("/plans/batch/complete", json={"plan_ids": plan_ids[:1]}, headers=headers).status_code == 200
+    old = (datetime.utcnow() - timedelta(days=3)).isoformat()
+    client.post("/sync", json={"mutations": [{"type": "complete", "plan_id": plan_ids[1], "occurred_at": old}]}, headers=headers)
+
+    incremental = client.get("/stats", headers=headers).json()
+    assert (incremental["current_streak"], incremental["longest_streak"]) == (1, 1)
+    _rebuild(user_id)
+    assert client.get("/stats", headers=headers).json() == incremental
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
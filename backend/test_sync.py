@@ -0,0 +1,148 @@
+"""
+Delta sync routes: a push must not let the client skip changes another
+device made in between, and a full sync is paged like an incremental one.
+
+Usage:
+    python -m pytest test_sync.py
+    python test_sync.py
+"""
+import os
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'sync.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import create_access_token  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import DayPlan, Goal, User, generate_uuid  # noqa: E402
+from app.services import change_log  # noqa: E402
+
+settings.RATE_LIMIT_ENABLED = False
+
+
+@pytest.fixture(scope="module")
+def client():
+    init_db()
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def account():
+    """A user with three goals of four days each; returns (headers, plan ids)"""
+    db = SessionLocal()
+    try:
+        user = User(email=f"sync-{generate_uuid()}@example.com", password_hash="x")
+        db.add(user)
+        db.flush()
+        plan_ids = []
+        for g in range(3):
+            goal = Goal(user_id=user.id, title=f"Goal {g}", total_days=4, start_date=date.today())
+            db.add(goal)
+            db.flush()
+            change_log.record_change(db, user.id, change_log.GOAL, goal.id)
+            for d in range(4):
+                plan = DayPlan(goal_id=goal.id, day_number=d + 1, date=date.today() + timedelta(days=d), topic=f"Topic {d}")
+                db.add(plan)
+                db.flush()
+                plan_ids.append(plan.id)
+        db.commit()
+        return {"Authorization": f"Bearer {create_access_token({'sub': user.id})}"}, plan_ids
+    finally:
+        db.close()
+
+
+def _pull_all(client, headers, since: int) -> dict:
+    """Follow incremental pages until has_more is off"""
+    completed, cursor = set(), since
+    while True:
+        body = client.get("/sync", params={"since": cursor}, headers=headers).json()
+        completed |= {p["id"] for p in body["day_plans"] if p["completed"]}
+        cursor = body["cursor"]
+        if not body["has_more"]:
+            return {"cursor": cursor, "completed": completed}
+
+
+def test_push_does_not_skip_other_devices_changes(client, account):
+    headers, plan_ids = account
+    cursor = client.get("/sync", headers=headers).json()["cursor"]
+
+    # Another device completes a day, then this client pushes its own completion
+    assert client.post(f"/plans/{plan_ids[0]}/complete", headers=headers).status_code == 200
+    response = client.post("/sync", json={"mutations": [
+        {"type": "complete", "plan_id": plan_ids[1], "client_id": "c1"},
+        {"type": "complete", "plan_id": generate_uuid()},
+    ]}, headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert "cursor" not in body
+    assert [r["status"] for r in body["results"]] == ["applied", "not_found"]
+    assert body["results"][0]["client_id"] == "c1"
+
+    pulled = _pull_all(client, headers, cursor)
+    assert pulled["completed"] == {plan_ids[0], plan_ids[1]}
+
+
+def test_full_sync_is_paged(client, account):
+    headers, plan_ids = account
+    goals, plans, pages = set(), set(), 0
+    params = {"since": 0, "limit": 5}
+    while True:
+        body = client.get("/sync", params=params, headers=headers).json()
+        pages += 1
+        goals |= {g["id"] for g in body["goals"]}
+        plans |= {p["id"] for p in body["day_plans"]}
+        assert len(body["day_plans"]) <= 5
+        if not body["has_more"]:
+            break
+        assert body["cursor"] == 0, "no cursor until the snapshot is complete"
+        params = {"since": 0, "limit": 5, "page": body["next_page"]}
+
+    assert pages == 3
+    assert len(goals) == 3 and plans == set(plan_ids)
+    assert body["cursor"] > 0 and body["next_page"] is None
+
+
+def test_bad_snapshot_page_is_400(client, account):
+    headers, _ = account
+    assert client.get("/sync", params={"page": "nonsense"}, headers=headers).status_code == 400
+
+
+def _push_completion(client, headers, plan_id: str, occurred_at: str):
+    response = client.post("/sync", json={"mutations": [
+        {"type": "complete", "plan_id": plan_id, "occurred_at": occurred_at}
+    ]}, headers=headers)
+    assert response.json()["results"][0]["status"] == "applied"
+    db = SessionLocal()
+    try:
+        return db.get(DayPlan, plan_id).completed_at
+    finally:
+        db.close()
+
+
+def test_future_occurred_at_is_clamped_to_now(client, account):
+    headers, plan_ids = account
+    before = datetime.utcnow()
+    completed_at = _push_completion(client, headers, plan_ids[0], (before + timedelta(days=30)).isoformat())
+    assert before <= completed_at <= datetime.utcnow()
+    assert client.get("/stats", headers=headers).json()["current_streak"] == 1
+
+
+def test_offset_occurred_at_is_stored_as_naive_utc(client, account):
+    headers, plan_ids = account
+    local = datetime.now(timezone(timedelta(hours=-8))).replace(microsecond=0) - timedelta(hours=1)
+    completed_at = _push_completion(client, headers, plan_ids[0], local.isoformat())
+    assert completed_at.tzinfo is None
+    assert completed_at == local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,102 @@
+"""
+Delta sync cursor under concurrent writers.
+
+Writer threads log changes for one user and hold each transaction open for a
+moment after their rows got an id, while a client polls the change log the
+way GET /sync does (id > cursor, cursor = last id seen). The client must end
+up with every change: an id that commits after a higher one was already
+returned would be skipped for good.
+
+Runs on a temporary SQLite database, and on PostgreSQL as well when
+TEST_POSTGRES_URL is set (a scratch database; the tables are created in it).
+
+Usage:
+    python -m pytest test_sync_cursor.py
+    python test_sync_cursor.py
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+
+import pytest
+
+from app.database import Base, create_db_engine
+from app.models import ChangeLog, User, generate_uuid
+from app.services import change_log
+from sqlalchemy.orm import sessionmaker
+
+WRITERS = 4
+CHANGES_PER_WRITER = 15
+
+URLS = [f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'sync_cursor.db')}"]
+if os.environ.get("TEST_POSTGRES_URL"):
+    URLS.append(os.environ["TEST_POSTGRES_URL"])
+
+
+def _pull(Session, user_id: str, since: int):
+    db = Session()
+    try:
+        rows = db.query(ChangeLog.id, ChangeLog.entity_id).filter(
+            ChangeLog.user_id == user_id, ChangeLog.id > since
+        ).order_by(ChangeLog.id.asc()).all()
+        return [(row.id, row.entity_id) for row in rows]
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("url", URLS, ids=lambda url: url.split(":", 1)[0])
+def test_polling_client_sees_every_concurrent_change(url):
+    engine = create_db_engine(url)
+    Base.metadata.create_all(bind=engine, tables=[User.__table__, ChangeLog.__table__])
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    user = User(email=f"sync-{generate_uuid()}@example.com", password_hash="x")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    written = []
+    written_lock = threading.Lock()
+
+    def writer():
+        rng = random.Random()
+        for _ in range(CHANGES_PER_WRITER):
+            entity_id = generate_uuid()
+            db = Session()
+            try:
+                change_log.record_change(db, user_id, change_log.NOTE, entity_id)
+                db.flush()  # The row has its id from here on
+                time.sleep(rng.uniform(0, 0.01))
+                db.commit()
+            finally:
+                db.close()
+            with written_lock:
+                written.append(entity_id)
+
+    threads = [threading.Thread(target=writer) for _ in range(WRITERS)]
+    for t in threads:
+        t.start()
+
+    cursor, seen = 0, set()
+    while any(t.is_alive() for t in threads):
+        for change_id, entity_id in _pull(Session, user_id, cursor):
+            seen.add(entity_id)
+            cursor = change_id
+        time.sleep(0.002)
+    for t in threads:
+        t.join()
+    for change_id, entity_id in _pull(Session, user_id, cursor):
+        seen.add(entity_id)
+
+    engine.dispose()
+    assert len(written) == WRITERS * CHANGES_PER_WRITER
+    missed = set(written) - seen
+    assert not missed, f"the polling client skipped {len(missed)} of {len(written)} changes"
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,53 @@
+"""
+Plan-template library writes: content another request stored in the
+meantime is skipped instead of failing the insert.
+
+Usage:
+    python -m pytest test_template_library.py
+    python test_template_library.py
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'template_library.db')}"
+os.environ["CREATE_TABLES_ON_STARTUP"] = "true"
+os.environ["GEMINI_API_KEY"] = ""
+
+import pytest  # noqa: E402
+
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.models import ContentTemplate  # noqa: E402
+from app.services import template_library  # noqa: E402
+
+
+@pytest.fixture(scope="module", autouse=True)
+def tables():
+    init_db()
+
+
+def test_concurrently_stored_content_is_skipped(monkeypatch):
+    content = {"title": "Day 1", "details": "Warm up, then run for 20 minutes."}
+    other = SessionLocal()
+    try:
+        template_library.store_content(other, content, "run|day 1")
+        other.commit()
+    finally:
+        other.close()
+
+    # The existence check ran before the other request committed
+    monkeypatch.setattr(template_library, "_existing_hashes", lambda db, hashes: set())
+    db = SessionLocal()
+    try:
+        new_content = {"title": "Day 2", "details": "Intervals."}
+        hashes = template_library.store_contents(db, [(content, "run|day 1"), (new_content, "run|day 2"), (content, None)])
+        db.commit()
+        assert hashes == [template_library.content_hash(content), template_library.content_hash(new_content), hashes[0]]
+        rows = {t.hash: t for t in db.query(ContentTemplate).filter(ContentTemplate.hash.in_(hashes))}
+        assert len(rows) == 2
+        assert rows[hashes[1]].content == new_content and rows[hashes[1]].created_at is not None
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
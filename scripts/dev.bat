@@ -37,8 +37,8 @@ REM Activate virtual environment and start backend
 call venv\Scripts\activate.bat
 pip install -q -r requirements.txt
 
-echo    Running database migrations...
-alembic upgrade head
+echo    Creating database tables...
+python -m app.database
 
 start "Backend Server" cmd /k "venv\Scripts\activate.bat && uvicorn app.main:app --reload --host 0.0.0.0 --port 8000"
 
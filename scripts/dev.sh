@@ -46,9 +46,9 @@ source venv/bin/activate
 # Install dependencies if needed
 pip install -q -r requirements.txt
 
-# Run migrations
-echo "   Running database migrations..."
-alembic upgrade head
+# Create database tables
+echo "   Creating database tables..."
+python -m app.database
 
 # Start backend in background
 uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 &